@@ -0,0 +1,128 @@
+"""
+Autocomplete pipeline benchmark
+Replays typing at different speeds into the item search against a synthetic
+catalog, with a stand-in for Tk's after() loop. Compares searching inside
+every keystroke (the old trace handler) with the debounced worker pipeline:
+searches run, queries dropped, the longest time the UI thread is blocked and
+the delay from the last keystroke to the final results.
+
+--slow-ms adds a fixed delay to every search, standing in for a bigger
+catalog or a slower backend, to show stale results being dropped.
+
+Run: python src/benchmarks/bench_autocomplete.py [--names 100000] [--words 50] [--slow-ms 0]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.bench_search import make_names
+from data.trigram_index import ItemSearch
+from ui.autocomplete import Autocomplete
+
+# Milliseconds between keystrokes
+TYPING_SPEEDS = {'barcode wedge': 4, 'fast typist': 60, 'slow typist': 200}
+
+
+class Timers:
+    """Single-threaded after()/after_cancel() loop standing in for Tk's"""
+
+    def __init__(self):
+        self.timers = {}
+        self.ids = itertools.count()
+        self.longest_callback = 0.0
+
+    def after(self, ms, function, *args):
+        timer = next(self.ids)
+        self.timers[timer] = (time.perf_counter() + ms / 1000, function, args)
+        return timer
+
+    def after_cancel(self, timer):
+        self.timers.pop(timer, None)
+
+    def run_until(self, deadline):
+        while time.perf_counter() < deadline:
+            now = time.perf_counter()
+            due = sorted((when, timer) for timer, (when, _, _) in self.timers.items() if when <= now)
+            for _, timer in due:
+                entry = self.timers.pop(timer, None)
+                if entry:
+                    self.call(entry[1], *entry[2])
+            time.sleep(0.0005)
+
+    def call(self, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        self.longest_callback = max(self.longest_callback, time.perf_counter() - start)
+
+
+def replay(words, gap_ms, on_key, timers, settle_ms=300):
+    """Type each word at `gap_ms` per character, letting the timers settle after each word"""
+    for word in words:
+        for end in range(1, len(word) + 1):
+            timers.call(on_key, word[:end])
+            timers.run_until(time.perf_counter() + gap_ms / 1000)
+        timers.run_until(time.perf_counter() + settle_ms / 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the debounced autocomplete pipeline")
+    parser.add_argument('--names', type=int, default=100000, help="Catalog size")
+    parser.add_argument('--words', type=int, default=50, help="Names typed per typing speed")
+    parser.add_argument('--slow-ms', type=float, default=0, help="Extra milliseconds added to every search")
+    args = parser.parse_args()
+
+    names = make_names(args.names)
+    index = ItemSearch(names)
+
+    def search(text, previous=None):
+        if args.slow_ms:
+            time.sleep(args.slow_ms / 1000)
+        return index.search(text, previous=previous)
+
+    words = [name[:12] for name in random.Random(3).sample(names, args.words)]
+    print(f"{args.names:,} names, {args.words} names typed per speed")
+    print(f"{'typing':>14} {'mode':>9} {'searches':>9} {'dropped':>8} {'ui block max':>13} {'last key -> shown':>18}")
+
+    for speed, gap_ms in TYPING_SPEEDS.items():
+        # Old way: search inside every keystroke
+        timers = Timers()
+
+        def search_now(text):
+            if len(text) >= 2:
+                search(text)
+
+        replay(words, gap_ms, search_now, timers)
+        keystrokes = sum(len(word) for word in words)
+        print(f"{speed:>14} {'inline':>9} {keystrokes - len(words):>9} {0:>8} "
+              f"{timers.longest_callback * 1000:>10.2f} ms {'-':>18}")
+
+        # Pipeline: debounced, off-thread, newest result only
+        timers = Timers()
+        latencies = []
+        last_key = [0.0]
+
+        def shown(results):
+            latencies.append(time.perf_counter() - last_key[0])
+
+        pipeline = Autocomplete(timers, lambda text, state: search(text, state),
+                                shown, lambda: None, min_chars=2)
+
+        def type_key(text):
+            last_key[0] = time.perf_counter()
+            pipeline.changed(text)
+
+        replay(words, gap_ms, type_key, timers)
+        pipeline.close()
+        stats = pipeline.get_stats()
+        latencies.sort()
+        print(f"{speed:>14} {'pipeline':>9} {stats['submitted']:>9} {stats['dropped'] + stats['stale']:>8} "
+              f"{timers.longest_callback * 1000:>10.2f} ms {latencies[len(latencies) // 2] * 1000:>12.1f} ms p50")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+CSV invoice import benchmark
+Times parsing, validating and totalling distributor invoices of growing size,
+and adding the rows to a bill table when a display is available
+
+Run: python src/benchmarks/bench_csv_import.py [--lines 100,1000,10000]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.csv_import import parse_invoice_csv
+
+HEADERS = ["Item Name", "Unit", "Batch", "ExpDt", "Mrp", "Qty", "Fr", "PTR", "D%", "Disc",
+           "BASE", "Gst%", "Amount", "L.P.", "Locat"]
+
+
+def write_invoice(path, lines):
+    """Write a synthetic distributor invoice with `lines` rows (one in 100 is bad)"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for i in range(lines):
+            qty = "x" if i % 100 == 99 else str(1 + i % 20)
+            writer.writerow([f"ITEM {i:05d}", "10S", f"B{i:06d}", "12/27", "120.00", qty, "0",
+                             "85.50", "0", "0", "", "12", "", "", "R1"])
+
+
+def time_table_insert(lines):
+    """Seconds to add `lines` rows to a bill table, or None without a display"""
+    try:
+        from tkinter import Tk
+        root = Tk()
+    except Exception:
+        return None
+
+    from models.product import Product
+    from ui.bill_entry_window import BillEntryWindow
+    with contextlib.redirect_stdout(io.StringIO()):
+        root.withdraw()
+        window = BillEntryWindow(root)
+        start = time.perf_counter()
+        window.add_item_rows_to_table([Product.from_line(line) for line in lines])
+        elapsed = time.perf_counter() - start
+        window.session_writer.close()
+    root.destroy()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV invoice import")
+    parser.add_argument('--lines', default="100,1000,10000", help="Comma-separated invoice sizes")
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'parse+validate':>15} {'lines/sec':>12} {'skipped':>8} {'table insert':>13}")
+    for size in (int(n) for n in args.lines.split(',')):
+        data_dir = tempfile.mkdtemp(prefix="bench_csv_")
+        try:
+            path = os.path.join(data_dir, "invoice.csv")
+            write_invoice(path, size)
+
+            start = time.perf_counter()
+            lines, errors = parse_invoice_csv(path)
+            parse_time = time.perf_counter() - start
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        insert_time = time_table_insert(lines) if size <= 10000 else None
+        insert = f"{insert_time * 1000:>10.1f} ms" if insert_time is not None else f"{'no display':>13}"
+        print(f"{size:>8} {parse_time * 1000:>12.2f} ms {size / parse_time:>12,.0f} {len(errors):>8} {insert}")
+
+
+if __name__ == "__main__":
+    main()
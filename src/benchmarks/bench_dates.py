@@ -0,0 +1,69 @@
+"""
+Date parsing benchmark
+Times parsing the same few hundred distinct expiry (mm/yy) and bill (dd/mm/yyyy)
+strings over and over, as expiry sorting and reports do across an inventory:
+memoized parse vs the same parse uncached vs datetime.strptime
+
+Run: python src/benchmarks/bench_dates.py [--values 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.dates import cache_info, expiry_month, parse_day
+
+
+def make_values(count):
+    """`count` expiry and day strings drawn from ~300 and ~1,100 distinct values"""
+    expiries = [f"{1 + i % 12:02d}/{24 + (i // 12) % 25:02d}" for i in range(count)]
+    days = [f"{1 + i % 28:02d}/{1 + (i // 28) % 12:02d}/{2022 + (i // 336) % 4}" for i in range(count)]
+    return expiries, days
+
+
+def timed(function, values):
+    start = time.perf_counter()
+    for value in values:
+        function(value)
+    return time.perf_counter() - start
+
+
+def strptime_month(text):
+    parsed = datetime.strptime(text, "%m/%y")
+    return parsed.year * 12 + parsed.month - 1
+
+
+def strptime_day(text):
+    return datetime.strptime(text, "%d/%m/%Y").toordinal()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memoized date parsing against strptime")
+    parser.add_argument('--values', type=int, default=1000000, help="Strings parsed per run")
+    args = parser.parse_args()
+
+    expiries, days = make_values(args.values)
+    assert all(expiry_month(text) == strptime_month(text) for text in expiries[:5000])
+    assert all(parse_day(text) == strptime_day(text) for text in days[:5000])
+
+    print(f"{args.values:,} values per run")
+    print(f"{'format':>12} {'memoized':>11} {'uncached':>11} {'strptime':>11} {'distinct':>9}")
+    for name, values, cached, strptime_parse in (("mm/yy", expiries, expiry_month, strptime_month),
+                                                 ("dd/mm/yyyy", days, parse_day, strptime_day)):
+        cached.cache_clear()
+        memo_time = timed(cached, values)
+        uncached_time = timed(cached.__wrapped__, values)
+        strptime_time = timed(strptime_parse, values)
+        print(f"{name:>12} {memo_time * 1000:>8.1f} ms {uncached_time * 1000:>8.1f} ms "
+              f"{strptime_time * 1000:>8.1f} ms {len(set(values)):>9}")
+
+    for name, info in cache_info().items():
+        if info.hits or info.misses:
+            print(f"   {name}: {info.hits:,} hits, {info.misses:,} misses, {info.currsize} cached")
+
+
+if __name__ == "__main__":
+    main()
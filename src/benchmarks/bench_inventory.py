@@ -0,0 +1,376 @@
+"""
+Inventory save benchmark
+Times merging a distributor bill into inventories of growing size: the
+indexed merge in memory, the same bill through the JSON backend's
+save_to_inventory end to end (index already loaded; the save still rewrites
+inventory.json, so it grows with the catalog), and the old nested scan
+
+Run: python src/benchmarks/bench_inventory.py [--sizes 1000,10000,100000,1000000]
+     python src/benchmarks/bench_inventory.py --backends json,journal,sqlite --sizes 1000,10000,100000
+     python src/benchmarks/bench_inventory.py --cold-start --sizes 10000,100000,500000
+     python src/benchmarks/bench_inventory.py --service --sizes 10000,100000
+     python src/benchmarks/bench_inventory.py --analytics --sizes 100000,1000000
+     python src/benchmarks/bench_inventory.py --expiry --sizes 100000,1000000
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data import inventory_analytics
+from data.inventory_analytics import InventoryAnalytics
+from data.expiry_index import ExpiryIndex, current_month, expiry_month
+from data.inventory_cache import file_signature
+from data.inventory_index import InventoryIndex
+from data.inventory_service import ConnectionPool, InventoryService
+from data.inventory_snapshot import write_snapshot
+from data.session_manager import SessionManager
+from data.storage import create_session_manager
+
+
+def make_inventory(size):
+    """Build a synthetic inventory with `size` item+batch records"""
+    return [
+        {'item_name': f"ITEM {i // 4:07d}", 'batch': f"B{i % 4}{i:07d}", 'qty': "10"}
+        for i in range(size)
+    ]
+
+
+def make_bill(size, lines):
+    """Build a bill where half the lines hit existing batches and half are new"""
+    bill = []
+    for i in range(lines):
+        if i % 2 == 0:
+            n = (i * 7919) % size
+            bill.append({'item_name': f"item {n // 4:07d} ", 'batch': f"b{n % 4}{n:07d}", 'qty': "5"})
+        else:
+            bill.append({'item_name': f"NEW ITEM {i}", 'batch': f"NB{i}", 'qty': "5"})
+    return bill
+
+
+def legacy_merge(inventory, items):
+    """The pre-index nested scan, kept here as the comparison baseline"""
+    for new_item in items:
+        item_name = new_item.get('item_name', '').strip().upper()
+        batch = new_item.get('batch', '').strip().upper()
+        new_qty = float(new_item.get('qty', 0) or 0)
+        found = False
+        for existing_item in inventory:
+            if (existing_item.get('item_name', '').strip().upper() == item_name and
+                    existing_item.get('batch', '').strip().upper() == batch):
+                existing_item['qty'] = str(float(existing_item.get('qty', 0) or 0) + new_qty)
+                found = True
+                break
+        if not found:
+            inventory.append(new_item)
+
+
+def time_warm_saves(manager, size, lines, saves):
+    """Seconds per save_to_inventory call after the index is loaded (output silenced)"""
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager.load_inventory_index()
+        for _ in range(saves):
+            start = time.perf_counter()
+            manager.save_to_inventory(make_bill(size, lines))
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def run(sizes, lines, legacy_max, saves):
+    print(f"Bill size: {lines} lines")
+    print(f"{'batches':>10} {'index load':>12} {'indexed merge':>14} {'JSON save':>12} {'legacy merge':>13}")
+
+    for size in sizes:
+        inventory = make_inventory(size)
+
+        start = time.perf_counter()
+        index = InventoryIndex(inventory)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index.merge(make_bill(size, lines))
+        merge_time = time.perf_counter() - start
+
+        data_dir = tempfile.mkdtemp(prefix="bench_inventory_")
+        try:
+            save_times = time_warm_saves(seed_backend('json', data_dir, size), size, lines, saves)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        legacy = "skipped"
+        if size <= legacy_max:
+            inventory = make_inventory(size)
+            start = time.perf_counter()
+            legacy_merge(inventory, make_bill(size, lines))
+            legacy = f"{(time.perf_counter() - start) * 1000:.2f} ms"
+
+        print(f"{size:>10} {load_time * 1000:>9.2f} ms {merge_time * 1000:>11.3f} ms "
+              f"{sorted(save_times)[len(save_times) // 2] * 1000:>9.1f} ms {legacy:>13}")
+
+
+def seed_backend(backend, data_dir, size):
+    """Create a session manager for `backend` holding a synthetic inventory"""
+    with open(os.path.join(data_dir, "inventory.json"), 'w') as f:
+        json.dump(make_inventory(size), f)
+    manager = create_session_manager(data_dir, backend)
+    if backend == 'sqlite':
+        manager.import_from_json()
+    return manager
+
+
+def run_backends(sizes, lines, backends, saves):
+    """Time save_to_inventory (warm: index already loaded) and get_item_batches end to end on each storage backend"""
+    print(f"Bill size: {lines} lines, {saves} warm saves per size")
+    print(f"{'backend':>8} {'batches':>10} {'save median':>12} {'save max':>10} {'batches lookup':>15}")
+
+    for backend in backends:
+        for size in sizes:
+            data_dir = tempfile.mkdtemp(prefix="bench_inventory_")
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    manager = seed_backend(backend, data_dir, size)
+                save_times = sorted(time_warm_saves(manager, size, lines, saves))
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    manager.get_item_batches(f"ITEM {size // 8:07d}")
+                    lookup_time = time.perf_counter() - start
+
+                    manager.close()
+            finally:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+            print(f"{backend:>8} {size:>10} {save_times[len(save_times) // 2] * 1000:>9.2f} ms "
+                  f"{save_times[-1] * 1000:>7.2f} ms {lookup_time * 1000:>12.2f} ms")
+
+
+def run_service(sizes, lines, lookups=2000):
+    """Time batch lookups and saves through the local inventory service"""
+    print(f"Bill size: {lines} lines, {lookups} lookups per mode")
+    print(f"{'batches':>10} {'pooled lookup':>14} {'reconnect lookup':>17} {'save':>12}")
+
+    for size in sizes:
+        data_dir = tempfile.mkdtemp(prefix="bench_inventory_")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                seed_backend('json', data_dir, size)
+                service = InventoryService(data_dir, 'json')
+                service.start()
+                client = create_session_manager(data_dir, 'service')
+                names = [f"ITEM {i * 7919 % (size // 4):07d}" for i in range(lookups)]
+
+                start = time.perf_counter()
+                for name in names:
+                    client.get_item_batches(name)
+                pooled_time = (time.perf_counter() - start) / lookups
+
+                # A pool that keeps nothing idle connects on every call
+                fresh = ConnectionPool(service.socket_path, size=0)
+                start = time.perf_counter()
+                for name in names:
+                    fresh.call('get_item_batches', item_name=name)
+                reconnect_time = (time.perf_counter() - start) / lookups
+
+                start = time.perf_counter()
+                client.save_to_inventory(make_bill(size, lines))
+                save_time = time.perf_counter() - start
+
+                client.close()
+                service.stop()
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        print(f"{size:>10} {pooled_time * 1e6:>11.1f} us {reconnect_time * 1e6:>14.1f} us {save_time * 1000:>9.2f} ms")
+
+
+def make_full_inventory(size):
+    """Build a synthetic inventory with all purchase-line fields filled in"""
+    return [{
+        'item_name': f"ITEM {i // 4:07d}", 'unit': "10", 'batch': f"B{i % 4}{i:07d}",
+        'exp_dt': f"{i % 12 + 1:02d}/{26 + i % 4}", 'mrp': "90", 'qty': "10", 'fr': "0",
+        'ptr': "80", 'd_percent': "0", 'disc': "0", 'base': "800.00", 'gst_percent': "12",
+        'amount': "896.00", 'lp': "", 'locat': "", 'added_at': "2025-10-30T19:17:14.214452",
+        'last_updated': "2025-10-30T19:17:14.214484"
+    } for i in range(size)]
+
+
+def run_analytics(sizes, lines):
+    """Time the valuation/GST/margin reports: first run, repeat, and right after a save"""
+    engine = "NumPy" if inventory_analytics.np is not None else "array (no NumPy)"
+    print(f"Analytics engine: {engine}, bill size: {lines} lines")
+    print(f"{'batches':>10} {'first run':>12} {'repeat':>12} {'after save':>12} {'exact':>6}")
+
+    def all_reports(analytics):
+        return analytics.valuation(), analytics.gst_slabs(), analytics.margin_distribution()
+
+    for size in sizes:
+        data_dir = tempfile.mkdtemp(prefix="bench_inventory_")
+        try:
+            with open(os.path.join(data_dir, "inventory.json"), 'w') as f:
+                json.dump(make_full_inventory(size), f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                manager = SessionManager(data_dir)
+                manager.load_inventory_index()
+                analytics = InventoryAnalytics(manager)
+
+                start = time.perf_counter()
+                valuation, _, _ = all_reports(analytics)
+                first_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                all_reports(analytics)
+                repeat_time = time.perf_counter() - start
+
+                # Every synthetic batch is qty 10 at PTR 80, MRP 90, GST 12%
+                exact = (valuation['cost_value'] == size * 800 and valuation['mrp_value'] == size * 900
+                         and valuation['gst_value'] == size * 96)
+
+                bill = make_bill(size, lines)
+                manager.save_to_inventory(bill)
+
+                start = time.perf_counter()
+                valuation, _, _ = all_reports(analytics)
+                save_time = time.perf_counter() - start
+                exact = exact and valuation['total_qty'] == size * 10 + sum(int(item['qty']) for item in bill)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+        print(f"{size:>10} {first_time * 1000:>9.1f} ms {repeat_time * 1000:>9.1f} ms "
+              f"{save_time * 1000:>9.1f} ms {'yes' if exact else 'NO':>6}")
+
+
+def run_expiry(sizes):
+    """Time FEFO batch lists and expiry range queries against a full scan"""
+    print(f"{'batches':>10} {'build':>10} {'fefo list':>11} {'within 1 mo':>12} {'full scan':>11} {'matches':>8}")
+
+    for size in sizes:
+        index = InventoryIndex(make_full_inventory(size))
+
+        start = time.perf_counter()
+        expiry = ExpiryIndex(index)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(1000):
+            expiry.fefo_batches(f"ITEM {i * 7919 % (size // 4):07d}")
+        fefo_time = (time.perf_counter() - start) / 1000
+
+        # Synthetic expiries run 01/26 .. 12/29; pick a month inside that span
+        today = datetime.date(2027, 6, 1)
+        start = time.perf_counter()
+        within = expiry.expiring_within(1, today, stock_only=False)
+        range_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        this_month = current_month(today)
+        scanned = [record for record in index.records
+                   if (month := expiry_month(record['exp_dt'])) is not None and this_month <= month <= this_month + 1]
+        scan_time = time.perf_counter() - start
+        assert len(scanned) == len(within)
+
+        print(f"{size:>10} {build_time * 1000:>7.0f} ms {fefo_time * 1e6:>8.1f} us {range_time * 1000:>9.2f} ms "
+              f"{scan_time * 1000:>8.1f} ms {len(within):>8}")
+
+
+def cold_start_child(mode, data_dir):
+    """Measure one cold start in this (fresh) process and print JSON results"""
+    if mode == 'json':
+        SessionManager.open_mapped_inventory = lambda self: None
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = SessionManager(data_dir)
+        medicines = manager.get_inventory_items()
+        first_name = next(iter(medicines))
+        medicines[first_name]
+        manager.get_item_batches(first_name)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss survives fork+exec on Linux, so prefer this process's own high-water mark
+    max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    max_rss_kb = int(line.split()[1])
+    print(json.dumps({'seconds': elapsed, 'max_rss_kb': max_rss_kb, 'items': len(medicines)}))
+
+
+def run_cold_start(sizes):
+    """Compare startup (load names + one item pick) from inventory.json vs the mapped snapshot"""
+    print(f"{'batches':>10} {'mode':>6} {'cold start':>12} {'max RSS':>10}")
+    for size in sizes:
+        data_dir = tempfile.mkdtemp(prefix="bench_cold_start_")
+        try:
+            manager = SessionManager(data_dir)
+            records = make_full_inventory(size)
+            with open(manager.inventory_file, 'w') as f:
+                json.dump(records, f, indent=2)
+            write_snapshot(manager.snapshot_file, records,
+                           json.loads(json.dumps(file_signature(manager.inventory_paths()))))
+            del records
+
+            for mode in ('json', 'mmap'):
+                output = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--cold-child', mode, data_dir],
+                    capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{size:>10} {mode:>6} {result['seconds'] * 1000:>9.1f} ms "
+                      f"{result['max_rss_kb'] / 1024:>7.1f} MB")
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inventory bill merges")
+    parser.add_argument('--sizes', default="1000,10000,100000,1000000",
+                        help="Comma-separated inventory sizes (batches)")
+    parser.add_argument('--lines', type=int, default=150, help="Bill lines per save")
+    parser.add_argument('--saves', type=int, default=5, help="Warm saves timed per size (median shown)")
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help="Largest inventory to run the legacy nested scan on")
+    parser.add_argument('--backends', default="",
+                        help="Comma-separated storage backends to time end to end (e.g. json,sqlite)")
+    parser.add_argument('--cold-start', action='store_true',
+                        help="Compare cold start from inventory.json vs the mapped snapshot")
+    parser.add_argument('--expiry', action='store_true',
+                        help="Time FEFO batch lists and expiry range queries")
+    parser.add_argument('--analytics', action='store_true',
+                        help="Time the valuation, GST-slab and margin reports")
+    parser.add_argument('--service', action='store_true',
+                        help="Time lookups and saves through the local inventory service")
+    parser.add_argument('--cold-child', nargs=2, metavar=('MODE', 'DATA_DIR'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cold_child:
+        cold_start_child(*args.cold_child)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.cold_start:
+        run_cold_start(sizes)
+    elif args.expiry:
+        run_expiry(sizes)
+    elif args.analytics:
+        run_analytics(sizes, args.lines)
+    elif args.service:
+        run_service(sizes, args.lines)
+    elif args.backends:
+        run_backends(sizes, args.lines, args.backends.split(','), args.saves)
+    else:
+        run(sizes, args.lines, args.legacy_max, args.saves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Bill model benchmark
+Compares bill lines held as 15-key dicts of strings (as the bill table used to
+keep them) with the __slots__ Product/Bill models: memory per line, time to
+parse the bill, and time to compute the bill total
+
+Run: python src/benchmarks/bench_models.py [--lines 100,1000,10000,100000]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.bill import Bill
+
+
+def make_lines(lines):
+    """Build `lines` bill lines as the search row produces them"""
+    return [{
+        'item_name': f"ITEM {i:06d}", 'unit': "10S", 'batch': f"B{i:07d}", 'exp_dt': f"{1 + i % 12:02d}/27",
+        'mrp': f"{120 + i % 50}.00", 'qty': str(1 + i % 20), 'fr': "0", 'ptr': f"{85 + i % 30}.50",
+        'd_percent': "0", 'disc': "0", 'base': f"{(1 + i % 20) * (85.5 + i % 30):.2f}", 'gst_percent': "12",
+        'amount': f"{(1 + i % 20) * (85.5 + i % 30) * 1.12:.2f}", 'lp': "", 'locat': "R1",
+    } for i in range(lines)]
+
+
+def measure(build):
+    """(result, bytes still allocated after building it)"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def best_of(function, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dict lines against the Bill/Product models")
+    parser.add_argument('--lines', default="100,1000,10000,100000", help="Comma-separated bill sizes")
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'dict B/line':>12} {'model B/line':>13} {'dict copy':>11} {'model parse':>12} "
+          f"{'dict total':>11} {'column sum':>11} {'running total':>14}")
+    for size in (int(n) for n in args.lines.split(',')):
+        source = make_lines(size)
+
+        # Copy the dicts and their strings so both sides pay for their own text
+        dicts, dict_bytes = measure(lambda: [{key: ''.join(value) for key, value in line.items()}
+                                             for line in source])
+        bill, bill_bytes = measure(lambda: Bill.from_lines(source))
+        assert round(sum(float(line['amount']) for line in dicts), 2) == bill.calculate_total()
+
+        dict_build = best_of(lambda: [dict(line) for line in source], repeat=3)
+        bill_build = best_of(lambda: Bill.from_lines(source), repeat=3)
+
+        # What the window used to do on every save: re-parse the Amount strings
+        dict_total = best_of(lambda: sum(float(item.get('amount', 0) or 0) for item in dicts))
+        column_sum = best_of(lambda: sum(bill.amount))
+        running = best_of(bill.calculate_total)
+
+        print(f"{size:>8} {dict_bytes / size:>12,.0f} {bill_bytes / size:>13,.0f} "
+              f"{dict_build * 1000:>8.2f} ms {bill_build * 1000:>9.2f} ms "
+              f"{dict_total * 1000:>8.3f} ms {column_sum * 1000:>8.3f} ms {running * 1e6:>11.2f} µs")
+        del dicts, bill
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Party search benchmark
+Times typing a party name one character at a time against party masters of
+growing size with a year of synthetic bills: the ranked prefix search (prefix
+range narrowed per keystroke, best-ranked k from the segment tree) vs the old
+startswith scan followed by a sort on usage. "record use" is what saving a
+bill waits for (re-ranking one party); "write" is the background rewrite of
+parties.json that follows it.
+
+Run: python src/benchmarks/bench_party.py [--sizes 1000,10000,100000] [--bills 50000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.party_master import MAX_PARTY_MATCHES, PartyMaster
+from utils.dates import format_day, today_key
+
+WORDS = ["MEDI", "PHARMA", "CARE", "LIFE", "HEALTH", "APOLLO", "SUN", "CIPLA", "LUPIN", "PLUS", "NOVA", "CURE"]
+SUFFIXES = ["DISTRIBUTORS", "AGENCIES", "PHARMACEUTICALS", "TRADERS", "LTD", "HEALTHCARE"]
+
+
+def make_parties(count, seed=11):
+    """`count` distinct synthetic supplier names like 'MEDICARE AGENCIES 12'"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(f"{rng.choice(WORDS)}{rng.choice(WORDS)} {rng.choice(SUFFIXES)} {rng.randint(1, 999)}")
+    return sorted(names)
+
+
+def make_bills(parties, count, seed=13):
+    """`count` bills over the last year, a few parties getting most of them"""
+    rng = random.Random(seed)
+    today = today_key()
+    regulars = rng.sample(parties, min(50, len(parties)))
+    return [{'party': rng.choice(regulars) if rng.random() < 0.8 else rng.choice(parties),
+             'bill_dt': format_day(today - rng.randrange(365))} for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ranked party search per keystroke")
+    parser.add_argument('--sizes', default="1000,10000,100000", help="Comma-separated party counts")
+    parser.add_argument('--bills', type=int, default=50000, help="Saved bills used to seed usage")
+    parser.add_argument('--queries', type=int, default=200, help="Names typed per master")
+    args = parser.parse_args()
+
+    print(f"{'parties':>9} {'seed':>8} {'ranked avg':>11} {'ranked max':>11} {'scan+sort avg':>14} "
+          f"{'record use':>11} {'write':>9}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        for size in (int(n) for n in args.sizes.split(',')):
+            parties = make_parties(size)
+            path = os.path.join(data_dir, f"parties_{size}.json")
+            start = time.perf_counter()
+            master = PartyMaster(path)
+            master.seed(make_bills(parties, args.bills), parties)
+            seed_time = time.perf_counter() - start
+
+            queries = [name[:10] for name in random.Random(size).sample(parties, min(args.queries, size))]
+            ranked_times = []
+            for query in queries:
+                matches = None
+                for end in range(1, len(query) + 1):
+                    start = time.perf_counter()
+                    matches = master.search(query[:end], matches)
+                    master.top(matches)
+                    ranked_times.append(time.perf_counter() - start)
+
+            # The old way: every name checked, then the matches sorted by usage
+            records = list(master.records.values())
+            scan_times = []
+            for query in queries[:20]:
+                for end in range(1, len(query) + 1):
+                    start = time.perf_counter()
+                    matches = [record for record in records if record['name'].upper().startswith(query[:end])]
+                    matches.sort(key=lambda record: -(record['rank'] or float('-inf')))
+                    [record['name'] for record in matches[:MAX_PARTY_MATCHES]]
+                    scan_times.append(time.perf_counter() - start)
+
+            use_times = []
+            for name in parties[:20]:
+                master.flush()
+                start = time.perf_counter()
+                master.record_use(name)
+                use_times.append(time.perf_counter() - start)
+            master.close()
+            start = time.perf_counter()
+            master.record_use(parties[0])
+            master.close()
+            write_time = time.perf_counter() - start
+
+            print(f"{size:>9} {seed_time:>6.2f} s {sum(ranked_times) / len(ranked_times) * 1e6:>8.1f} us "
+                  f"{max(ranked_times) * 1e6:>8.1f} us {sum(scan_times) / len(scan_times) * 1000:>11.2f} ms "
+                  f"{max(use_times) * 1000:>8.2f} ms {write_time * 1000:>6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
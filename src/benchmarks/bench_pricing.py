@@ -0,0 +1,79 @@
+"""
+Purchase-line pricing benchmark
+Times pricing bill lines in one batch (NumPy and plain integer paths) against
+one call per line, as the search row used to price them, and checks that
+both paths agree to the paisa
+
+Run: python src/benchmarks/bench_pricing.py [--lines 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import pricing
+from utils.pricing import PricingOptions, fixed_columns, price_columns, price_lines
+
+OPTION_SETS = {
+    'plain': PricingOptions(),
+    'scheme 5% + GST on free': PricingOptions(gst_on_free=True, scheme_percent="5"),
+    'tax inclusive': PricingOptions(tax_inclusive=True),
+}
+
+
+def make_lines(lines):
+    """Synthetic lines with a mix of discounts, free goods and GST slabs"""
+    return [{
+        'item_name': f"ITEM {i:06d}", 'qty': str(1 + i % 50), 'fr': str(i % 3),
+        'ptr': f"{20 + i % 400}.{i % 100:02d}", 'd_percent': ("0", "2.5", "5", "10")[i % 4],
+        'disc': "0" if i % 5 else "1.50", 'gst_percent': ("5", "12", "18", "0")[i % 4],
+    } for i in range(lines)]
+
+
+def best_of(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched purchase-line pricing")
+    parser.add_argument('--lines', type=int, default=10000, help="Lines per pricing call")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per timing (best is reported)")
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    numpy = pricing.np
+
+    print(f"Lines per call: {args.lines}, NumPy: {'yes' if numpy is not None else 'not installed'}")
+    print(f"{'options':>24} {'parse':>10} {'numpy':>10} {'integer':>10} {'per line':>10} {'same':>5}")
+    for name, options in OPTION_SETS.items():
+        columns = fixed_columns(lines)
+        parse_time = best_of(lambda: fixed_columns(lines), args.repeat)
+
+        numpy_time = None
+        if numpy is not None:
+            numpy_result = price_columns(*columns, options=options)
+            numpy_time = best_of(lambda: price_columns(*columns, options=options), args.repeat)
+
+        pricing.np = None
+        try:
+            integer_result = price_columns(*columns, options=options)
+            integer_time = best_of(lambda: price_columns(*columns, options=options), args.repeat)
+            per_line_time = best_of(lambda: [price_lines([line], options) for line in lines], 1)
+        finally:
+            pricing.np = numpy
+
+        same = numpy is None or all(numpy_result[field] == integer_result[field] for field in pricing.PRICE_FIELDS)
+        numpy_text = f"{numpy_time * 1000:>7.2f} ms" if numpy_time is not None else f"{'-':>10}"
+        print(f"{name:>24} {parse_time * 1000:>7.2f} ms {numpy_text} {integer_time * 1000:>7.2f} ms "
+              f"{per_line_time * 1000:>7.1f} ms {'yes' if same else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
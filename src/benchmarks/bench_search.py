@@ -0,0 +1,171 @@
+"""
+Item search benchmark
+Times typing an item name one character at a time against catalogs of growing
+size: the prefix index narrowing each keystroke's range, the same index
+searching from scratch, and the old full-catalog startswith scan.
+
+--ranked times the ranked prefix/substring/fuzzy search per keystroke for
+prefixes, fragments from the middle of names and misspelt names, against the
+published SEARCH_BUDGET_MS: the slowest keystroke at 100k names or fewer must
+be within it, or the run exits with status 1. Each keystroke is timed as the
+best of --repeats runs, so a time slice lost to another process doesn't count
+but a keystroke that is always slow does. "found" is the share of fully
+typed queries whose top results include the name they were taken from
+(synthetic names share syllables, so short fragments are often ambiguous).
+"usable" is how long ItemSearch(names, background=True) holds the caller
+before prefix search works; "build" is until the trigram index is in.
+
+Run: python src/benchmarks/bench_search.py [--sizes 100000,1000000] [--scan-max 1000000]
+     python src/benchmarks/bench_search.py --ranked --sizes 10000,100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.prefix_index import PrefixIndex
+from data.trigram_index import SEARCH_BUDGET_MS, ItemSearch
+
+SYLLABLES = ["PARA", "CETA", "MOL", "AMOX", "ICIL", "LIN", "AZI", "THRO", "MYCIN", "CEF", "IXIME",
+             "PANTO", "PRA", "ZOLE", "MET", "FOR", "MIN", "ATOR", "VASTA", "TIN", "DOLO", "CAL", "PROL"]
+STRENGTHS = ["5MG", "10MG", "20MG", "40MG", "250MG", "500MG", "650MG", "1GM", "100ML", "200ML"]
+FORMS = ["TAB", "CAP", "SYP", "INJ", "DROPS", "GEL", "SUSP"]
+
+
+def make_names(count, seed=7):
+    """`count` distinct synthetic medicine names like 'AMOXICILLIN 500MG CAP'"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        brand = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add(f"{brand} {rng.choice(STRENGTHS)} {rng.choice(FORMS)} {rng.randint(1, 999)}")
+    return sorted(names)
+
+
+def type_query(query, search):
+    """Per-keystroke seconds for typing `query` (searches start at 2 characters, as the UI's do)"""
+    times = []
+    state = None
+    for end in range(2, len(query) + 1):
+        start = time.perf_counter()
+        state = search(query[:end], state)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def misspell(name, rng):
+    """The name with one letter dropped, doubled or swapped with its neighbour"""
+    at = rng.randrange(1, len(name) - 1)
+    edit = rng.randrange(3)
+    if edit == 0:
+        return name[:at] + name[at + 1:]
+    if edit == 1:
+        return name[:at] + name[at] + name[at:]
+    return name[:at - 1] + name[at] + name[at - 1] + name[at + 1:]
+
+
+def percentile(times, share):
+    ordered = sorted(times)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def run_ranked(sizes, query_count, repeats):
+    """Per-keystroke latency of the ranked item search for three kinds of query; False if over budget"""
+    print(f"Budget: {SEARCH_BUDGET_MS} ms for the slowest keystroke at 100k names")
+    print(f"{'names':>9} {'usable':>9} {'build':>8} {'query kind':>11} {'p50':>9} {'p95':>9} {'max':>9} "
+          f"{'found':>6} {'budget':>7}")
+    within = True
+    for size in sizes:
+        names = make_names(size)
+        rng = random.Random(size)
+        sample = rng.sample(names, min(query_count, size))
+
+        start = time.perf_counter()
+        search = ItemSearch(names, background=True)
+        usable_time = time.perf_counter() - start
+        search.wait()
+        build_time = time.perf_counter() - start
+
+        kinds = {
+            'prefix': [(name[:12], name) for name in sample],
+            'substring': [(name[3:13], name) for name in sample],
+            'misspelt': [(misspell(name, rng), name) for name in sample],
+        }
+        for kind, queries in kinds.items():
+            times = []
+            found = 0
+            for query, name in queries:
+                previous = None
+                for end in range(2, len(query) + 1):
+                    best = None
+                    for _ in range(repeats):
+                        start = time.perf_counter()
+                        results, narrowed = search.search(query[:end], previous=previous)
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+                    times.append(best)
+                    previous = narrowed
+                found += any(result == name for result, _ in results)
+            slowest = max(times) * 1000
+            verdict = "-"
+            if size <= 100000:
+                verdict = "ok" if slowest <= SEARCH_BUDGET_MS else "OVER"
+                within = within and slowest <= SEARCH_BUDGET_MS
+            print(f"{size:>9} {usable_time * 1000:>6.0f} ms {build_time:>6.2f} s {kind:>11} "
+                  f"{percentile(times, 0.5) * 1000:>6.2f} ms {percentile(times, 0.95) * 1000:>6.2f} ms "
+                  f"{slowest:>6.2f} ms {found * 100 // len(queries):>5}% {verdict:>7}")
+    return within
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark item search per keystroke")
+    parser.add_argument('--sizes', default="100000,1000000", help="Comma-separated catalog sizes")
+    parser.add_argument('--queries', type=int, default=200, help="Names typed per catalog")
+    parser.add_argument('--scan-max', type=int, default=1000000, help="Largest catalog to time the linear scan on")
+    parser.add_argument('--ranked', action='store_true', help="Time the ranked prefix/substring/fuzzy search")
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per keystroke with --ranked (best is kept)")
+    args = parser.parse_args()
+
+    if args.ranked:
+        if not run_ranked([int(n) for n in args.sizes.split(',')], args.queries, args.repeats):
+            print(f"FAIL: a keystroke took longer than {SEARCH_BUDGET_MS} ms")
+            sys.exit(1)
+        return
+
+    print(f"{'names':>9} {'build':>9} {'narrowed avg':>13} {'narrowed max':>13} {'fresh avg':>10} {'scan avg':>10}")
+    for size in (int(n) for n in args.sizes.split(',')):
+        names = make_names(size)
+        queries = random.Random(size).sample(names, min(args.queries, size))
+        queries = [query[:12] for query in queries]
+
+        start = time.perf_counter()
+        index = PrefixIndex(names)
+        build_time = time.perf_counter() - start
+
+        def narrowed(text, previous):
+            matches = index.search(text, previous)
+            index.names_in(matches, 100)
+            return matches
+
+        def fresh(text, previous):
+            index.complete(text, 100)
+
+        def scan(text, previous):
+            [name for name in names if name.startswith(text)]
+
+        narrowed_times = [t for query in queries for t in type_query(query, narrowed)]
+        fresh_times = [t for query in queries for t in type_query(query, fresh)]
+        scan_text = f"{'-':>10}"
+        if size <= args.scan_max:
+            scan_times = [t for query in queries[:5] for t in type_query(query, scan)]
+            scan_text = f"{sum(scan_times) / len(scan_times) * 1000:>7.2f} ms"
+
+        print(f"{size:>9} {build_time:>7.2f} s {sum(narrowed_times) / len(narrowed_times) * 1e6:>10.1f} us "
+              f"{max(narrowed_times) * 1e6:>10.1f} us {sum(fresh_times) / len(fresh_times) * 1e6:>7.1f} us {scan_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Purchase-line validation benchmark
+Times validating bills and imported files of growing size in one pass against
+two per-line baselines:
+
+    per-line parse   - Product.from_line on each line plus an expiry check:
+                       the same 15 fields and typed values, one line at a time
+                       (how session restore and CSV import checked lines)
+    per-line checks  - the old one-product-at-a-time validators, which read
+                       only 8 fields, stop at the first bad one and return
+                       no typed values
+
+Run: python src/benchmarks/bench_validation.py [--lines 1000,10000,100000]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.product import Product
+from utils.validators import is_valid_expiry, is_valid_number, is_valid_quantity, validate_lines
+
+
+def make_lines(lines):
+    """Synthetic bill lines; one in 50 has a bad number and one in 200 a bad expiry"""
+    return [{
+        'item_name': f"ITEM {i:06d}", 'unit': "10S", 'batch': f"B{i:07d}",
+        'exp_dt': "13/27" if i % 200 == 199 else f"{1 + i % 12:02d}/{26 + i % 4}",
+        'mrp': "120.00", 'qty': "x" if i % 50 == 49 else str(1 + i % 20), 'fr': "0", 'ptr': "85.50",
+        'd_percent': "0", 'disc': "0", 'base': "", 'gst_percent': "12", 'amount': "", 'lp': "", 'locat': "R1",
+    } for i in range(lines)]
+
+
+def per_line_parse(lines):
+    """Typed values for every field, one line at a time"""
+    products = []
+    bad = 0
+    for line in lines:
+        try:
+            product = Product.from_line(line)
+        except ValueError:
+            bad += 1
+            continue
+        if product.exp_dt and not is_valid_expiry(product.exp_dt):
+            bad += 1
+            continue
+        products.append(product)
+    return bad
+
+
+def per_line_check(lines):
+    """The old way: each check parses the value again, one product at a time"""
+    bad = 0
+    for line in lines:
+        if not (line['item_name'].strip() and is_valid_expiry(line['exp_dt']) and is_valid_quantity(line['qty'])
+                and all(is_valid_number(line[field]) for field in ('mrp', 'ptr', 'd_percent', 'disc', 'gst_percent'))):
+            bad += 1
+    return bad
+
+
+def best_of(function, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch validation of purchase lines")
+    parser.add_argument('--lines', default="1000,10000,100000", help="Comma-separated bill sizes")
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'batch validate':>15} {'lines/sec':>12} {'bad rows':>9} "
+          f"{'per-line parse':>15} {'per-line checks':>16}")
+    for size in (int(n) for n in args.lines.split(',')):
+        lines = make_lines(size)
+        result = validate_lines(lines)
+
+        batch_time = best_of(lambda: validate_lines(lines))
+        parse_time = best_of(lambda: per_line_parse(lines))
+        check_time = best_of(lambda: per_line_check(lines))
+
+        print(f"{size:>8} {batch_time * 1000:>12.1f} ms {size / batch_time:>12,.0f} "
+              f"{len(result.error_rows()):>9} {parse_time * 1000:>12.1f} ms {check_time * 1000:>13.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
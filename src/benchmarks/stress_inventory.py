@@ -0,0 +1,142 @@
+"""
+Multi-counter inventory stress test
+Several processes save bills into one shared data directory at the same time;
+afterwards every item+batch quantity must equal exactly what was billed
+
+Run: python src/benchmarks/stress_inventory.py [--writers 8] [--bills 25] [--backends json,journal,sqlite]
+Exits non-zero if any backend loses or double-counts a quantity, or a counter
+process dies or hangs.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.storage import create_session_manager
+
+# Few enough keys that counters constantly update the same batches
+ITEMS = 6
+BATCHES = 3
+# Seconds a counter waits for the others to start, and a round may run, before it counts as hung
+START_TIMEOUT_S = 60
+ROUND_TIMEOUT_S = 600
+
+
+def bill_lines(writer, bill):
+    """One bill: qty 1 for a rotating set of item+batch keys (one key twice)"""
+    lines = []
+    for line in range(4):
+        n = writer + bill + line
+        lines.append({'item_name': f"STRESS ITEM {n % ITEMS}", 'batch': f"SB{n % BATCHES}", 'qty': "1",
+                      'unit': "10S", 'mrp': "100.00", 'ptr': "80.00", 'gst_percent': "12"})
+    lines.append(dict(lines[0]))
+    return lines
+
+
+def expected_totals(writers, bills):
+    """Quantity every item+batch should end with"""
+    totals = {}
+    for writer in range(writers):
+        for bill in range(bills):
+            for line in bill_lines(writer, bill):
+                key = (line['item_name'], line['batch'])
+                totals[key] = totals.get(key, 0) + 1
+    return totals
+
+
+def writer_process(backend, data_dir, writer, bills, start, failures):
+    """Save `bills` bills as one billing counter"""
+    # Open the data directory only once every counter is up, so all of them race on creating
+    # it and a counter that fails to open it dies after the barrier instead of leaving the rest stuck
+    start.wait(START_TIMEOUT_S)
+    manager = create_session_manager(data_dir, backend)
+    if backend == 'journal':
+        # Compact often so snapshot swaps race with appends too
+        manager.compact_bytes = 4096
+    for bill in range(bills):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ok = manager.save_to_inventory(bill_lines(writer, bill))
+        if not ok:
+            with failures.get_lock():
+                failures.value += 1
+    if backend == 'journal':
+        manager.wait_for_compaction()
+
+
+def run_backend(backend, writers, bills):
+    """Run one stress round; returns True if every quantity is exact"""
+    data_dir = tempfile.mkdtemp(prefix=f"stress_{backend}_")
+    try:
+        context = multiprocessing.get_context('spawn')
+        start = context.Barrier(writers)
+        failures = context.Value('i', 0)
+        processes = [context.Process(target=writer_process,
+                                     args=(backend, data_dir, writer, bills, start, failures))
+                     for writer in range(writers)]
+
+        began = time.perf_counter()
+        for process in processes:
+            process.start()
+        deadline = began + ROUND_TIMEOUT_S
+        for process in processes:
+            process.join(max(0, deadline - time.perf_counter()))
+        elapsed = time.perf_counter() - began
+        hung = [process for process in processes if process.is_alive()]
+        for process in hung:
+            process.kill()
+            process.join()
+        died = [process for process in processes if process not in hung and process.exitcode != 0]
+        if hung or died:
+            print(f"{backend:>8}  {writers} writers x {bills} bills  {elapsed:6.2f} s  FAIL")
+            if hung:
+                print(f"          {len(hung)} counters still running after {ROUND_TIMEOUT_S} s, killed")
+            for process in died:
+                print(f"          counter {processes.index(process)} exited with code {process.exitcode}")
+            return False
+
+        # Read back through a fresh manager so nothing comes from this process's cache
+        with contextlib.redirect_stdout(io.StringIO()):
+            index = create_session_manager(data_dir, backend).load_inventory_index()
+        actual = {}
+        for record in index.records:
+            key = (record['item_name'], record['batch'])
+            actual[key] = actual.get(key, 0) + int(float(record['qty']))
+
+        expected = expected_totals(writers, bills)
+        wrong = {key: (actual.get(key, 0), qty) for key, qty in expected.items() if actual.get(key, 0) != qty}
+        duplicates = len(index.records) - len(actual)
+
+        ok = not wrong and not duplicates and not failures.value and sum(actual.values()) == sum(expected.values())
+        print(f"{backend:>8}  {writers} writers x {bills} bills  {elapsed:6.2f} s  "
+              f"total qty {sum(actual.values())}/{sum(expected.values())}  {'PASS' if ok else 'FAIL'}")
+        for (item_name, batch), (got, want) in sorted(wrong.items()):
+            print(f"          {item_name} / {batch}: {got} (expected {want})")
+        if duplicates:
+            print(f"          {duplicates} duplicate item+batch records")
+        if failures.value:
+            print(f"          {failures.value} saves reported an error")
+        return ok
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress concurrent inventory saves")
+    parser.add_argument('--writers', type=int, default=8, help="concurrent counter processes")
+    parser.add_argument('--bills', type=int, default=25, help="bills saved by each counter")
+    parser.add_argument('--backends', default="json,journal,sqlite", help="comma-separated storage backends")
+    args = parser.parse_args()
+
+    results = [run_backend(backend.strip(), args.writers, args.bills) for backend in args.backends.split(',')]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
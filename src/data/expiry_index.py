@@ -0,0 +1,89 @@
+"""
+Expiry index for Pharmacy Bill Entry
+Batches sorted by expiry month for first-expiry-first-out (FEFO) batch lists,
+"expiring within N months" queries and the expired-stock report. Each query is
+a binary search plus the batches it returns.
+
+Expiry dates are the mm/yy strings the ExpDt field produces, parsed to month
+keys by utils.dates; a batch is good through the end of its expiry month.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+
+from data.inventory_index import normalize_key
+from utils.dates import current_month, expiry_month
+
+# Sorts after every real month (unparseable expiry goes last in FEFO order)
+NO_EXPIRY = 1 << 30
+
+
+def fefo_key(record):
+    """Sort key putting the earliest expiry first and unknown expiry last"""
+    month = expiry_month(record.get('exp_dt', ''))
+    return NO_EXPIRY if month is None else month
+
+
+def in_stock(record):
+    try:
+        return float(record.get('qty', 0) or 0) > 0
+    except ValueError:
+        return False
+
+
+class ExpiryIndex:
+    def __init__(self, index):
+        self.index = index
+        self.lock = threading.Lock()  # The inventory service queries from several threads
+        self.item_order = {}    # ITEM_NAME -> FEFO-ordered positions, filled on first request
+
+        entries = sorted(
+            (month, position) for position, month in
+            ((position, expiry_month(record.get('exp_dt', ''))) for position, record in enumerate(index.records))
+            if month is not None
+        )
+        self.months = [month for month, _ in entries]            # Sorted expiry months...
+        self.positions = [position for _, position in entries]   # ...and the record at each, file order within a month
+        self.size = len(index.records)                           # Records of index already indexed
+
+    def refresh(self):
+        """Index records added since the last refresh (merges only change qty on existing ones)"""
+        with self.lock:
+            for position in range(self.size, len(self.index.records)):
+                record = self.index.records[position]
+                month = expiry_month(record.get('exp_dt', ''))
+                if month is not None:
+                    at = bisect_right(self.months, month)
+                    self.months.insert(at, month)
+                    self.positions.insert(at, position)
+                self.item_order.pop(normalize_key(record.get('item_name', '')), None)
+            self.size = len(self.index.records)
+
+    def fefo_batches(self, item_name):
+        """All batches of an item, earliest expiry first"""
+        key = normalize_key(item_name)
+        with self.lock:
+            order = self.item_order.get(key)
+            if order is None:
+                records = self.index.records
+                order = sorted(self.index.names.get(key, []),
+                               key=lambda position: (fefo_key(records[position]), position))
+                self.item_order[key] = order
+        return [self.index.records[position] for position in order]
+
+    def between(self, first_month, last_month, stock_only=True):
+        """Batches expiring from first_month through last_month, earliest first"""
+        with self.lock:
+            start = bisect_left(self.months, first_month)
+            end = bisect_right(self.months, last_month)
+            positions = self.positions[start:end]
+        records = [self.index.records[position] for position in positions]
+        return [record for record in records if in_stock(record)] if stock_only else records
+
+    def expiring_within(self, months, today=None, stock_only=True):
+        """Batches not yet expired that expire within the next `months` months"""
+        this_month = current_month(today)
+        return self.between(this_month, this_month + months, stock_only)
+
+    def expired(self, today=None, stock_only=True):
+        """Batches whose expiry month has passed, oldest first"""
+        return self.between(0, current_month(today) - 1, stock_only)
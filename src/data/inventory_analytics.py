@@ -0,0 +1,217 @@
+"""
+Inventory analytics for Pharmacy Bill Entry
+Stock valuation, GST-slab totals and margin (MRP vs PTR) distribution over the
+whole inventory. Quantities and prices are parsed once into typed columns;
+after a save only the merged records are re-parsed.
+
+NumPy is used when installed; otherwise the same reports run on array('d')
+columns in plain Python.
+
+Run a report: python src/data/inventory_analytics.py
+"""
+import bisect
+import math
+import os
+import statistics
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # Optional - the array fallback gives the same results
+    np = None
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.storage import create_session_manager
+
+# Record fields held as float columns
+COLUMN_FIELDS = ('qty', 'ptr', 'mrp', 'gst_percent')
+# Margin % bucket edges; margins below the first edge or at/above the last get their own bucket
+DEFAULT_MARGIN_BINS = (0, 10, 20, 30, 40, 50)
+
+
+def parse_number(value):
+    """Float value of a record field ("" and junk count as 0)"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+
+class InventoryColumns:
+    """Float columns over an InventoryIndex, kept in step with its merges"""
+
+    def __init__(self, index):
+        self.index = index
+        self.columns = {field: array('d') for field in COLUMN_FIELDS}
+        index.follow(self)
+        self.append_records(0)
+
+    def __len__(self):
+        return len(self.columns['qty'])
+
+    def append_records(self, start):
+        for field, column in self.columns.items():
+            column.extend(parse_number(record.get(field)) for record in self.index.records[start:])
+
+    def refresh(self):
+        """Re-parse only the records merged since the last refresh"""
+        size = len(self)
+        self.append_records(size)
+        for position in self.index.merged_since(self):
+            if position < size:
+                record = self.index.records[position]
+                for field, column in self.columns.items():
+                    column[position] = parse_number(record.get(field))
+
+    def view(self, field):
+        """The column as a zero-copy NumPy array (drop it before the next refresh)"""
+        return np.frombuffer(self.columns[field], dtype=np.float64)
+
+
+class InventoryAnalytics:
+    def __init__(self, session_manager):
+        self.session_manager = session_manager
+        self.columns = None
+
+    def current_columns(self):
+        """Columns for the current inventory, rebuilt only if it was reloaded"""
+        index = self.session_manager.load_inventory_index()
+        if self.columns is None or self.columns.index is not index:
+            self.columns = InventoryColumns(index)
+        else:
+            self.columns.refresh()
+        return self.columns
+
+    def valuation(self):
+        """Stock quantity and value at PTR (cost), with GST, and at MRP"""
+        columns = self.current_columns()
+        if np is not None:
+            qty, ptr, mrp, gst = (columns.view(field) for field in COLUMN_FIELDS)
+            cost = qty * ptr
+            totals = (qty.sum(), cost.sum(), (cost * gst).sum() / 100, (qty * mrp).sum())
+        else:
+            qty, ptr, mrp, gst = (columns.columns[field] for field in COLUMN_FIELDS)
+            totals = (
+                math.fsum(qty),
+                math.fsum(q * p for q, p in zip(qty, ptr)),
+                math.fsum(q * p * g for q, p, g in zip(qty, ptr, gst)) / 100,
+                math.fsum(q * m for q, m in zip(qty, mrp)),
+            )
+
+        total_qty, cost_value, gst_value, mrp_value = (float(total) for total in totals)
+        return {
+            'records': len(columns),
+            'total_qty': round(total_qty, 3),
+            'cost_value': round(cost_value, 2),
+            'gst_value': round(gst_value, 2),
+            'mrp_value': round(mrp_value, 2),
+            'margin_value': round(mrp_value - cost_value - gst_value, 2),
+        }
+
+    def gst_slabs(self):
+        """Per GST% slab: records, quantity, taxable value at PTR, GST and MRP value"""
+        columns = self.current_columns()
+        if np is not None:
+            qty, ptr, mrp, gst = (columns.view(field) for field in COLUMN_FIELDS)
+            rates, slab = np.unique(gst, return_inverse=True)
+            cost = qty * ptr
+            sums = {
+                'records': np.bincount(slab, minlength=len(rates)),
+                'qty': np.bincount(slab, weights=qty, minlength=len(rates)),
+                'taxable_value': np.bincount(slab, weights=cost, minlength=len(rates)),
+                'mrp_value': np.bincount(slab, weights=qty * mrp, minlength=len(rates)),
+            }
+            rows = [dict({key: values[i] for key, values in sums.items()}, gst_percent=rates[i])
+                    for i in range(len(rates))]
+        else:
+            slabs = {}
+            qty, ptr, mrp, gst = (columns.columns[field] for field in COLUMN_FIELDS)
+            for q, p, m, g in zip(qty, ptr, mrp, gst):
+                slab = slabs.get(g)
+                if slab is None:
+                    slab = slabs[g] = {'records': 0, 'qty': [], 'taxable_value': [], 'mrp_value': []}
+                slab['records'] += 1
+                slab['qty'].append(q)
+                slab['taxable_value'].append(q * p)
+                slab['mrp_value'].append(q * m)
+            rows = [{'gst_percent': g, 'records': slab['records'], 'qty': math.fsum(slab['qty']),
+                     'taxable_value': math.fsum(slab['taxable_value']), 'mrp_value': math.fsum(slab['mrp_value'])}
+                    for g, slab in sorted(slabs.items())]
+
+        return [{
+            'gst_percent': float(row['gst_percent']),
+            'records': int(row['records']),
+            'qty': round(float(row['qty']), 3),
+            'taxable_value': round(float(row['taxable_value']), 2),
+            'gst_amount': round(float(row['taxable_value']) * float(row['gst_percent']) / 100, 2),
+            'mrp_value': round(float(row['mrp_value']), 2),
+        } for row in rows]
+
+    def margin_distribution(self, bins=DEFAULT_MARGIN_BINS):
+        """Margin % = (MRP - PTR) / MRP over priced batches, bucketed by `bins`
+
+        Buckets are [-inf, bins[0]), [bins[0], bins[1]), ... [bins[-1], inf); each
+        reports the batch count and the stock value at PTR.
+        """
+        columns = self.current_columns()
+        edges = [float(edge) for edge in bins]
+        if np is not None:
+            qty, ptr, mrp = columns.view('qty'), columns.view('ptr'), columns.view('mrp')
+            priced = (mrp > 0) & (ptr > 0)
+            margin = (mrp[priced] - ptr[priced]) / mrp[priced] * 100
+            bucket = np.searchsorted(edges, margin, side='right')
+            counts = np.bincount(bucket, minlength=len(edges) + 1).tolist()
+            values = np.bincount(bucket, weights=qty[priced] * ptr[priced], minlength=len(edges) + 1).tolist()
+            mean = float(margin.mean()) if len(margin) else 0.0
+            median = float(np.median(margin)) if len(margin) else 0.0
+            priced_count = len(margin)
+        else:
+            counts = [0] * (len(edges) + 1)
+            value_parts = [[] for _ in counts]
+            margins = []
+            for q, p, m in zip(columns.columns['qty'], columns.columns['ptr'], columns.columns['mrp']):
+                if m > 0 and p > 0:
+                    margin = (m - p) / m * 100
+                    margins.append(margin)
+                    bucket = bisect.bisect_right(edges, margin)
+                    counts[bucket] += 1
+                    value_parts[bucket].append(q * p)
+            values = [math.fsum(parts) for parts in value_parts]
+            mean = math.fsum(margins) / len(margins) if margins else 0.0
+            median = statistics.median(margins) if margins else 0.0
+            priced_count = len(margins)
+
+        labels = ([f"< {edges[0]:g}%"] +
+                  [f"{low:g}-{high:g}%" for low, high in zip(edges, edges[1:])] +
+                  [f">= {edges[-1]:g}%"])
+        return {
+            'priced_batches': priced_count,
+            'mean_margin': round(mean, 2),
+            'median_margin': round(median, 2),
+            'buckets': [{'range': label, 'batches': int(count), 'cost_value': round(value, 2)}
+                        for label, count, value in zip(labels, counts, values)],
+        }
+
+
+if __name__ == "__main__":
+    data_dir = os.path.dirname(os.path.abspath(__file__))
+    analytics = InventoryAnalytics(create_session_manager(data_dir))
+
+    valuation = analytics.valuation()
+    print(f"📊 Stock valuation ({valuation['records']} batches, qty {valuation['total_qty']:g})")
+    print(f"   At PTR: ₹{valuation['cost_value']:,.2f}  GST: ₹{valuation['gst_value']:,.2f}  "
+          f"At MRP: ₹{valuation['mrp_value']:,.2f}  Margin: ₹{valuation['margin_value']:,.2f}")
+
+    print("🧾 GST slabs")
+    for slab in analytics.gst_slabs():
+        print(f"   {slab['gst_percent']:>5g}%  {slab['records']:>8} batches  taxable ₹{slab['taxable_value']:,.2f}  "
+              f"GST ₹{slab['gst_amount']:,.2f}")
+
+    margins = analytics.margin_distribution()
+    print(f"📈 Margins over {margins['priced_batches']} priced batches "
+          f"(mean {margins['mean_margin']}%, median {margins['median_margin']}%)")
+    for bucket in margins['buckets']:
+        print(f"   {bucket['range']:>10}  {bucket['batches']:>8} batches  ₹{bucket['cost_value']:,.2f}")
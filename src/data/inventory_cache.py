@@ -0,0 +1,83 @@
+"""
+Process-wide inventory cache for Pharmacy Bill Entry
+Keeps one parsed InventoryIndex per inventory file and reloads it only when
+the file's mtime, size or inode changes
+"""
+import os
+import threading
+
+
+def file_signature(paths):
+    """Return (mtime_ns, size, inode) for each path, or None for missing files"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class InventoryCache:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.entries = {}   # cache key -> (signature, index)
+        self.hits = 0       # served from memory
+        self.misses = 0     # first load of a file
+        self.reloads = 0    # file changed on disk since it was cached
+
+    def get(self, key, paths, loader):
+        """Return the cached index for `key`, calling loader() if the files changed"""
+        with self.lock:
+            signature = file_signature(paths)
+            entry = self.entries.get(key)
+            if entry and entry[0] == signature:
+                self.hits += 1
+                return entry[1]
+
+            if entry:
+                self.reloads += 1
+            else:
+                self.misses += 1
+
+            index = loader()
+            self.entries[key] = (signature, index)
+            return index
+
+    def peek(self, key, paths):
+        """Return the cached index if it is still valid, without loading anything"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] == file_signature(paths):
+                self.hits += 1
+                return entry[1]
+            return None
+
+    def entry(self, key):
+        """Return (signature, index) as cached for `key`, or None"""
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, paths, index):
+        """Store an index that was just written to `paths`"""
+        with self.lock:
+            self.entries[key] = (file_signature(paths), index)
+
+    def invalidate(self, key=None):
+        """Drop one cached index, or all of them"""
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        """Return hit, miss and reload counters"""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'reloads': self.reloads,
+                    'cached_files': len(self.entries)}
+
+
+# Shared by every SessionManager in the process
+INVENTORY_CACHE = InventoryCache()
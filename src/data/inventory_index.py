@@ -0,0 +1,158 @@
+"""
+Inventory Index for Pharmacy Bill Entry
+Keeps a normalized (ITEM_NAME, BATCH) hash index over inventory records
+so a bill can be merged without scanning the whole catalog
+"""
+import weakref
+from datetime import datetime
+
+# The 15 purchase-line fields, in table column order
+LINE_FIELDS = (
+    'item_name', 'unit', 'batch', 'exp_dt', 'mrp', 'qty', 'fr', 'ptr',
+    'd_percent', 'disc', 'base', 'gst_percent', 'amount', 'lp', 'locat'
+)
+
+
+def normalize_key(value):
+    """Normalize an item name or batch for index lookups"""
+    return (value or '').strip().upper()
+
+
+def search_entry(item_name, record):
+    """Details the item search dropdown keeps for a name (a get_inventory_items value)"""
+    return {
+        'item_name': item_name,
+        'unit': record.get('unit', ''),
+        'batch': record.get('batch', ''),
+        'exp_dt': record.get('exp_dt', ''),
+        'mrp': record.get('mrp', ''),
+        'ptr': record.get('ptr', ''),
+        'gst_percent': record.get('gst_percent', '0')
+    }
+
+
+def check_line(item):
+    """Raise ValueError if InventoryIndex.merge would fail on the bill line `item`"""
+    try:
+        normalize_key(item.get('item_name', ''))
+        normalize_key(item.get('batch', ''))
+        float(item.get('qty', 0) or 0)
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(str(e)) from e
+
+
+def check_lines(items):
+    """Raise ValueError if InventoryIndex.merge would fail part way through `items`"""
+    for number, item in enumerate(items, 1):
+        try:
+            check_line(item)
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}") from e
+
+
+class InventoryIndex:
+    def __init__(self, records=None):
+        self.records = []   # Inventory records in file order
+        self.keys = {}      # (ITEM_NAME, BATCH) -> position in records
+        self.names = {}     # ITEM_NAME -> positions of its batches, in file order
+        self.merged = []    # Positions changed or added by merge() that a follower hasn't caught up on yet
+        self.merged_start = 0                       # Merges dropped from the front of `merged`
+        self.followers = weakref.WeakKeyDictionary()  # Derived view -> merges it has caught up on
+
+        for record in records or []:
+            self.append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def append(self, record):
+        """Add a record, computing its normalized keys once"""
+        position = len(self.records)
+        self.records.append(record)
+
+        item_name = normalize_key(record.get('item_name', ''))
+        batch = normalize_key(record.get('batch', ''))
+
+        # Keep the first occurrence if the file already has duplicates
+        self.keys.setdefault((item_name, batch), position)
+        self.names.setdefault(item_name, []).append(position)
+        return position
+
+    def upsert(self, record):
+        """Replace the record with the same item+batch, or append it"""
+        key = (normalize_key(record.get('item_name', '')), normalize_key(record.get('batch', '')))
+        position = self.keys.get(key)
+        if position is None:
+            return self.append(record)
+        self.records[position] = record
+        return position
+
+    def merge_count(self):
+        """Positions merged so far (the count a new follower starts from)"""
+        return self.merged_start + len(self.merged)
+
+    def follow(self, follower):
+        """Keep the positions merged from now on until `follower` has read them (see merged_since)"""
+        self.followers[follower] = self.merge_count()
+
+    def merged_since(self, follower):
+        """Positions merged since `follower` last asked, in order (lets derived views catch up)"""
+        seen = self.followers[follower]
+        positions = self.merged[seen - self.merged_start:]
+        self.followers[follower] = self.merge_count()
+        self.trim_merged()
+        return positions
+
+    def trim_merged(self):
+        """Drop merged positions every follower has read"""
+        oldest = min(self.followers.values(), default=self.merge_count())
+        if oldest > self.merged_start:
+            del self.merged[:oldest - self.merged_start]
+            self.merged_start = oldest
+
+    def find(self, item_name, batch):
+        """Return the record for item+batch, or None"""
+        position = self.keys.get((normalize_key(item_name), normalize_key(batch)))
+        if position is None:
+            return None
+        return self.records[position]
+
+    def batches_for(self, item_name):
+        """Return all records for an item name, in file order"""
+        positions = self.names.get(normalize_key(item_name), [])
+        return [self.records[position] for position in positions]
+
+    def merge(self, items):
+        """Merge bill lines into the index. If item+batch exists, increase qty; otherwise add new entry
+
+        Returns a list of (record, old_qty, new_qty) tuples - old_qty is None for new records
+        """
+        now = datetime.now().isoformat()
+        changes = []
+
+        for new_item in items:
+            item_name = normalize_key(new_item.get('item_name', ''))
+            batch = normalize_key(new_item.get('batch', ''))
+            new_qty = float(new_item.get('qty', 0) or 0)
+
+            if not item_name or not batch:
+                continue
+
+            position = self.keys.get((item_name, batch))
+            if position is not None:
+                # Update quantity
+                existing_item = self.records[position]
+                old_qty = float(existing_item.get('qty', 0) or 0)
+                existing_item['qty'] = str(old_qty + new_qty)
+                existing_item['last_updated'] = now
+                self.merged.append(position)
+                changes.append((existing_item, old_qty, new_qty))
+            else:
+                # Add new entry
+                new_item['added_at'] = now
+                new_item['last_updated'] = now
+                self.merged.append(self.append(new_item))
+                changes.append((new_item, None, new_qty))
+
+        self.trim_merged()
+        return changes
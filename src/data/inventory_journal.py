@@ -0,0 +1,240 @@
+"""
+Append-only inventory journal for Pharmacy Bill Entry
+Each bill save appends one compact delta record instead of rewriting inventory.json
+
+Files in the data directory:
+    inventory.json             - last compacted snapshot (same list format as the JSON backend)
+    inventory.journal          - one JSON line per saved bill, holding the full state of the
+                                 batches that bill touched
+    inventory.journal.compact  - journal being folded into the snapshot (only during/after
+                                 an interrupted compaction)
+
+Journal lines carry resulting records rather than quantity deltas, so replaying a line
+twice gives the same inventory. That makes a crash at any point of compaction safe.
+
+A save should cost what the bill costs, not what the catalog costs. When another
+counter has only appended to the journal since this process loaded it, the cached
+index replays just the new lines (from the byte offset it has read up to) instead
+of reloading the snapshot; a compaction by another counter still means a full load.
+"""
+import json
+import os
+import threading
+
+from data.file_lock import FileLock
+from data.inventory_cache import INVENTORY_CACHE, file_signature
+from data.json_stream import write_json_array
+from data.session_manager import SessionManager
+
+# Fold the journal into a new snapshot once it grows past this many bytes
+DEFAULT_COMPACT_BYTES = 1024 * 1024
+
+
+class JournalSessionManager(SessionManager):
+    def __init__(self, data_dir="data", compact_bytes=DEFAULT_COMPACT_BYTES):
+        super().__init__(data_dir)
+        self.journal_file = os.path.join(data_dir, "inventory.journal")
+        self.compact_file = os.path.join(data_dir, "inventory.journal.compact")
+        self.compact_bytes = compact_bytes
+        self.compaction_thread = None
+        # Only one counter compacts at a time; saves keep going meanwhile
+        self.compaction_lock = FileLock(os.path.join(data_dir, "inventory.compact.lock"))
+
+    def inventory_paths(self):
+        """The snapshot, both journal files and the generation decide cache validity"""
+        return (self.inventory_file, self.compact_file, self.journal_file, self.version_file)
+
+    def load_inventory_index(self, progress=None):
+        """Return the inventory index, replaying only new journal lines if that is all that changed"""
+        return INVENTORY_CACHE.get(self.inventory_cache_key(), self.inventory_paths(),
+                                   lambda: self.catch_up() or self.read_consistent_index(progress))
+
+    def read_inventory_index(self, progress=None):
+        """Load the snapshot and replay the journal over it"""
+        index = super().read_inventory_index(progress)
+        self.replay_journal(index, self.compact_file)
+        _, offset = self.replay_journal(index, self.journal_file)
+        self.note_journal_position(index, offset)
+        return index
+
+    def replay_journal(self, index, path, offset=0):
+        """Upsert every record in a journal file from byte `offset` on into the index
+
+        Returns (positions upserted, offset just past the last whole line).
+        """
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return [], 0
+
+        with f:
+            f.seek(offset)
+            data = f.read()
+        positions = []
+        start = offset
+        for line in data.splitlines(keepends=True):
+            at, start = start, start + len(line)
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                if not line.endswith(b"\n"):
+                    # Still being appended (or cut short); read it again next time
+                    start = at
+                    break
+                # A torn write from a crash - the bill it belonged to was never confirmed
+                print(f"⚠️ Skipping damaged journal line at byte {at} in {path}")
+                continue
+            for record in entry.get('records', []):
+                positions.append(index.upsert(record))
+        return positions, start
+
+    def note_journal_position(self, index, offset=None):
+        """Remember on `index` which snapshot it was built from and how far into the journal it has read (default: all of it)"""
+        journal = file_signature((self.journal_file,))[0]
+        if offset is None:
+            offset = journal[1] if journal else 0
+        index.journal_position = (file_signature((self.inventory_file, self.compact_file)),
+                                  journal[2] if journal else None, offset)
+
+    def catch_up(self):
+        """Bring the cached index up to date by replaying journal lines other counters appended
+
+        Returns the index, or None if the snapshot or compact file changed (a full load is needed).
+        Runs under the cache lock, as do this backend's merges, so the two never interleave.
+        """
+        entry = INVENTORY_CACHE.entry(self.inventory_cache_key())
+        position = getattr(entry[1], 'journal_position', None) if entry else None
+        if position is None:
+            return None
+        base, inode, offset = position
+        if file_signature((self.inventory_file, self.compact_file)) != base:
+            return None
+        journal = file_signature((self.journal_file,))[0]
+        if journal is None or journal[1] < offset or (inode is not None and journal[2] != inode):
+            return None
+
+        index = entry[1]
+        positions, offset = self.replay_journal(index, self.journal_file, offset)
+        # Derived views (expiry, analytics) pick these up like merged lines
+        index.merged.extend(positions)
+        index.trim_merged()
+        self.note_journal_position(index, offset)
+        return index
+
+    def merge_and_report(self, index, items):
+        """Merge under the cache lock, so a catch_up in another thread can't replay into the index meanwhile"""
+        with INVENTORY_CACHE.lock:
+            return super().merge_and_report(index, items)
+
+    def write_inventory(self, index, changed_records):
+        """Append one compact delta record for this bill to the journal (inventory_lock is held)"""
+        if not changed_records:
+            return
+
+        line = json.dumps({'records': changed_records}, separators=(',', ':')) + "\n"
+
+        with open(self.journal_file, 'ab+') as f:
+            # Start on a fresh line if a previous append was cut short
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+            f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+
+        # inventory_lock is held and the index was current, so it has now read the whole journal
+        with INVENTORY_CACHE.lock:
+            self.note_journal_position(index, end)
+
+        if os.path.getsize(self.journal_file) >= self.compact_bytes:
+            self.start_compaction()
+
+    def start_compaction(self):
+        """Compact the journal on a background thread (no-op if one is already running)"""
+        if self.compaction_thread and self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact, args=(self.compact_bytes,), daemon=True)
+        self.compaction_thread.start()
+
+    def wait_for_compaction(self):
+        """Block until any running background compaction finishes"""
+        if self.compaction_thread:
+            self.compaction_thread.join()
+
+    def rearrange_files(self, action):
+        """Run a file change that keeps the inventory content the same, under the lock
+
+        The generation is bumped around it so lock-free readers in other counters
+        retry instead of reading a half-moved set of files. This process's cached
+        index stays valid.
+        """
+        key, paths = self.inventory_cache_key(), self.inventory_paths()
+        with self.inventory_lock:
+            before = file_signature(paths)
+            entry = INVENTORY_CACHE.entry(key)
+            generation = self.read_generation()
+            self.write_generation(generation + 1 + generation % 2)
+            action()
+            self.write_generation(generation + 2 + generation % 2)
+            if entry and entry[0] == before:
+                INVENTORY_CACHE.put(key, paths, entry[1])
+                # Every line was in the index before the move, so it has read whatever journal is left
+                self.note_journal_position(entry[1])
+
+    def move_journal_aside(self):
+        """Move the live journal to the compact file so new bills go to a fresh file"""
+        if not os.path.exists(self.journal_file):
+            return
+        if os.path.exists(self.compact_file):
+            # Left over from an interrupted compaction - keep both sets of lines
+            with open(self.journal_file, 'rb') as src, open(self.compact_file, 'ab') as dst:
+                dst.write(b"\n" + src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.journal_file)
+        else:
+            os.replace(self.journal_file, self.compact_file)
+
+    def compact(self, min_bytes=1):
+        """Fold the journal into a new snapshot (skipped if it is under min_bytes)"""
+        try:
+            with self.compaction_lock:
+                return self.compact_locked(min_bytes)
+        except Exception as e:
+            print(f"❌ Error compacting inventory journal: {e}")
+            return False
+
+    def compact_locked(self, min_bytes):
+        """compact() body, run while holding compaction_lock"""
+        with self.inventory_lock:
+            # Another counter may have compacted while we waited for the lock
+            try:
+                journal_bytes = os.path.getsize(self.journal_file)
+            except FileNotFoundError:
+                journal_bytes = 0
+            if not os.path.exists(self.compact_file) and journal_bytes < min_bytes:
+                return False
+            index = self.load_inventory_index()
+            records = [dict(record) for record in index.records]
+            self.rearrange_files(self.move_journal_aside)
+
+        # Write the snapshot outside the inventory lock; the rename makes it all-or-nothing
+        temp_file = self.inventory_file + ".compact.tmp"
+        with open(temp_file, 'w') as f:
+            write_json_array(f, records)
+            f.flush()
+            os.fsync(f.fileno())
+
+        def install():
+            os.replace(temp_file, self.inventory_file)
+            os.remove(self.compact_file)
+        self.rearrange_files(install)
+        # Same records, new file signature: the mapped snapshot needs rewriting
+        self.refresh_snapshot()
+
+        print(f"🗜️ Inventory journal compacted: {len(records)} records in snapshot")
+        return True
@@ -0,0 +1,532 @@
+"""
+Local inventory service for Pharmacy Bill Entry
+One process owns the inventory and keeps a single warm index; billing windows
+on the same machine talk to it over a Unix domain socket instead of each
+loading their own copy. Item search runs in the service too, so a window
+holds neither the item map nor a search index - names and details are
+fetched as they are typed and picked.
+
+Lookups run in parallel on the handler threads; a save waits for them to
+finish and holds new ones off while it merges (ReadWriteLock).
+
+Start it next to the data files (any storage backend can sit behind it):
+    python src/data/inventory_service.py [--backend json] [--socket PATH]
+
+Then run the windows with PHARMACY_STORAGE=service.
+
+Protocol: one JSON object per line each way.
+    request  {"op": "get_item_batches", "args": {"item_name": "..."}}
+    response {"result": [...]} or {"error": "..."}
+"""
+import argparse
+import functools
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.inventory_index import check_lines, search_entry
+from data.session_manager import SessionManager
+from data.storage import DEFAULT_BACKEND, create_session_manager
+from data.trigram_index import TOP_K, ItemSearch
+
+SOCKET_NAME = "inventory.sock"
+# Persistent connections each client keeps open
+DEFAULT_POOL_SIZE = 4
+# Seconds a client waits for a reply (a save rewrites the inventory, so be generous)
+DEFAULT_TIMEOUT = 60.0
+
+
+def default_socket_path(data_dir):
+    return os.path.join(data_dir, SOCKET_NAME)
+
+
+class ServiceUnavailable(Exception):
+    """No inventory service is listening on the socket"""
+
+
+class ReadWriteLock:
+    """Any number of readers or one writer; a waiting writer holds off new readers"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+        self.writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            while self.writing or self.writers_waiting:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.writers_waiting += 1
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.writers_waiting -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class InventoryServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 64  # Every window may open its whole pool at once
+
+
+class InventoryService:
+    def __init__(self, data_dir="data", backend=None, socket_path=None):
+        backend = (backend or DEFAULT_BACKEND).lower()
+        if backend == 'service':
+            backend = 'json'  # PHARMACY_STORAGE=service is meant for the windows, not the service itself
+        self.manager = create_session_manager(data_dir, backend)
+        self.socket_path = socket_path or default_socket_path(data_dir)
+        self.server = None
+
+        # Lookups share the index; a save merges into it in place, so it waits for them
+        self.rw_lock = ReadWriteLock()
+
+        # Item map and search index served to the windows, rebuilt if the inventory is reloaded
+        self.catalog_lock = threading.Lock()
+        self.catalog_index = None
+        self.items = {}
+        self.item_search = None
+
+        # Saves are applied by one thread that folds every queued bill into a single write
+        self.save_queue = queue.Queue()
+        self.save_thread = threading.Thread(target=self.save_worker, name="inventory-saves", daemon=True)
+
+        # Counters
+        self.requests = 0
+        self.saves = 0
+        self.save_writes = 0
+        self.stats_lock = threading.Lock()
+
+    def dispatch(self, op, args):
+        """Run one request against the warm index"""
+        with self.stats_lock:
+            self.requests += 1
+
+        if op == 'save_to_inventory':
+            return self.save(args['items'])
+        if op == 'stats':
+            return self.get_stats()
+        if op == 'ping':
+            return True
+        with self.rw_lock.read():
+            return self.lookup(op, args)
+
+    def lookup(self, op, args):
+        """Answer a read-only request (read lock held)
+
+        Results are encoded after the lock is released, while a save may be merging
+        into the index and catalog, so nothing returned may be one of their live objects.
+        """
+        if op == 'get_item_batches':
+            return self.manager.get_item_batches(args['item_name'])
+        if op == 'get_batches_many':
+            return {name: self.manager.get_item_batches(name) for name in args['item_names']}
+        if op == 'get_expiring_batches':
+            return [dict(record) for record in self.manager.get_expiring_batches(args['months'])]
+        if op == 'get_expired_batches':
+            return [dict(record) for record in self.manager.get_expired_batches()]
+        if op == 'search_items':
+            results, _ = self.catalog()[1].search(args['query'], args.get('limit', TOP_K))
+            return results
+        if op == 'get_item':
+            item = self.catalog()[0].get(args['item_name'])
+            return dict(item) if item is not None else None
+        if op == 'item_count':
+            return len(self.catalog()[0])
+        if op == 'get_inventory_items':
+            return dict(self.catalog()[0])
+        raise ValueError(f"Unknown operation: {op}")
+
+    def catalog(self):
+        """(item map, item search) for the current inventory, rebuilt only if it was reloaded"""
+        index = self.manager.load_inventory_index()
+        with self.catalog_lock:
+            if self.catalog_index is not index:
+                self.items = dict(self.manager.get_inventory_items())
+                self.item_search = ItemSearch(self.items, background=True)
+                self.catalog_index = index
+            return self.items, self.item_search
+
+    def add_to_catalog(self, items):
+        """Add the new item names of a saved bill to the item map and search (write lock held)"""
+        with self.catalog_lock:
+            if self.item_search is None:
+                return
+            for item in items:
+                item_name = item.get('item_name', '').strip()
+                if item_name and item_name not in self.items:
+                    self.items[item_name] = search_entry(item_name, item)
+                    self.item_search.add(item_name)
+
+    def save(self, items):
+        """Queue a bill for the save thread and wait for its result"""
+        done = threading.Event()
+        outcome = {}
+        self.save_queue.put((items, done, outcome))
+        done.wait()
+        if 'error' in outcome:
+            raise ValueError(outcome['error'])
+        return outcome['ok']
+
+    def save_worker(self):
+        """Apply queued bills, merging everything waiting into one inventory write
+
+        A bill that can't be merged is answered with its own error and left out,
+        so it doesn't fail the other counters' bills written with it.
+        """
+        while True:
+            batch = []
+            pending = [self.save_queue.get()]
+            while True:
+                try:
+                    pending.append(self.save_queue.get_nowait())
+                except queue.Empty:
+                    break
+            for bill, done, outcome in pending:
+                try:
+                    check_lines(bill)
+                    batch.append((bill, done, outcome))
+                except Exception as e:
+                    outcome['error'] = f"Bill not saved, {e}"
+                    done.set()
+            if not batch:
+                continue
+
+            # Merging the bills one after another or all at once gives the same inventory
+            items = [item for bill, _, _ in batch for item in bill]
+            with self.rw_lock.write():
+                ok = self.manager.save_to_inventory(items)
+                if ok:
+                    self.add_to_catalog(items)
+
+            with self.stats_lock:
+                self.saves += len(batch)
+                self.save_writes += 1
+            for _, done, outcome in batch:
+                outcome['ok'] = ok
+                done.set()
+
+    def get_stats(self):
+        """Request and save batching counters"""
+        with self.stats_lock:
+            stats = {'requests': self.requests, 'saves': self.saves, 'save_writes': self.save_writes}
+        stats.update(self.manager.get_cache_stats())
+        return stats
+
+    def start(self):
+        """Warm the index and start listening (returns once the socket is ready)"""
+        if os.path.exists(self.socket_path):
+            try:
+                ConnectionPool(self.socket_path, size=1).call('ping')
+                raise RuntimeError(f"An inventory service is already listening on {self.socket_path}")
+            except ServiceUnavailable:
+                os.remove(self.socket_path)  # Left behind by a service that didn't shut down
+
+        self.manager.load_inventory_index()
+        self.catalog()
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                # One persistent connection serves many requests
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                        response = {'result': service.dispatch(request['op'], request.get('args', {}))}
+                    except Exception as e:
+                        response = {'error': f"{type(e).__name__}: {e}"}
+                    self.wfile.write(json.dumps(response, separators=(',', ':')).encode('utf-8') + b"\n")
+
+        self.server = InventoryServer(self.socket_path, Handler)
+        self.save_thread.start()
+        threading.Thread(target=self.server.serve_forever, name="inventory-service", daemon=True).start()
+        print(f"🟢 Inventory service listening on {self.socket_path}")
+
+    def stop(self):
+        """Stop listening and remove the socket file"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.manager.close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+class ConnectionPool:
+    """Persistent client connections, reused across calls and threads"""
+
+    def __init__(self, socket_path, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.socket_path = socket_path
+        self.size = size
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+        # Counters
+        self.created = 0
+        self.reused = 0
+
+    def connect(self):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise ServiceUnavailable("Unix domain sockets are not supported on this platform")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise ServiceUnavailable(f"No inventory service at {self.socket_path}: {e}") from e
+        with self.lock:
+            self.created += 1
+        return sock, sock.makefile('rb')
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                self.reused += 1
+                return self.idle.pop(), True
+        return self.connect(), False
+
+    def release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(conn)
+                return
+        self.close_connection(conn)
+
+    def close_connection(self, conn):
+        sock, reader = conn
+        reader.close()
+        sock.close()
+
+    def call(self, op, **args):
+        """Send one request and return its result"""
+        request = json.dumps({'op': op, 'args': args}, separators=(',', ':')).encode('utf-8') + b"\n"
+
+        conn, reused = self.acquire()
+        try:
+            sock, reader = conn
+            sock.sendall(request)
+            line = reader.readline()
+            if not line:
+                raise ConnectionError("Inventory service closed the connection")
+        except socket.timeout:
+            # The request may still complete; retrying could apply a save twice
+            self.close_connection(conn)
+            raise RuntimeError(f"Inventory service did not answer {op} within {self.timeout} s")
+        except OSError:
+            self.close_connection(conn)
+            if not reused:
+                raise ServiceUnavailable(f"Inventory service at {self.socket_path} stopped responding")
+            # The idle connection went stale (service restarted) - retry once on a fresh one
+            return self.call(op, **args)
+
+        self.release(conn)
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def close(self):
+        """Close every idle connection"""
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            self.close_connection(conn)
+
+    def stats(self):
+        """Connection creation and reuse counters"""
+        with self.lock:
+            return {'connections_created': self.created, 'connections_reused': self.reused,
+                    'idle_connections': len(self.idle)}
+
+
+class ServiceItemMap(Mapping):
+    """get_inventory_items() answered by the service: each lookup is a request, nothing is copied up front"""
+
+    def __init__(self, manager, count):
+        self.manager = manager
+        self.count = count
+        self.items = None   # The whole map, fetched only if something iterates it
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self.items is None:
+            self.items = self.manager.pool.call('get_inventory_items')
+        return iter(self.items)
+
+    def __contains__(self, item_name):
+        return self.get(item_name) is not None
+
+    def __getitem__(self, item_name):
+        item = self.manager.call('get_item', lambda: None, item_name=item_name) if isinstance(item_name, str) else None
+        if item is None:
+            raise KeyError(item_name)
+        return item
+
+    def item_search(self):
+        """Search for this map runs in the service too"""
+        return ServiceItemSearch(self.manager)
+
+
+class ServiceItemSearch:
+    """ItemSearch stand-in that asks the service (the window keeps no index)"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def __len__(self):
+        return self.manager.call('item_count', lambda: 0)
+
+    def update(self, names):
+        """The service adds saved items itself"""
+        return 0
+
+    def search(self, query, limit=TOP_K, previous=None):
+        """Same ([(name, kind)], state) shape as ItemSearch.search; there is no prefix range to carry"""
+        results = self.manager.call('search_items', lambda: [], query=query, limit=limit)
+        return [tuple(result) for result in results], None
+
+
+class ServiceSessionManager(SessionManager):
+    """SessionManager whose inventory calls go to the local inventory service
+
+    Sessions and bills stay in this window's data directory. If no service is
+    running, inventory calls fall back to reading the files directly.
+    """
+
+    def __init__(self, data_dir="data", socket_path=None, pool_size=DEFAULT_POOL_SIZE):
+        super().__init__(data_dir)
+        self.pool = ConnectionPool(socket_path or default_socket_path(data_dir), size=pool_size)
+        self.warned = False
+
+    def close(self):
+        """Close pooled connections (and finish a snapshot from any direct reads)"""
+        self.pool.close()
+        super().close()
+
+    def call(self, op, fallback, **args):
+        """Ask the service, or run fallback() against the files if it isn't running"""
+        try:
+            return self.pool.call(op, **args)
+        except ServiceUnavailable as e:
+            if not self.warned:
+                print(f"⚠️ {e} - reading inventory files directly")
+                self.warned = True
+            return fallback()
+
+    def get_inventory_items(self, progress=None):
+        """Get all inventory items grouped by name for search (a ServiceItemMap while the service answers)"""
+        try:
+            items = self.call('item_count', functools.partial(SessionManager.get_inventory_items, self, progress))
+            return ServiceItemMap(self, items) if isinstance(items, int) else items
+        except Exception as e:
+            print(f"❌ Error loading inventory: {e}")
+            return {}
+
+    def get_item_batches(self, item_name):
+        """Get all available batches for a specific item"""
+        try:
+            return self.call('get_item_batches', functools.partial(SessionManager.get_item_batches, self, item_name),
+                             item_name=item_name)
+        except Exception as e:
+            print(f"❌ Error getting batches: {e}")
+            return []
+
+    def get_batches_many(self, item_names):
+        """Batches for several items in one round trip"""
+        item_names = list(item_names)
+        try:
+            return self.call('get_batches_many',
+                             lambda: {name: SessionManager.get_item_batches(self, name) for name in item_names},
+                             item_names=item_names)
+        except Exception as e:
+            print(f"❌ Error getting batches: {e}")
+            return {}
+
+    def get_expiring_batches(self, months, today=None):
+        """In-stock batches expiring within the next `months` months, earliest first"""
+        if today is not None:
+            # The service answers for its own today; a specific date is answered from the files
+            return SessionManager.get_expiring_batches(self, months, today)
+        try:
+            return self.call('get_expiring_batches',
+                             functools.partial(SessionManager.get_expiring_batches, self, months), months=months)
+        except Exception as e:
+            print(f"❌ Error getting expiring batches: {e}")
+            return []
+
+    def get_expired_batches(self, today=None):
+        """In-stock batches past their expiry month, oldest first"""
+        if today is not None:
+            return SessionManager.get_expired_batches(self, today)
+        try:
+            return self.call('get_expired_batches', functools.partial(SessionManager.get_expired_batches, self))
+        except Exception as e:
+            print(f"❌ Error getting expired batches: {e}")
+            return []
+
+    def save_to_inventory(self, items):
+        """Save items to inventory through the service"""
+        try:
+            return self.call('save_to_inventory', functools.partial(SessionManager.save_to_inventory, self, items),
+                             items=items)
+        except Exception as e:
+            print(f"❌ Error saving to inventory: {e}")
+            return False
+
+    def get_service_stats(self):
+        """Service request counters plus this client's connection pool counters"""
+        stats = self.pool.stats()
+        try:
+            stats.update(self.pool.call('stats'))
+        except (ServiceUnavailable, RuntimeError):
+            pass
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the inventory to billing windows on this machine")
+    parser.add_argument('--data-dir', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--backend', default=None, help="Storage backend behind the service (json, journal, sqlite)")
+    parser.add_argument('--socket', default=None, help=f"Socket path (default: DATA_DIR/{SOCKET_NAME})")
+    args = parser.parse_args()
+
+    service = InventoryService(args.data_dir, args.backend, args.socket)
+    service.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
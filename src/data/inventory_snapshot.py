@@ -0,0 +1,239 @@
+"""
+Memory-mapped inventory snapshot for Pharmacy Bill Entry
+A read-only binary layout of the inventory that can be mmap'ed at startup.
+Item names and per-item batch ranges are resolved by offset; records are only
+decoded from JSON when a batch list or an item's details are actually needed.
+
+Layout (all offsets in bytes from the start of the file, tables are native uint64):
+    MAGIC
+    header JSON line  - source signature, counts and section offsets
+    rec_offsets       - records+1 offsets into the records blob
+    batch_name_offsets- batch_names+1 offsets into the batch names blob
+    batch_starts      - batch_names+1 record numbers (records of a name are contiguous)
+    item_name_offsets - item_names+1 offsets into the item names blob
+    item_first        - item_names record numbers (first record seen for the display name)
+    records blob      - compact JSON per record, sorted by normalized item name then file order
+    batch names blob  - sorted normalized (ITEM_NAME) keys
+    item names blob   - sorted display names (item_name.strip()), as get_inventory_items keys them
+"""
+import json
+import mmap
+import os
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
+
+from data.inventory_index import normalize_key, search_entry
+
+MAGIC = b"PHSNAP01"
+SECTIONS = ('rec_offsets', 'batch_name_offsets', 'batch_starts', 'item_name_offsets',
+            'item_first', 'records', 'batch_names', 'item_names')
+
+
+def write_snapshot(path, records, source_signature):
+    """Write `records` as a mappable snapshot tagged with the inventory files' signature"""
+    keys = [normalize_key(record.get('item_name', '')).encode('utf-8') for record in records]
+    order = sorted(range(len(records)), key=lambda i: (keys[i], i))
+    rank = [0] * len(records)
+    for sorted_pos, file_pos in enumerate(order):
+        rank[file_pos] = sorted_pos
+
+    # Records, grouped by normalized name
+    records_blob = bytearray()
+    rec_offsets = array('Q', [0])
+    batch_names_blob = bytearray()
+    batch_name_offsets = array('Q', [0])
+    batch_starts = array('Q')
+    previous_key = None
+    for sorted_pos, file_pos in enumerate(order):
+        if keys[file_pos] != previous_key:
+            previous_key = keys[file_pos]
+            batch_names_blob += previous_key
+            batch_name_offsets.append(len(batch_names_blob))
+            batch_starts.append(sorted_pos)
+        records_blob += json.dumps(records[file_pos], separators=(',', ':')).encode('utf-8')
+        rec_offsets.append(len(records_blob))
+    batch_starts.append(len(records))
+
+    # Display names, first record seen in file order
+    first_seen = {}
+    for file_pos, record in enumerate(records):
+        item_name = record.get('item_name', '').strip()
+        if item_name and item_name not in first_seen:
+            first_seen[item_name] = rank[file_pos]
+    item_names_blob = bytearray()
+    item_name_offsets = array('Q', [0])
+    item_first = array('Q')
+    for name, sorted_pos in sorted((name.encode('utf-8'), pos) for name, pos in first_seen.items()):
+        item_names_blob += name
+        item_name_offsets.append(len(item_names_blob))
+        item_first.append(sorted_pos)
+
+    sections = {
+        'rec_offsets': rec_offsets.tobytes(),
+        'batch_name_offsets': batch_name_offsets.tobytes(),
+        'batch_starts': batch_starts.tobytes(),
+        'item_name_offsets': item_name_offsets.tobytes(),
+        'item_first': item_first.tobytes(),
+        'records': bytes(records_blob),
+        'batch_names': bytes(batch_names_blob),
+        'item_names': bytes(item_names_blob),
+    }
+
+    # The header is padded to a fixed size so section offsets can be computed first
+    header_size = 4096
+    offset = len(MAGIC) + header_size
+    placement = {}
+    for name in SECTIONS:
+        offset += -offset % 8
+        placement[name] = [offset, len(sections[name])]
+        offset += len(sections[name])
+
+    header = json.dumps({
+        'byteorder': sys.byteorder,
+        'signature': source_signature,
+        'records': len(records),
+        'batch_names': len(batch_starts) - 1,
+        'item_names': len(item_first),
+        'sections': placement,
+    }).encode('utf-8') + b"\n"
+    if len(header) > header_size:
+        raise ValueError("Snapshot header too large")
+
+    # Unique temp name: several counters (or managers in one process) may refresh it at once
+    fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp",
+                                     dir=os.path.dirname(path) or ".")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC)
+        f.write(header.ljust(header_size, b" "))
+        for name in SECTIONS:
+            f.write(b"\0" * (placement[name][0] - f.tell()))
+            f.write(sections[name])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+
+
+def read_snapshot_signature(path):
+    """Source signature a snapshot was written with (JSON form), or None if there is no readable snapshot"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            return json.loads(f.readline())['signature']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class MappedInventory:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.mm[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not an inventory snapshot")
+            header_end = self.mm.find(b"\n", len(MAGIC))
+            self.header = json.loads(self.mm[len(MAGIC):header_end])
+            if self.header['byteorder'] != sys.byteorder:
+                raise ValueError(f"{path} was written on a different byte order")
+        except Exception:
+            self.close()
+            raise
+
+        self.view = memoryview(self.mm)
+        self.sections = {}
+        for name, (offset, length) in self.header['sections'].items():
+            section = self.view[offset:offset + length]
+            self.sections[name] = section if name in ('records', 'batch_names', 'item_names') else section.cast('Q')
+
+        self.signature = self.header['signature']
+        self.rec_offsets = self.sections['rec_offsets']
+        self.batch_starts = self.sections['batch_starts']
+        self.item_first = self.sections['item_first']
+
+    def __len__(self):
+        return self.header['records']
+
+    def close(self):
+        """Release the mapping (views must be dropped before the mmap can close)"""
+        for section in getattr(self, 'sections', {}).values():
+            section.release()
+        self.sections = {}
+        if getattr(self, 'view', None) is not None:
+            self.view.release()
+            self.view = None
+        if getattr(self, 'mm', None) is not None:
+            self.mm.close()
+            self.mm = None
+        self.file.close()
+
+    def name_at(self, table, i):
+        """Bytes of name i in the 'batch_names' or 'item_names' table"""
+        offsets = self.sections[f"{table[:-1]}_offsets"]
+        return self.sections[table][offsets[i]:offsets[i + 1]].tobytes()
+
+    def find_name(self, table, count, key):
+        """Binary search a sorted name table; returns the position or -1"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.name_at(table, mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < count and self.name_at(table, lo) == key:
+            return lo
+        return -1
+
+    def record(self, i):
+        """Decode record number i (in snapshot order)"""
+        return json.loads(self.sections['records'][self.rec_offsets[i]:self.rec_offsets[i + 1]].tobytes())
+
+    def batches_for(self, item_name):
+        """Decode and return all records for an item name, in file order"""
+        key = normalize_key(item_name).encode('utf-8')
+        i = self.find_name('batch_names', self.header['batch_names'], key)
+        if i < 0:
+            return []
+        return [self.record(r) for r in range(self.batch_starts[i], self.batch_starts[i + 1])]
+
+    def item_record(self, item_name):
+        """Decode the first record seen for a display name, or None"""
+        i = self.find_name('item_names', self.header['item_names'], item_name.encode('utf-8'))
+        if i < 0:
+            return None
+        return self.record(self.item_first[i])
+
+    def item_names(self):
+        """Iterate display names in sorted order"""
+        for i in range(self.header['item_names']):
+            yield self.name_at('item_names', i).decode('utf-8')
+
+    def item_map(self):
+        """A lazy name -> search details mapping, as returned by get_inventory_items"""
+        return MappedItemMap(self)
+
+
+class MappedItemMap(Mapping):
+    """Read-only dict-like view: keys come from the name table, values are decoded on access"""
+
+    def __init__(self, mapped):
+        self.mapped = mapped
+
+    def __len__(self):
+        return self.mapped.header['item_names']
+
+    def __iter__(self):
+        return self.mapped.item_names()
+
+    def __contains__(self, item_name):
+        return isinstance(item_name, str) and self.mapped.find_name(
+            'item_names', len(self), item_name.encode('utf-8')) >= 0
+
+    def __getitem__(self, item_name):
+        item = self.mapped.item_record(item_name) if isinstance(item_name, str) else None
+        if item is None:
+            raise KeyError(item_name)
+        return search_entry(item_name, item)
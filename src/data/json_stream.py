@@ -0,0 +1,112 @@
+"""
+Streaming JSON array reader for Pharmacy Bill Entry
+Walks a top-level JSON array element by element with bounded memory, so
+multi-hundred-MB inventory exports can be loaded on low-spec billing PCs.
+write_json_array writes the matching file, one element per line.
+"""
+import codecs
+import json
+import os
+
+# Bytes read from disk per step
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# String values up to this length are shared between records (e.g. "0", "10", "12")
+SHARED_VALUE_LENGTH = 5
+# Characters an element may span before the file is taken as malformed or truncated
+MAX_ELEMENT_SIZE = 16 * 1024 * 1024
+
+
+def write_json_array(f, elements):
+    """Write `elements` to the text file `f` as a JSON array, one element per line
+
+    json.dumps per element keeps to the C encoder; json.dump with indent runs
+    the pure-Python one, several times slower on a large inventory.
+    """
+    write_encoded_array(f, map(json.dumps, elements))
+
+
+def write_encoded_array(f, texts):
+    """write_json_array for elements already encoded with json.dumps"""
+    f.write("[\n" + ",\n".join(texts) + "\n]\n")
+
+
+def iter_json_array(path, progress=None, chunk_size=DEFAULT_CHUNK_SIZE, max_element_size=MAX_ELEMENT_SIZE):
+    """Yield the elements of the top-level JSON array in `path` one at a time
+
+    progress(bytes_read, total_bytes) is called after each chunk is read.
+    Memory use is one chunk plus the element being decoded, not the whole file;
+    an element that still doesn't decode after `max_element_size` characters
+    raises ValueError with its offset instead of reading on.
+    """
+    total = os.path.getsize(path)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    shared = {}
+
+    def share(pairs):
+        # Per-element decoding loses json.load's key memo; share keys and short values instead
+        return {shared.setdefault(k, k): (shared.setdefault(v, v) if isinstance(v, str) and len(v) <= SHARED_VALUE_LENGTH else v)
+                for k, v in pairs}
+
+    json_decoder = json.JSONDecoder(object_pairs_hook=share)
+
+    with open(path, 'rb') as f:
+        buffer = ''
+        pos = 0
+        dropped = 0     # characters before buffer[0]
+        bytes_read = 0
+        eof = False
+        started = False
+
+        def fill():
+            nonlocal buffer, pos, dropped, bytes_read, eof
+            chunk = f.read(chunk_size)
+            bytes_read += len(chunk)
+            if not chunk:
+                eof = True
+            dropped += pos
+            buffer = buffer[pos:] + decoder.decode(chunk, final=eof)
+            pos = 0
+            if progress:
+                progress(bytes_read, total)
+
+        def check_size():
+            if len(buffer) - pos > max_element_size:
+                raise ValueError(f"{path}: no complete element within {max_element_size} characters "
+                                 f"of character offset {dropped + pos}; malformed or truncated file")
+
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    raise ValueError(f"{path}: unexpected end of file")
+                fill()
+                continue
+
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"{path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+
+            try:
+                element, end = json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"{path}: {e.msg} at character offset {dropped + e.pos}") from e
+                check_size()
+                fill()
+                continue
+
+            # A bare number could continue in the next chunk
+            if end == len(buffer) and not eof and buffer[pos] not in '{["':
+                check_size()
+                fill()
+                continue
+
+            pos = end
+            yield element
@@ -1,45 +1,194 @@
 """
-Migrate data from bills_database.json to inventory.json
-This is a one-time migration script
+Migrate data from bills_database.json to the inventory
+Streams the bills, merges repeated item+batch lines as it goes and writes the
+result through the configured storage backend. Progress is checkpointed, so an
+interrupted run over a multi-year history picks up where it stopped. Lines the
+inventory can't take (e.g. a non-numeric qty) are skipped and listed.
+
+Run: python src/data/migrate_to_inventory.py [--backend json] [--merge] [--restart]
 """
+import argparse
+import contextlib
+import hashlib
 import json
 import os
-from datetime import datetime
+import sys
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.inventory_index import InventoryIndex, check_line
+from data.json_stream import iter_json_array
+from data.storage import create_session_manager
 
 # Get the data directory
 data_dir = os.path.dirname(os.path.abspath(__file__))
 bills_file = os.path.join(data_dir, "bills_database.json")
-inventory_file = os.path.join(data_dir, "inventory.json")
+checkpoint_file = os.path.join(data_dir, "migrate_to_inventory.checkpoint")
+
+# Bill lines merged between checkpoints
+CHECKPOINT_LINES = 50000
+# Skipped lines listed one by one; the rest are only counted
+REPORT_SKIPPED = 20
+
+
+def load_checkpoint(path):
+    """Return the saved checkpoint, or None if there is none"""
+    try:
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        print(f"⚠️ Ignoring damaged checkpoint {path}")
+        return None
+    return checkpoint
+
+
+def bill_digest(digest, bill):
+    """Fold one bill into the running digest of the bills merged so far
 
-def migrate():
+    The checkpoint keeps this digest, so a resumed run can tell the bills it
+    skips are the ones already merged, however the file was rewritten since.
+    """
+    digest.update(json.dumps(bill, sort_keys=True, separators=(',', ':')).encode('utf-8'))
+    digest.update(b"\n")
+
+
+class SourceChanged(Exception):
+    """The bills before the checkpoint are not the ones it merged"""
+
+
+def write_checkpoint(path, checkpoint):
+    """Replace the checkpoint file (temp + rename, so it is never half-written)"""
+    temp_file = path + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(checkpoint, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+
+
+def migrate(backend=None, merge=False, restart=False, checkpoint_lines=CHECKPOINT_LINES):
     """Migrate bills to inventory format"""
     if not os.path.exists(bills_file):
         print("❌ No bills_database.json found")
-        return
-    
-    # Load bills
-    with open(bills_file, 'r') as f:
-        bills = json.load(f)
-    
-    print(f"📊 Found {len(bills)} bills to migrate")
-    
-    # Create inventory from bills
-    inventory = []
-    
-    for bill in bills:
-        if 'items' in bill:
-            for item in bill['items']:
-                # Add timestamps
-                item['added_at'] = datetime.now().isoformat()
-                item['last_updated'] = datetime.now().isoformat()
-                inventory.append(item)
-    
-    # Save inventory
-    with open(inventory_file, 'w') as f:
-        json.dump(inventory, f, indent=2)
-    
-    print(f"✅ Migrated {len(inventory)} items to inventory.json")
-    print(f"📁 Inventory saved to: {inventory_file}")
+        return False
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_file)
+
+    if checkpoint and checkpoint['state'] == 'writing':
+        # The final write started but was not confirmed - running it again could count bills twice
+        print("❌ A previous migration stopped while writing the inventory.")
+        print(f"   Check the inventory, then delete {checkpoint_file} or run with --restart.")
+        return False
+
+    manager = create_session_manager(data_dir, backend)
+    if not checkpoint and not merge and manager.load_inventory_index().records:
+        print("❌ The inventory already has records; run with --merge to add the bills on top")
+        return False
+
+    # Merged so far: one record per item+batch, so memory follows the catalog, not the history
+    if checkpoint:
+        index = InventoryIndex(checkpoint['records'])
+        bills_done = checkpoint['bills_done']
+        lines_done = checkpoint['lines_done']
+        lines_skipped = checkpoint.get('lines_skipped', 0)
+        print(f"↩️ Resuming after {bills_done} bills ({lines_done} lines)")
+    else:
+        index = InventoryIndex()
+        bills_done = 0
+        lines_done = 0
+        lines_skipped = 0
+    digest = hashlib.sha256()
+
+    def save_checkpoint(state):
+        write_checkpoint(checkpoint_file, {
+            'state': state,
+            'bills_digest': digest.hexdigest(),
+            'bills_done': bills_done,
+            'lines_done': lines_done,
+            'lines_skipped': lines_skipped,
+            'records': index.records,
+        })
+
+    def progress(bytes_read, total_bytes):
+        if total_bytes:
+            print(f"\r📊 Reading bills: {bytes_read * 100 // total_bytes}%", end="", flush=True)
+
+    start = time.perf_counter()
+    lines_this_run = 0
+    lines_since_checkpoint = 0
+
+    try:
+        position = -1
+        for position, bill in enumerate(iter_json_array(bills_file, progress)):
+            bill_digest(digest, bill)
+            if position < bills_done:
+                if position == bills_done - 1 and digest.hexdigest() != checkpoint.get('bills_digest'):
+                    raise SourceChanged()
+                continue
+
+            items = []
+            for number, item in enumerate(bill.get('items', []) if isinstance(bill, dict) else [], 1):
+                try:
+                    check_line(item)
+                    items.append(item)
+                except ValueError as e:
+                    lines_skipped += 1
+                    if lines_skipped <= REPORT_SKIPPED:
+                        print(f"\r⚠️ Skipped bill {position + 1} line {number}: {e}")
+            index.merge(items)
+            bills_done = position + 1
+            lines_done += len(items)
+            lines_this_run += len(items)
+            lines_since_checkpoint += len(items)
+
+            if lines_since_checkpoint >= checkpoint_lines:
+                save_checkpoint('running')
+                lines_since_checkpoint = 0
+                elapsed = time.perf_counter() - start
+                print(f"\r💾 Checkpoint: {bills_done} bills, {lines_done} lines, "
+                      f"{lines_this_run / elapsed:,.0f} lines/sec", flush=True)
+        if position < bills_done - 1:
+            raise SourceChanged()  # Fewer bills than the checkpoint had merged
+    except SourceChanged:
+        print()
+        print("⚠️ bills_database.json changed since the checkpoint - starting over")
+        return migrate(backend, merge, True, checkpoint_lines)
+    print()
+
+    read_time = time.perf_counter() - start
+    print(f"📊 Merged {lines_done} lines from {bills_done} bills into {len(index.records)} item+batch records")
+    if lines_skipped:
+        print(f"⚠️ Skipped {lines_skipped} lines the inventory can't take"
+              + (f" (first {REPORT_SKIPPED} listed above)" if lines_skipped > REPORT_SKIPPED else ""))
+
+    # Mark the write as started before handing the records to the backend
+    save_checkpoint('writing')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # save_to_inventory prints a line per record; errors still reach stderr
+        ok = manager.save_to_inventory(index.records)
+    if not ok:
+        # Nothing was written; keep the merged progress so a rerun only retries the write
+        save_checkpoint('running')
+        print("❌ Could not write the inventory - run the migration again to retry")
+        return False
+    os.remove(checkpoint_file)
+
+    total_time = time.perf_counter() - start
+    print(f"✅ Migrated {lines_done} lines into {len(index.records)} inventory records")
+    if read_time > 0:
+        print(f"⏱️ {lines_this_run / read_time:,.0f} lines/sec merged, {total_time:.2f} s total")
+    print(f"📁 Inventory saved to: {getattr(manager, 'db_file', manager.inventory_file)}")
+    return True
+
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Migrate bills_database.json into the inventory")
+    parser.add_argument('--backend', default=None, help="Storage backend to write to (default: PHARMACY_STORAGE or json)")
+    parser.add_argument('--merge', action='store_true', help="Add the bills on top of an existing inventory")
+    parser.add_argument('--restart', action='store_true', help="Ignore any checkpoint and start from the first bill")
+    args = parser.parse_args()
+
+    sys.exit(0 if migrate(args.backend, args.merge, args.restart) else 1)
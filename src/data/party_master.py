@@ -0,0 +1,323 @@
+"""
+Party master for Pharmacy Bill Entry
+The supplier list behind the Party field, kept in parties.json and seeded from
+saved bills. Each party carries a usage rank that grows with every bill and
+fades with age (it halves every RANK_HALF_LIFE_DAYS), so the dropdown lists
+the suppliers used most often and most recently first.
+
+Ranks are stored as log2(sum of 2 ** (day / RANK_HALF_LIFE_DAYS)) over the
+days a party was used, which orders parties the same on any day without
+rescoring. Names sit in a PrefixIndex; a min-segment tree over the sorted
+names, holding the best-ranked position under each node, gives the
+best-ranked k names of any prefix range, so a keystroke costs
+O(log n + k log n) however many parties share the prefix.
+
+Recording a use (once per saved bill) updates the party's leaf and the path
+above it in place, and queues the use for a writer thread that rewrites
+parties.json; uses that arrive while it writes go out together in the next
+write. If another counter saved the master meanwhile, the writer applies the
+queued uses to that file instead, and the next record_use reloads it.
+"""
+import heapq
+import json
+import math
+import os
+import threading
+from bisect import bisect_left
+
+from data.file_lock import FileLock
+from data.inventory_cache import file_signature
+from data.inventory_index import normalize_key
+from data.prefix_index import PrefixIndex
+from utils.dates import format_day, parse_day, today_key
+
+# A use counts half as much after this many days
+RANK_HALF_LIFE_DAYS = 30
+# Parties shown in the dropdown
+MAX_PARTY_MATCHES = 20
+
+
+def add_use(rank, day):
+    """Rank after one more use on `day` (a day key); `rank` is None for an unused party"""
+    weight = day / RANK_HALF_LIFE_DAYS
+    if rank is None:
+        return weight
+    high, low = max(rank, weight), min(rank, weight)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def bill_day(bill):
+    """Day key a saved bill was entered, or None"""
+    return parse_day(bill.get('bill_dt', '')) or parse_day(str(bill.get('saved_at', ''))[:10])
+
+
+def read_records(path):
+    """KEY -> record from a parties.json (empty if it doesn't exist yet)"""
+    records = {}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                for record in json.load(f):
+                    key = normalize_key(record.get('name', ''))
+                    if key:
+                        records[key] = record
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Party master not loaded: {e}")
+    return records
+
+
+def use_record(records, name, day):
+    """Count one use of `name` on `day` in `records` (None: just make sure the party exists)
+
+    Records are replaced, never changed in place, so a list of them taken
+    for writing stays as it was. Returns (record, True if the party is new).
+    """
+    key = normalize_key(name)
+    old = records.get(key)
+    if old is None:
+        record = {'name': name.strip(), 'uses': 0, 'last_used': '', 'rank': None}
+    elif day is None:
+        return old, False
+    else:
+        record = dict(old)
+    if day is not None:
+        record['uses'] += 1
+        record['rank'] = add_use(record['rank'], day)
+        if not record['last_used'] or day > (parse_day(record['last_used']) or 0):
+            record['last_used'] = format_day(day)
+    records[key] = record
+    return record, old is None
+
+
+def write_records(path, records):
+    """Write `records` (in file order) to a temp file and rename it over `path`"""
+    # Write to a temp file and rename so other counters never read a half-written file
+    temp_file = path + ".tmp"
+    # One record per line; json.dumps per record keeps to the C encoder (json.dump with indent doesn't)
+    with open(temp_file, 'w') as f:
+        f.write("[\n" + ",\n".join(json.dumps(record) for record in records) + "\n]\n")
+    os.replace(temp_file, path)
+
+
+class PartyMaster:
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(os.path.splitext(path)[0] + ".lock")  # Counters sharing the data directory
+        self.index = None
+
+        # Background writes (see record_use)
+        self.condition = threading.Condition()  # Guards the fields below and changes to the records
+        self.pending = []       # (name, day) uses not yet written
+        self.stale = False      # Another counter's save was merged on disk; reload before the next use
+        self.closed = False
+        self.thread = None
+
+        self.load()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, name):
+        return normalize_key(name) in self.records
+
+    def load(self):
+        """Read parties.json (an empty master if it doesn't exist yet)"""
+        self.signature = file_signature((self.path,))
+        self.records = read_records(self.path)     # KEY -> {'name', 'uses', 'last_used', 'rank'}
+        self.index_records()
+
+    def save(self):
+        write_records(self.path, [self.records[key] for key in self.index.keys])
+        self.signature = file_signature((self.path,))
+
+    def seed(self, bills=(), names=()):
+        """Fill a new master from saved bills (party usage) and a list of known names, then save it"""
+        with self.lock:
+            for bill in bills:
+                name = (bill.get('party') or '').strip()
+                if name:
+                    self.use(name, bill_day(bill) or today_key())
+            for name in names:
+                self.use(name, None)
+            self.index_records()
+            self.save()
+
+    def use(self, name, day):
+        """Count one use of `name` on `day` (None: just make sure the party exists); returns its record"""
+        return use_record(self.records, name, day)[0]
+
+    def record_use(self, name, day=None):
+        """Count a bill from `name` on `day` (default today); the master is written in the background
+
+        Call it with searches held off (the autocomplete lock): the rank tree
+        changes in place.
+        """
+        if not normalize_key(name):
+            return False
+        if self.stale:
+            self.reload()
+        day = today_key() if day is None else day
+        with self.condition:
+            record, new = use_record(self.records, name, day)
+            if new:
+                self.index.add(record['name'])
+                self.build_tree()
+            else:
+                self.update_tree(bisect_left(self.index.keys, normalize_key(name)))
+            self.pending.append((name, day))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="party-master-writer", daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return True
+
+    def reload(self):
+        """Load the master another counter saved, then reapply the uses not written yet"""
+        with self.lock:
+            with self.condition:
+                self.stale = False
+                self.signature = file_signature((self.path,))
+                self.records = read_records(self.path)
+                for name, day in self.pending:
+                    use_record(self.records, name, day)
+                self.index_records()
+
+    def run(self):
+        """Writer thread: write the queued uses, one write for all that piled up meanwhile"""
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+            self.write_pending()
+
+    def write_pending(self):
+        """Write the queued uses to parties.json; returns False (and keeps them queued) on an error"""
+        with self.lock:
+            with self.condition:
+                uses, self.pending = self.pending, []
+                if not uses:
+                    return True
+                signature = self.signature
+                # Records are replaced on use, so this list can be written while uses go on
+                rows = [self.records[key] for key in self.index.keys]
+            try:
+                if file_signature((self.path,)) != signature:
+                    # Another counter saved since: apply these uses to its file
+                    records = read_records(self.path)
+                    for name, day in uses:
+                        use_record(records, name, day)
+                    rows = [records[key] for key in sorted(records)]
+                    write_records(self.path, rows)
+                    with self.condition:
+                        self.stale = True
+                else:
+                    write_records(self.path, rows)
+                    with self.condition:
+                        self.signature = file_signature((self.path,))
+                return True
+            except OSError as e:
+                print(f"❌ Error saving party master: {e}")
+                with self.condition:
+                    self.pending[:0] = uses
+                return False
+
+    def flush(self):
+        """Write any queued uses now, on the calling thread"""
+        return self.write_pending()
+
+    def close(self):
+        """Write the queued uses and stop the writer thread"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        return self.flush()
+
+    def index_records(self):
+        """Rebuild the name index from the records; ranges from the old index stop narrowing"""
+        version = self.index.version + 1 if self.index is not None else 0
+        self.index = PrefixIndex(record['name'] for record in self.records.values())
+        self.index.version = version
+        self.build_tree()
+
+    def sort_key(self, position):
+        """Best rank first; never-used parties last; alphabetical (sorted position) within a tie"""
+        rank = self.records[self.index.keys[position]]['rank']
+        return rank is None, -(rank or 0), position
+
+    def build_tree(self):
+        """Sort key of each sorted position and a min-segment tree of the best position under each node"""
+        keys = self.index.keys
+        sort_key = self.sort_key
+        # One past the last position is the padding, which sorts after every party
+        self.sort_keys = [sort_key(position) for position in range(len(keys))] + [(True, 0, len(keys))]
+        sort_keys = self.sort_keys
+
+        size = 1
+        while size < len(keys):
+            size *= 2
+        tree = [len(keys)] * (2 * size)
+        tree[size:size + len(keys)] = range(len(keys))
+        for node in range(size - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = left if sort_keys[left] < sort_keys[right] else right
+        self.tree = tree
+        self.tree_size = size
+
+    def update_tree(self, position):
+        """Re-rank one party (its rank changed) along the path from its leaf"""
+        sort_keys = self.sort_keys
+        sort_keys[position] = self.sort_key(position)
+        tree = self.tree
+        node = (position + self.tree_size) // 2
+        while node:
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = left if sort_keys[left] < sort_keys[right] else right
+            node //= 2
+
+    def search(self, prefix, previous=None):
+        """Range of parties starting with `prefix` (see PrefixIndex.search)"""
+        return self.index.search(prefix, previous)
+
+    def top(self, matches, limit=MAX_PARTY_MATCHES):
+        """Names in a search range, most used (and most recently used) first, then alphabetical"""
+        tree = self.tree
+        size = self.tree_size
+        sort_keys = self.sort_keys
+        lo, hi = matches.lo + size, matches.hi + size
+        heap = []
+        while lo < hi:
+            if lo & 1:
+                heap.append((sort_keys[tree[lo]], lo))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                heap.append((sort_keys[tree[hi]], hi))
+            lo //= 2
+            hi //= 2
+        heapq.heapify(heap)
+
+        names = []
+        keys = self.index.keys
+        records = self.records
+        while heap and len(names) < limit:
+            node = heapq.heappop(heap)[1]
+            position = tree[node]
+            # Walk down to the leaf holding this position, queueing the siblings passed on the way
+            while node < size:
+                node *= 2
+                if tree[node] != position:
+                    node += 1
+                    heapq.heappush(heap, (sort_keys[tree[node - 1]], node - 1))
+                else:
+                    heapq.heappush(heap, (sort_keys[tree[node + 1]], node + 1))
+            names.append(records[keys[position]]['name'])
+        return names
+
+    def complete(self, prefix, limit=MAX_PARTY_MATCHES):
+        """Best-ranked parties starting with `prefix` (one-off search)"""
+        return self.top(self.search(prefix), limit)
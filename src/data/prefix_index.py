@@ -0,0 +1,104 @@
+"""
+Prefix index for Pharmacy Bill Entry
+Sorted, normalized names searched with bisect. Each keystroke that extends the
+previous search narrows that search's range instead of starting over, so the
+cost per keystroke is O(log r + k) for a range of r names and k results.
+"""
+from bisect import bisect_left, bisect_right, insort
+
+from data.inventory_index import normalize_key
+
+# Sorts after any character a name can hold
+PREFIX_END = '\U0010ffff'
+
+
+class PrefixRange:
+    """The matches of one search: positions [lo, hi) of index version `version`"""
+    __slots__ = ('prefix', 'lo', 'hi', 'version')
+
+    def __init__(self, prefix, lo, hi, version):
+        self.prefix = prefix
+        self.lo = lo
+        self.hi = hi
+        self.version = version
+
+    def __len__(self):
+        return self.hi - self.lo
+
+
+class PrefixIndex:
+    def __init__(self, names=()):
+        self.names = {}     # KEY -> name as stored
+        for name in names:
+            self.names.setdefault(normalize_key(name), name)
+        self.keys = sorted(self.names)  # Normalized names, sorted
+        self.version = 0                # Bumped on every change; older ranges can't be narrowed
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, name):
+        return normalize_key(name) in self.names
+
+    def add(self, name):
+        """Add a name (no-op if present); returns True if it was new"""
+        key = normalize_key(name)
+        if not key or key in self.names:
+            return False
+        self.names[key] = name
+        insort(self.keys, key)
+        self.version += 1
+        return True
+
+    def remove(self, name):
+        key = normalize_key(name)
+        if self.names.pop(key, None) is None:
+            return False
+        del self.keys[bisect_left(self.keys, key)]
+        self.version += 1
+        return True
+
+    def update(self, names):
+        """Bring the index in line with `names` (e.g. a refreshed catalog), touching only the difference"""
+        wanted = {}
+        for name in names:
+            wanted.setdefault(normalize_key(name), name)
+        wanted.pop('', None)
+        removed = self.names.keys() - wanted.keys()
+        added = wanted.keys() - self.names.keys()
+        if not removed and not added:
+            return 0
+
+        if len(removed) + len(added) > len(self.keys) // 8:
+            # Large change: one sort beats many list inserts
+            self.names = wanted
+            self.keys = sorted(wanted)
+        else:
+            for key in removed:
+                del self.names[key]
+                del self.keys[bisect_left(self.keys, key)]
+            for key in added:
+                self.names[key] = wanted[key]
+                insort(self.keys, key)
+        self.version += 1
+        return len(removed) + len(added)
+
+    def search(self, prefix, previous=None):
+        """Range of names starting with `prefix`, narrowed from `previous` when it still applies"""
+        prefix = normalize_key(prefix)
+        lo, hi = 0, len(self.keys)
+        if (previous is not None and previous.version == self.version
+                and prefix.startswith(previous.prefix)):
+            lo, hi = previous.lo, previous.hi
+        lo = bisect_left(self.keys, prefix, lo, hi)
+        hi = bisect_right(self.keys, prefix + PREFIX_END, lo, hi)
+        return PrefixRange(prefix, lo, hi, self.version)
+
+    def names_in(self, matches, limit=None):
+        """Stored names of a search range, in sorted order, at most `limit` of them"""
+        end = matches.hi if limit is None else min(matches.hi, matches.lo + limit)
+        return [self.names[key] for key in self.keys[matches.lo:end]]
+
+    def complete(self, prefix, limit=None):
+        """Names starting with `prefix` (one-off search)"""
+        return self.names_in(self.search(prefix), limit)
@@ -4,7 +4,27 @@ Handles temporary session state and permanent database storage
 """
 import json
 import os
-from datetime import datetime
+import threading
+import time
+
+from data.expiry_index import ExpiryIndex, fefo_key
+from data.file_lock import FileLock
+from data.inventory_cache import INVENTORY_CACHE, file_signature
+from data.inventory_index import InventoryIndex, search_entry
+from data.inventory_snapshot import MappedInventory, read_snapshot_signature, write_snapshot
+from data.json_stream import iter_json_array, write_encoded_array
+
+# Collapse the session log into a fresh snapshot after this many records
+SESSION_LOG_LIMIT = 200
+
+# Inventory files at least this large are streamed instead of parsed in one go
+STREAM_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+# Optimistic save attempts before merging under the lock with a fresh reload
+SAVE_ATTEMPTS = 5
+# Re-reads while another counter is mid-write (odd generation) before giving up waiting
+READ_ATTEMPTS = 50
+
 
 class SessionManager:
     def __init__(self, data_dir="data"):
@@ -12,96 +32,394 @@ class SessionManager:
         self.session_file = os.path.join(data_dir, "current_session.json")
         self.database_file = os.path.join(data_dir, "bills_database.json")  # Legacy - keeping for reference
         self.inventory_file = os.path.join(data_dir, "inventory.json")
+        self.session_log_file = os.path.join(data_dir, "current_session.log")
+        
+        # Last session state written to disk, used to log only what changed
+        self.session_lock = threading.RLock()
+        self.session_state = None
+        self.session_log_records = 0
+        self.session_log_limit = SESSION_LOG_LIMIT
+        
+        # Memory-mapped read path for large inventories (see inventory_snapshot.py)
+        self.snapshot_file = os.path.join(data_dir, "inventory.snap")
+        self.snapshot_lock = threading.Lock()
+        self.snapshot_pending = False
+        self.snapshot_thread = None
+        self.mapped = None
+        self.mapped_signature = None
+        
+        # Several counters may share this directory: writes take the file lock and
+        # bump the generation (odd while a write is in progress, even when done)
+        self.lock_file = os.path.join(data_dir, "inventory.lock")
+        self.version_file = os.path.join(data_dir, "inventory.version")
+        self.inventory_lock = FileLock(self.lock_file)
+        
+        # JSON text of each inventory record as last written, so a save re-encodes only the bill's records
+        self.encoded_index = None
+        self.encoded_records = []
+        
+        # Expiry-ordered view of the cached index (see expiry_index.py)
+        self.expiry = None
+        self.expiry_lock = threading.Lock()
         
         # Ensure data directory exists
         os.makedirs(data_dir, exist_ok=True)
     
     def save_session(self, session_data):
-        """Save current session state (temporary - auto-saves on changes)"""
+        """Save current session state (temporary - auto-saves on changes)
+
+        Only what changed since the last save is appended to the session log,
+        so an autosave costs the same on line 200 as on line 1.
+        """
         try:
-            with open(self.session_file, 'w') as f:
-                json.dump(session_data, f, indent=2)
+            with self.session_lock:
+                records = self.session_changes(session_data)
+                if records is None or self.session_log_records + len(records) > self.session_log_limit:
+                    self.collapse_session(session_data)
+                elif records:
+                    with open(self.session_log_file, 'a') as f:
+                        for record in records:
+                            f.write(json.dumps(record, separators=(',', ':')) + "\n")
+                    self.session_log_records += len(records)
+                self.session_state = self.copy_session(session_data)
             return True
         except Exception as e:
+            # Start over from a full snapshot on the next save
+            self.session_state = None
             print(f"Error saving session: {e}")
             return False
     
+    def copy_session(self, session_data):
+        """Copy a session dict deep enough that later UI edits can be diffed against it"""
+        state = dict(session_data)
+        state['inventory'] = [dict(line) for line in session_data.get('inventory', [])]
+        return state
+    
+    def session_changes(self, session_data):
+        """Return the log records that turn the last saved session into session_data
+
+        Returns None when the change can't be expressed as appends (first save,
+        lines removed or header fields added/removed) and a full snapshot is needed.
+        """
+        state = self.session_state
+        if state is None or state.keys() != session_data.keys():
+            return None
+        
+        old_lines = state['inventory']
+        new_lines = session_data.get('inventory', [])
+        if len(new_lines) < len(old_lines):
+            return None
+        
+        records = []
+        header = {key: value for key, value in session_data.items()
+                  if key != 'inventory' and state[key] != value}
+        if header:
+            records.append({'op': 'header', 'fields': header})
+        for i, line in enumerate(new_lines[:len(old_lines)]):
+            if old_lines[i] != line:
+                records.append({'op': 'edit', 'index': i, 'line': line})
+        for line in new_lines[len(old_lines):]:
+            records.append({'op': 'add', 'line': line})
+        return records
+    
+    def collapse_session(self, session_data):
+        """Write the whole session as a fresh snapshot and start an empty log"""
+        # Write to a temp file and rename so a crash never leaves a half-written session.
+        # The log goes first: a crash in between loses the newest lines, never repeats them.
+        temp_file = self.session_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(session_data, f, indent=2)
+        if os.path.exists(self.session_log_file):
+            os.remove(self.session_log_file)
+        os.replace(temp_file, self.session_file)
+        self.session_log_records = 0
+    
     def load_session(self):
-        """Load last session state if exists"""
+        """Load last session state if exists (snapshot plus replayed log)"""
         try:
-            if os.path.exists(self.session_file):
+            with self.session_lock:
+                if not os.path.exists(self.session_file):
+                    return None
                 with open(self.session_file, 'r') as f:
-                    return json.load(f)
-            return None
+                    session_data = json.load(f)
+                
+                self.session_log_records = 0
+                torn = False
+                if os.path.exists(self.session_log_file):
+                    with open(self.session_log_file, 'r') as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                            except ValueError:
+                                # Torn write from a crash - everything before it is intact
+                                torn = True
+                                break
+                            self.apply_session_record(session_data, record)
+                            self.session_log_records += 1
+                if torn:
+                    # Rewrite so new records aren't appended after the damaged line
+                    self.collapse_session(session_data)
+                
+                self.session_state = self.copy_session(session_data)
+                return session_data
         except Exception as e:
             print(f"Error loading session: {e}")
             return None
     
+    def apply_session_record(self, session_data, record):
+        """Apply one session log record"""
+        op = record.get('op')
+        if op == 'header':
+            session_data.update(record['fields'])
+        elif op == 'add':
+            session_data.setdefault('inventory', []).append(record['line'])
+        elif op == 'edit':
+            session_data['inventory'][record['index']] = record['line']
+    
     def clear_session(self):
         """Clear current session file"""
         try:
-            if os.path.exists(self.session_file):
-                os.remove(self.session_file)
+            with self.session_lock:
+                if os.path.exists(self.session_log_file):
+                    os.remove(self.session_log_file)
+                if os.path.exists(self.session_file):
+                    os.remove(self.session_file)
+                self.session_state = None
+                self.session_log_records = 0
             return True
         except Exception as e:
             print(f"Error clearing session: {e}")
             return False
     
+    def inventory_cache_key(self):
+        """Key for this inventory in the process-wide cache"""
+        return (type(self).__name__, os.path.abspath(self.inventory_file))
+    
+    def inventory_paths(self):
+        """Files whose mtime/size/inode decide whether the cached inventory is still valid"""
+        return (self.inventory_file, self.version_file)
+    
+    def read_generation(self):
+        """Current inventory generation (odd while a counter is writing)"""
+        try:
+            with open(self.version_file, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+    
+    def write_generation(self, generation):
+        """Replace the generation file (call with inventory_lock held)"""
+        temp_file = self.version_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            f.write(str(generation))
+        os.replace(temp_file, self.version_file)
+    
+    def load_inventory_index(self, progress=None):
+        """Return the inventory index, re-reading disk only if the files changed"""
+        return INVENTORY_CACHE.get(self.inventory_cache_key(), self.inventory_paths(),
+                                   lambda: self.read_consistent_index(progress))
+    
+    def read_consistent_index(self, progress=None):
+        """Read the inventory without locking, retrying if another counter wrote meanwhile"""
+        for attempt in range(READ_ATTEMPTS):
+            before = self.read_generation()
+            if before % 2 and attempt < READ_ATTEMPTS - 1:
+                time.sleep(0.01)
+                continue
+            index = self.read_inventory_index(progress)
+            if self.read_generation() == before:
+                return index
+        # A counter crashed mid-write (generation stuck odd); the files are still whole
+        return index
+    
+    def get_cache_stats(self):
+        """Inventory cache hit, miss and reload counters"""
+        return INVENTORY_CACHE.stats()
+    
+    def read_inventory_index(self, progress=None):
+        """Load inventory.json into a normalized item+batch index
+
+        Large files (or any file when a progress callback is given) are streamed
+        record by record, so the raw file text is never held in memory at once.
+        """
+        if not os.path.exists(self.inventory_file):
+            return InventoryIndex()
+        
+        if progress or os.path.getsize(self.inventory_file) >= STREAM_THRESHOLD_BYTES:
+            return InventoryIndex(iter_json_array(self.inventory_file, progress))
+        
+        with open(self.inventory_file, 'r') as f:
+            return InventoryIndex(json.load(f))
+    
+    def write_inventory(self, index, changed_records):
+        """Persist the merged inventory - the JSON backend rewrites the whole file
+
+        Only records the merge touched are encoded again, but the file write
+        itself stays O(catalog) per save; the journal and SQLite backends
+        write only the bill.
+        """
+        encoded = self.encoded_records
+        if self.encoded_index is not index:
+            encoded[:] = map(json.dumps, index.records)
+            self.encoded_index = index
+            index.follow(self)
+        else:
+            records = index.records
+            for position in index.merged_since(self):
+                if position == len(encoded):
+                    encoded.append(json.dumps(records[position]))
+                else:
+                    encoded[position] = json.dumps(records[position])
+        
+        # Write to a temp file and rename so other counters never read a half-written file
+        temp_file = self.inventory_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            write_encoded_array(f, encoded)
+        os.replace(temp_file, self.inventory_file)
+    
     def save_to_inventory(self, items):
         """Save items to inventory. If item+batch exists, increase qty; otherwise add new entry"""
         try:
-            # Load existing inventory
-            inventory = []
-            if os.path.exists(self.inventory_file):
-                with open(self.inventory_file, 'r') as f:
-                    inventory = json.load(f)
-            
-            items_added = 0
-            items_updated = 0
-            
-            # Process each item
-            for new_item in items:
-                item_name = new_item.get('item_name', '').strip().upper()
-                batch = new_item.get('batch', '').strip().upper()
-                new_qty = float(new_item.get('qty', 0) or 0)
-                
-                if not item_name or not batch:
-                    continue
+            for attempt in range(SAVE_ATTEMPTS):
+                # Bring the index up to date without holding the lock (normalized keys
+                # are computed once here). The generation is read first so any write
+                # that lands during the load shows up as a conflict below.
+                generation = self.read_generation()
+                index = self.load_inventory_index()
                 
-                # Check if item+batch combination exists
-                found = False
-                for existing_item in inventory:
-                    if (existing_item.get('item_name', '').strip().upper() == item_name and 
-                        existing_item.get('batch', '').strip().upper() == batch):
-                        # Update quantity
-                        old_qty = float(existing_item.get('qty', 0) or 0)
-                        existing_item['qty'] = str(old_qty + new_qty)
-                        existing_item['last_updated'] = datetime.now().isoformat()
-                        found = True
-                        items_updated += 1
-                        print(f"📦 Updated: {item_name} (Batch: {batch}) - Qty: {old_qty} → {old_qty + new_qty}")
-                        break
-                
-                if not found:
-                    # Add new entry
-                    new_item['added_at'] = datetime.now().isoformat()
-                    new_item['last_updated'] = datetime.now().isoformat()
-                    inventory.append(new_item)
-                    items_added += 1
-                    print(f"✨ Added: {item_name} (Batch: {batch}) - Qty: {new_qty}")
-            
-            # Save inventory
-            with open(self.inventory_file, 'w') as f:
-                json.dump(inventory, f, indent=2)
+                with self.inventory_lock:
+                    current = self.read_generation()
+                    if current != generation:
+                        if attempt < SAVE_ATTEMPTS - 1:
+                            # Another counter saved in between - reload and merge again
+                            continue
+                        # Heavily contended: reload while holding the lock so this attempt can't lose
+                        index = self.load_inventory_index()
+                    
+                    # Odd generation marks the write in progress (even if we crash mid-write)
+                    self.write_generation(current + 1 + current % 2)
+                    changes = self.merge_and_report(index, items)
+                    self.write_inventory(index, [record for record, _, _ in changes])
+                    self.write_generation(current + 2 + current % 2)
+                    
+                    # Keep the merged index as the cached copy
+                    INVENTORY_CACHE.put(self.inventory_cache_key(), self.inventory_paths(), index)
+                break
             
-            print(f"✅ Inventory saved: {items_added} new, {items_updated} updated")
+            items_added = sum(1 for _, old_qty, _ in changes if old_qty is None)
+            print(f"✅ Inventory saved: {items_added} new, {len(changes) - items_added} updated")
             return True
         except Exception as e:
+            # The cached index may hold a half-applied merge
+            INVENTORY_CACHE.invalidate(self.inventory_cache_key())
+            self.encoded_index = None
             print(f"❌ Error saving to inventory: {e}")
             import traceback
             traceback.print_exc()
             return False
     
+    def merge_and_report(self, index, items):
+        """Merge a bill into the index and print each change"""
+        # Merge the whole bill through the item+batch index
+        changes = index.merge(items)
+        for record, old_qty, new_qty in changes:
+            item_name = record.get('item_name', '').strip().upper()
+            batch = record.get('batch', '').strip().upper()
+            if old_qty is not None:
+                print(f"📦 Updated: {item_name} (Batch: {batch}) - Qty: {old_qty} → {old_qty + new_qty}")
+            else:
+                print(f"✨ Added: {item_name} (Batch: {batch}) - Qty: {new_qty}")
+        return changes
+    
+    def inventory_view(self, progress=None):
+        """Cheapest up-to-date view of the inventory: the cached index, the mapped snapshot, or a full load"""
+        index = INVENTORY_CACHE.peek(self.inventory_cache_key(), self.inventory_paths())
+        if index is not None:
+            return index
+        
+        mapped = self.open_mapped_inventory()
+        if mapped is not None:
+            return mapped
+        
+        index = self.load_inventory_index(progress)
+        self.refresh_snapshot()
+        return index
+    
+    def open_mapped_inventory(self):
+        """Map inventory.snap if it was written from the current inventory files, else None"""
+        if not os.path.exists(self.snapshot_file):
+            return None
+        
+        signature = json.loads(json.dumps(file_signature(self.inventory_paths())))
+        snapshot_signature = file_signature((self.snapshot_file,))
+        if self.mapped is not None and self.mapped_signature == snapshot_signature:
+            return self.mapped if self.mapped.signature == signature else None
+        
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        try:
+            self.mapped = MappedInventory(self.snapshot_file)
+            self.mapped_signature = snapshot_signature
+        except Exception as e:
+            print(f"⚠️ Ignoring inventory snapshot: {e}")
+            return None
+        return self.mapped if self.mapped.signature == signature else None
+    
+    def refresh_snapshot(self):
+        """Rewrite inventory.snap in the background from the cached index
+
+        Called after a full load, a journal compaction and on close - not per
+        save, which would cost a whole-catalog write for every bill.
+        """
+        with self.snapshot_lock:
+            self.snapshot_pending = True
+            if self.snapshot_thread is None:
+                self.snapshot_thread = threading.Thread(target=self.snapshot_worker, daemon=True)
+                self.snapshot_thread.start()
+    
+    def snapshot_records(self):
+        """(signature, copies of the records) for the cached index, or None if it no longer matches the files
+
+        Taken under the inventory lock, so no merge is half-applied and the
+        copies belong to exactly the files the signature describes.
+        """
+        with self.inventory_lock:
+            entry = INVENTORY_CACHE.entry(self.inventory_cache_key())
+            if not entry or not entry[1].records or entry[0] != file_signature(self.inventory_paths()):
+                return None
+            return entry[0], [dict(record) for record in entry[1].records]
+    
+    def snapshot_worker(self):
+        """Write snapshots until no refresh is pending"""
+        while True:
+            with self.snapshot_lock:
+                if not self.snapshot_pending:
+                    self.snapshot_thread = None
+                    return
+                self.snapshot_pending = False
+            
+            try:
+                pending = self.snapshot_records()
+                if pending is not None:
+                    write_snapshot(self.snapshot_file, pending[1], pending[0])
+            except (OSError, ValueError) as e:
+                # The old snapshot is still mapped on Windows; the next refresh retries
+                print(f"⚠️ Inventory snapshot not refreshed: {e}")
+    
+    def snapshot_is_current(self):
+        """True if inventory.snap was written from the current inventory files"""
+        signature = read_snapshot_signature(self.snapshot_file)
+        return signature is not None and signature == json.loads(json.dumps(file_signature(self.inventory_paths())))
+    
+    def close(self):
+        """Bring inventory.snap up to date for the next start and wait for it to be written"""
+        if not self.snapshot_is_current():
+            self.refresh_snapshot()
+        thread = self.snapshot_thread
+        if thread is not None:
+            thread.join()
+    
     def get_all_bills(self):
         """Get all saved bills from database"""
         try:
@@ -113,15 +431,22 @@ class SessionManager:
             print(f"Error loading database: {e}")
             return []
     
-    def get_inventory_items(self):
-        """Get all inventory items grouped by name for search"""
+    def get_inventory_items(self, progress=None):
+        """Get all inventory items grouped by name for search
+
+        progress(bytes_read, total_bytes) is called while a large inventory file is read.
+        """
         try:
-            if not os.path.exists(self.inventory_file):
-                print(f"⚠️ No inventory file found at {self.inventory_file}")
-                return {}
+            view = self.inventory_view(progress)
+            if isinstance(view, MappedInventory):
+                # Names come straight from the mapped snapshot; details are decoded on access
+                print(f"📊 Mapped {len(view)} items from {self.snapshot_file}")
+                return view.item_map()
             
-            with open(self.inventory_file, 'r') as f:
-                inventory_list = json.load(f)
+            inventory_list = view.records
+            if not inventory_list:
+                print(f"⚠️ No inventory found at {self.inventory_file}")
+                return {}
             
             print(f"📊 Found {len(inventory_list)} items in inventory")
             
@@ -134,15 +459,7 @@ class SessionManager:
                 if item_name:
                     # If item doesn't exist or this entry is newer, use it
                     if item_name not in inventory_dict:
-                        inventory_dict[item_name] = {
-                            'item_name': item_name,
-                            'unit': item.get('unit', ''),
-                            'batch': item.get('batch', ''),
-                            'exp_dt': item.get('exp_dt', ''),
-                            'mrp': item.get('mrp', ''),
-                            'ptr': item.get('ptr', ''),
-                            'gst_percent': item.get('gst_percent', '0')
-                        }
+                        inventory_dict[item_name] = search_entry(item_name, item)
             
             print(f"📦 Loaded {len(inventory_dict)} unique item names")
             return inventory_dict
@@ -153,30 +470,55 @@ class SessionManager:
             return {}
     
     def get_item_batches(self, item_name):
-        """Get all available batches for a specific item"""
+        """Get all available batches for a specific item, earliest expiry first (FEFO)"""
         try:
-            if not os.path.exists(self.inventory_file):
-                return []
+            view = self.inventory_view()
+            if isinstance(view, MappedInventory):
+                records = sorted(view.batches_for(item_name), key=fefo_key)
+            else:
+                records = self.get_expiry_index().fefo_batches(item_name)
             
-            with open(self.inventory_file, 'r') as f:
-                inventory_list = json.load(f)
-            
-            # Filter batches for this specific item
+            # Look up batches for this specific item
             batches = []
-            for item in inventory_list:
-                if item.get('item_name', '').strip().upper() == item_name.strip().upper():
-                    batches.append({
-                        'item_name': item.get('item_name', ''),
-                        'unit': item.get('unit', ''),
-                        'batch': item.get('batch', ''),
-                        'exp_dt': item.get('exp_dt', ''),
-                        'mrp': item.get('mrp', ''),
-                        'qty': item.get('qty', '0'),
-                        'ptr': item.get('ptr', ''),
-                        'gst_percent': item.get('gst_percent', '0')
-                    })
+            for item in records:
+                batches.append({
+                    'item_name': item.get('item_name', ''),
+                    'unit': item.get('unit', ''),
+                    'batch': item.get('batch', ''),
+                    'exp_dt': item.get('exp_dt', ''),
+                    'mrp': item.get('mrp', ''),
+                    'qty': item.get('qty', '0'),
+                    'ptr': item.get('ptr', ''),
+                    'gst_percent': item.get('gst_percent', '0')
+                })
             
             return batches
         except Exception as e:
             print(f"❌ Error getting batches: {e}")
             return []
+    
+    def get_expiry_index(self):
+        """Expiry index over the current inventory, rebuilt only if it was reloaded"""
+        index = self.load_inventory_index()
+        with self.expiry_lock:
+            if self.expiry is None or self.expiry.index is not index:
+                self.expiry = ExpiryIndex(index)
+            else:
+                self.expiry.refresh()
+            return self.expiry
+    
+    def get_expiring_batches(self, months, today=None):
+        """In-stock batches expiring within the next `months` months, earliest first"""
+        try:
+            return self.get_expiry_index().expiring_within(months, today)
+        except Exception as e:
+            print(f"❌ Error getting expiring batches: {e}")
+            return []
+    
+    def get_expired_batches(self, today=None):
+        """In-stock batches past their expiry month, oldest first"""
+        try:
+            return self.get_expiry_index().expired(today)
+        except Exception as e:
+            print(f"❌ Error getting expired batches: {e}")
+            return []
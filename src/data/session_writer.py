@@ -0,0 +1,120 @@
+"""
+Background session writer for Pharmacy Bill Entry
+Coalesces bursts of session autosaves so typing never waits on disk
+"""
+import threading
+import time
+
+# Write at most this often while changes keep coming in...
+DEFAULT_INTERVAL_MS = 500
+# ...unless this many changes have piled up first
+DEFAULT_MAX_PENDING = 20
+
+
+class SessionWriter:
+    def __init__(self, session_manager, interval_ms=DEFAULT_INTERVAL_MS, max_pending=DEFAULT_MAX_PENDING):
+        self.session_manager = session_manager
+        self.interval = interval_ms / 1000.0
+        self.max_pending = max_pending
+
+        self.condition = threading.Condition()
+        self.io_lock = threading.Lock()  # Held while a write or clear is on disk
+        self.pending = None              # Latest session snapshot not yet written
+        self.pending_count = 0           # Changes coalesced into that snapshot
+        self.first_pending_at = None
+        self.closed = False
+
+        # Counters
+        self.submitted = 0
+        self.written = 0
+
+        self.thread = threading.Thread(target=self.run, name="session-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, session_data):
+        """Queue a session snapshot to be written in the background"""
+        # Copy the line list so later appends on the UI thread don't race the writer
+        snapshot = dict(session_data)
+        if 'inventory' in snapshot:
+            snapshot['inventory'] = list(snapshot['inventory'])
+
+        with self.condition:
+            if self.pending is None:
+                self.first_pending_at = time.monotonic()
+            self.pending = snapshot
+            self.pending_count += 1
+            self.submitted += 1
+            self.condition.notify()
+
+    def take_pending(self):
+        """Remove and return the pending snapshot (call with the condition held)"""
+        snapshot = self.pending
+        self.pending = None
+        self.pending_count = 0
+        self.first_pending_at = None
+        return snapshot
+
+    def write(self, snapshot):
+        if snapshot is None:
+            return True
+        ok = self.session_manager.save_session(snapshot)
+        if ok:
+            self.written += 1
+        return ok
+
+    def run(self):
+        """Writer thread: wait for the interval or the change limit, then write the latest snapshot"""
+        while True:
+            with self.condition:
+                while not self.closed:
+                    if self.pending is not None:
+                        waited = time.monotonic() - self.first_pending_at
+                        if waited >= self.interval or self.pending_count >= self.max_pending:
+                            break
+                        self.condition.wait(self.interval - waited)
+                    else:
+                        self.condition.wait()
+                if self.closed:
+                    return
+                # Take the I/O lock before releasing the condition so flush() and
+                # clear() can't slip in between taking the snapshot and writing it
+                self.io_lock.acquire()
+                snapshot = self.take_pending()
+
+            try:
+                self.write(snapshot)
+            finally:
+                self.io_lock.release()
+
+    def flush(self):
+        """Write any pending snapshot now, on the calling thread"""
+        with self.condition:
+            self.io_lock.acquire()
+            snapshot = self.take_pending()
+        try:
+            return self.write(snapshot)
+        finally:
+            self.io_lock.release()
+
+    def clear(self):
+        """Drop any pending snapshot and clear the stored session"""
+        with self.condition:
+            self.io_lock.acquire()
+            self.take_pending()
+        try:
+            return self.session_manager.clear_session()
+        finally:
+            self.io_lock.release()
+
+    def close(self):
+        """Flush pending changes and stop the writer thread"""
+        ok = self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        return ok
+
+    def get_stats(self):
+        """Submitted vs written counters (the difference is what coalescing saved)"""
+        return {'submitted': self.submitted, 'written': self.written}
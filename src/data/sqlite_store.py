@@ -0,0 +1,323 @@
+"""
+SQLite storage backend for Pharmacy Bill Entry
+Implements the SessionManager API on a local SQLite file (WAL mode)
+
+One-shot import from the JSON files:
+    python src/data/sqlite_store.py --import
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.expiry_index import fefo_key
+from data.inventory_index import InventoryIndex, LINE_FIELDS, normalize_key
+from data.session_manager import SessionManager
+
+# Record fields stored in their own columns; anything else goes in `extra`
+RECORD_FIELDS = LINE_FIELDS + ('added_at', 'last_updated')
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS inventory (
+    id INTEGER PRIMARY KEY,
+    item_key TEXT NOT NULL,
+    batch_key TEXT NOT NULL,
+    {', '.join(f'{field} TEXT' for field in RECORD_FIELDS)},
+    extra TEXT,
+    UNIQUE (item_key, batch_key)
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_batch ON inventory (batch_key);
+CREATE TABLE IF NOT EXISTS session (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bills (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# Seconds a statement waits for another counter's lock before "database is locked"
+BUSY_TIMEOUT_S = 10
+# Attempts at switching to WAL and creating the schema; several counters opening a
+# fresh database at once can still collide there after the busy timeout
+OPEN_ATTEMPTS = 20
+OPEN_RETRY_DELAY_S = 0.05
+
+COLUMNS = ('item_key', 'batch_key') + RECORD_FIELDS + ('extra',)
+INSERT_SQL = f"INSERT INTO inventory ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+UPDATE_SQL = "UPDATE inventory SET qty = ?, last_updated = ? WHERE item_key = ? AND batch_key = ?"
+SELECT_SQL = f"SELECT {', '.join(RECORD_FIELDS)}, extra FROM inventory"
+
+
+def record_to_row(record):
+    """Convert an inventory record dict to an inventory table row"""
+    extra = {key: value for key, value in record.items() if key not in RECORD_FIELDS}
+    return (
+        (normalize_key(record.get('item_name', '')), normalize_key(record.get('batch', '')))
+        + tuple(record.get(field) for field in RECORD_FIELDS)
+        + (json.dumps(extra) if extra else None,)
+    )
+
+
+def row_to_record(row):
+    """Convert an inventory table row (SELECT_SQL order) back to a record dict"""
+    record = {field: value for field, value in zip(RECORD_FIELDS, row) if value is not None}
+    if row[-1]:
+        record.update(json.loads(row[-1]))
+    return record
+
+
+class SQLiteSessionManager(SessionManager):
+    def __init__(self, data_dir="data"):
+        super().__init__(data_dir)
+        self.db_file = os.path.join(data_dir, "pharmacy.db")
+
+        # One connection shared by the window and any background writer
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_file, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+        self.conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_S * 1000}")
+        self.open_database()
+
+        # Whole-table index for expiry and analytics queries, kept until another
+        # connection commits (this connection's saves are merged into it in place)
+        self.cached_index = None
+        self.cached_version = None
+
+    def open_database(self):
+        """Switch to WAL and create the schema, retrying while another counter holds the database"""
+        for attempt in range(OPEN_ATTEMPTS):
+            try:
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("PRAGMA synchronous=NORMAL")
+                self.conn.executescript(SCHEMA)
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == OPEN_ATTEMPTS - 1:
+                    raise
+                time.sleep(OPEN_RETRY_DELAY_S * (attempt + 1))
+
+    def close(self):
+        """Close the database connection"""
+        super().close()
+        with self.lock:
+            self.conn.close()
+
+    def save_session(self, session_data):
+        """Save current session state (temporary - auto-saves on changes)"""
+        try:
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO session (id, data) VALUES (1, ?)",
+                                  (json.dumps(session_data),))
+            return True
+        except Exception as e:
+            print(f"Error saving session: {e}")
+            return False
+
+    def load_session(self):
+        """Load last session state if exists"""
+        try:
+            with self.lock:
+                row = self.conn.execute("SELECT data FROM session WHERE id = 1").fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            print(f"Error loading session: {e}")
+            return None
+
+    def clear_session(self):
+        """Clear current session"""
+        try:
+            with self.lock, self.conn:
+                self.conn.execute("DELETE FROM session")
+            return True
+        except Exception as e:
+            print(f"Error clearing session: {e}")
+            return False
+
+    def data_version(self):
+        """Changes whenever another connection commits to the database (call with lock held)"""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load_inventory_index(self, progress=None):
+        """Load the inventory table into a normalized item+batch index, re-reading only after another connection wrote"""
+        with self.lock:
+            version = self.data_version()
+            if self.cached_index is None or self.cached_version != version:
+                rows = self.conn.execute(f"{SELECT_SQL} ORDER BY id").fetchall()
+                self.cached_index = InventoryIndex(row_to_record(row) for row in rows)
+                self.cached_version = version
+            return self.cached_index
+
+    def save_to_inventory(self, items):
+        """Save items to inventory. If item+batch exists, increase qty; otherwise add new entry"""
+        try:
+            keys = {(normalize_key(item.get('item_name', '')), normalize_key(item.get('batch', '')))
+                    for item in items}
+
+            with self.lock, self.conn:
+                # Take the write lock before reading so a bill saved at another counter
+                # between our read and our write can't be overwritten
+                self.conn.execute("BEGIN IMMEDIATE")
+
+                if self.cached_index is not None and self.cached_version == self.data_version():
+                    # Nobody else wrote since the table was cached: merge into the cached
+                    # index so expiry and analytics views only catch up on this bill
+                    index = self.cached_index
+                else:
+                    # Fetch only the batches this bill touches, then merge them in memory
+                    self.cached_index = None
+                    existing = []
+                    for key in keys:
+                        row = self.conn.execute(f"{SELECT_SQL} WHERE item_key = ? AND batch_key = ?",
+                                                key).fetchone()
+                        if row:
+                            existing.append(row_to_record(row))
+                    index = InventoryIndex(existing)
+
+                items_added = 0
+                items_updated = 0
+                touched = {}
+                added = set()
+                for record, old_qty, new_qty in index.merge(items):
+                    key = (normalize_key(record.get('item_name', '')), normalize_key(record.get('batch', '')))
+                    touched[key] = record
+                    if old_qty is not None:
+                        items_updated += 1
+                        print(f"📦 Updated: {key[0]} (Batch: {key[1]}) - Qty: {old_qty} → {old_qty + new_qty}")
+                    else:
+                        added.add(key)
+                        items_added += 1
+                        print(f"✨ Added: {key[0]} (Batch: {key[1]}) - Qty: {new_qty}")
+
+                # One batched upsert for the whole bill, inside a single transaction
+                self.conn.executemany(UPDATE_SQL, [
+                    (record['qty'], record['last_updated']) + key
+                    for key, record in touched.items() if key not in added
+                ])
+                self.conn.executemany(INSERT_SQL, [
+                    record_to_row(record) for key, record in touched.items() if key in added
+                ])
+
+            print(f"✅ Inventory saved: {items_added} new, {items_updated} updated")
+            return True
+        except Exception as e:
+            # The cached index may hold a merge that was rolled back
+            with self.lock:
+                self.cached_index = None
+            print(f"❌ Error saving to inventory: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+
+    def get_all_bills(self):
+        """Get all saved bills from database"""
+        try:
+            with self.lock:
+                rows = self.conn.execute("SELECT data FROM bills ORDER BY id").fetchall()
+            return [json.loads(row[0]) for row in rows]
+        except Exception as e:
+            print(f"Error loading database: {e}")
+            return []
+
+    def get_inventory_items(self, progress=None):
+        """Get all inventory items grouped by name for search (progress is unused - no file is parsed)"""
+        try:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT item_name, unit, batch, exp_dt, mrp, ptr, gst_percent FROM inventory ORDER BY id"
+                ).fetchall()
+
+            print(f"📊 Found {len(rows)} items in inventory")
+
+            # Group by item name (for search dropdown), keeping the first batch seen
+            inventory_dict = {}
+            for item_name, unit, batch, exp_dt, mrp, ptr, gst_percent in rows:
+                item_name = (item_name or '').strip()
+                if item_name and item_name not in inventory_dict:
+                    inventory_dict[item_name] = {
+                        'item_name': item_name,
+                        'unit': unit or '',
+                        'batch': batch or '',
+                        'exp_dt': exp_dt or '',
+                        'mrp': mrp or '',
+                        'ptr': ptr or '',
+                        'gst_percent': gst_percent if gst_percent is not None else '0'
+                    }
+
+            print(f"📦 Loaded {len(inventory_dict)} unique item names")
+            return inventory_dict
+        except Exception as e:
+            print(f"❌ Error loading inventory: {e}")
+            import traceback
+            traceback.print_exc()
+            return {}
+
+    def get_item_batches(self, item_name):
+        """Get all available batches for a specific item, earliest expiry first (FEFO)"""
+        try:
+            with self.lock:
+                rows = self.conn.execute(
+                    "SELECT item_name, unit, batch, exp_dt, mrp, qty, ptr, gst_percent "
+                    "FROM inventory WHERE item_key = ? ORDER BY id",
+                    (normalize_key(item_name),)
+                ).fetchall()
+
+            # exp_dt is mm/yy text, so FEFO order is applied here rather than in SQL
+            rows.sort(key=lambda row: fefo_key({'exp_dt': row[3]}))
+
+            return [{
+                'item_name': name or '',
+                'unit': unit or '',
+                'batch': batch or '',
+                'exp_dt': exp_dt or '',
+                'mrp': mrp or '',
+                'qty': qty if qty is not None else '0',
+                'ptr': ptr or '',
+                'gst_percent': gst_percent if gst_percent is not None else '0'
+            } for name, unit, batch, exp_dt, mrp, qty, ptr, gst_percent in rows]
+        except Exception as e:
+            print(f"❌ Error getting batches: {e}")
+            return []
+
+    def import_from_json(self, force=False):
+        """One-shot import of inventory.json, bills_database.json and current_session.json"""
+        with self.lock:
+            count = self.conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+        if count and not force:
+            print(f"⚠️ {self.db_file} already has {count} inventory rows - skipping import")
+            return False
+
+        json_manager = SessionManager(self.data_dir)
+        inventory = json_manager.load_inventory_index().records
+        bills = json_manager.get_all_bills()
+        session = json_manager.load_session()
+
+        with self.lock, self.conn:
+            self.cached_index = None
+            self.conn.execute("DELETE FROM inventory")
+            self.conn.execute("DELETE FROM bills")
+            # INSERT OR IGNORE keeps the first record when the JSON file has duplicate item+batch rows
+            self.conn.executemany(INSERT_SQL.replace("INSERT", "INSERT OR IGNORE", 1),
+                                  [record_to_row(record) for record in inventory])
+            self.conn.executemany("INSERT INTO bills (data) VALUES (?)",
+                                  [(json.dumps(bill),) for bill in bills])
+            if session:
+                self.conn.execute("INSERT OR REPLACE INTO session (id, data) VALUES (1, ?)",
+                                  (json.dumps(session),))
+
+        print(f"✅ Imported {len(inventory)} inventory records and {len(bills)} bills into {self.db_file}")
+        return True
+
+
+if __name__ == "__main__":
+    if "--import" in sys.argv:
+        data_dir = os.path.dirname(os.path.abspath(__file__))
+        manager = SQLiteSessionManager(data_dir)
+        manager.import_from_json(force="--force" in sys.argv)
+        manager.close()
+    else:
+        print("Usage: python sqlite_store.py --import [--force]")
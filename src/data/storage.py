@@ -0,0 +1,28 @@
+"""
+Storage backend selection for Pharmacy Bill Entry
+Every backend implements the SessionManager API
+"""
+import os
+
+# Backend used when none is passed in (override with e.g. PHARMACY_STORAGE=sqlite)
+DEFAULT_BACKEND = os.environ.get('PHARMACY_STORAGE', 'json')
+
+
+def create_session_manager(data_dir="data", backend=None):
+    """Create a session manager for the selected storage backend ("json", "journal", "sqlite" or "service")"""
+    backend = (backend or DEFAULT_BACKEND).lower()
+
+    if backend == 'json':
+        from data.session_manager import SessionManager
+        return SessionManager(data_dir=data_dir)
+    if backend == 'journal':
+        from data.inventory_journal import JournalSessionManager
+        return JournalSessionManager(data_dir=data_dir)
+    if backend == 'sqlite':
+        from data.sqlite_store import SQLiteSessionManager
+        return SQLiteSessionManager(data_dir=data_dir)
+    if backend == 'service':
+        from data.inventory_service import ServiceSessionManager
+        return ServiceSessionManager(data_dir=data_dir)
+
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,337 @@
+"""
+Trigram index and ranked item search for Pharmacy Bill Entry
+Finds item names by substring ("500MG" anywhere in the name) and with typos
+("PARACETMOL"), ranked:
+
+    1. prefix hits    - the name starts with the query (from the PrefixIndex)
+    2. substring hits - a later word starts with the query, then the query
+                        inside a word (earlier and shorter names first)
+    3. fuzzy hits     - most trigrams shared with the query
+
+and capped at the top K. Word-start hits are a bisect into the sorted suffixes
+that begin at each word; mid-word candidates come from intersecting the
+postings of the query's rarest trigrams; fuzzy scoring only counts trigrams
+rare enough to be informative, so no query walks the whole catalog. A
+three-letter query has a single trigram, which can be in thousands of names,
+so common trigrams also keep their mid-word hits in rank order and the top K
+are read off the front.
+
+The trigram index takes seconds to build at 100k names, so
+ItemSearch(names, background=True) builds it on a worker thread: until it is
+in, searches answer with prefix hits only, and names added or updated in the
+meantime are replayed onto it before it is installed.
+
+Latency budget: SEARCH_BUDGET_MS for the slowest keystroke at 100k names
+(checked by src/benchmarks/bench_search.py).
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import chain
+
+from data.inventory_index import normalize_key
+from data.prefix_index import PREFIX_END, PrefixIndex
+
+# Results returned per search
+TOP_K = 20
+# Per-keystroke budget at 100k names, in milliseconds
+SEARCH_BUDGET_MS = 5
+# Trigrams in more than this share of names (and more than FUZZY_MIN_POSTINGS names)
+# carry too little signal for fuzzy scoring
+FUZZY_MAX_SHARE = 0.02
+FUZZY_MIN_POSTINGS = 500
+# Share of the query's informative trigrams a fuzzy hit must have
+FUZZY_MIN_SCORE = 0.5
+# Tombstoned ids that trigger a rebuild, as a share of the index
+REBUILD_SHARE = 0.25
+# Trigrams in more names than this keep their mid-word hits ranked (see TrigramIndex.rank)
+RANKED_MIN_POSTINGS = 256
+
+# Characters after which a new word starts
+WORD_BREAKS = ' -/(+,'
+
+PREFIX = 'prefix'
+SUBSTRING = 'substring'
+FUZZY = 'fuzzy'
+
+
+def trigrams(key):
+    """Distinct trigrams of a normalized name"""
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def word_starts(key):
+    """Offsets of the words after the first in a normalized name"""
+    return [i for i in range(1, len(key)) if key[i - 1] in WORD_BREAKS and key[i] not in WORD_BREAKS]
+
+
+class TrigramIndex:
+    def __init__(self, names=()):
+        self.build(names)
+
+    def build(self, names):
+        self.keys = []          # id -> normalized name
+        self.names = []         # id -> name as stored
+        self.ids = {}           # normalized name -> id
+        self.postings = {}      # trigram -> array of ids, ascending
+        self.words = []         # (name suffix from a later word's start, id), sorted
+        self.ranked = {}        # common trigram -> array of ids of its mid-word hits, in rank order
+        self.removed = set()    # ids of names no longer in the catalog
+        # Ids in (length, name) order, so ranking a posting only has to sort by offset
+        for _, _, name in sorted((len(key), key, name) for key, name in
+                                 ((normalize_key(name), name) for name in names)):
+            self.add(name, sort_words=False)
+        self.words.sort()
+        for gram, posting in self.postings.items():
+            if len(posting) > RANKED_MIN_POSTINGS:
+                self.ranked[gram] = self.rank(gram, posting)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, name, sort_words=True):
+        key = normalize_key(name)
+        if not key or key in self.ids:
+            return False
+        position = len(self.keys)
+        self.keys.append(key)
+        self.names.append(name)
+        self.ids[key] = position
+        postings = self.postings
+        for gram in trigrams(key):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array('i')
+            posting.append(position)
+            if gram in self.ranked:
+                self.insert_ranked(gram, position)
+        for start in word_starts(key):
+            if sort_words:
+                insort(self.words, (key[start:], position))
+            else:
+                self.words.append((key[start:], position))
+        return True
+
+    def remove(self, name):
+        position = self.ids.pop(normalize_key(name), None)
+        if position is None:
+            return False
+        self.removed.add(position)
+        return True
+
+    def update(self, names):
+        """Bring the index in line with `names`; returns how many names were added or removed"""
+        wanted = {}
+        for name in names:
+            wanted.setdefault(normalize_key(name), name)
+        wanted.pop('', None)
+        removed = self.ids.keys() - wanted.keys()
+        added = wanted.keys() - self.ids.keys()
+        for key in removed:
+            self.removed.add(self.ids.pop(key))
+        if len(self.removed) > len(self.keys) * REBUILD_SHARE:
+            self.build(wanted.values())
+        else:
+            for key in added:
+                self.add(wanted[key])
+        return len(removed) + len(added)
+
+    def word_start_ids(self, key, exclude, limit):
+        """Up to `limit` ids of names with a later word starting with `key`, in suffix order"""
+        words = self.words
+        end_key = (key + PREFIX_END,)
+        found = []
+        seen = set(exclude)
+        removed = self.removed
+        at = bisect_left(words, (key,))
+        while at < len(words) and len(found) < limit:
+            entry = words[at]
+            if entry >= end_key:
+                break
+            position = entry[1]
+            if position not in seen and position not in removed:
+                seen.add(position)
+                found.append(position)
+            at += 1
+        return found
+
+    def rank_key(self, gram, position):
+        """Where a mid-word hit on `gram` ranks: earlier in the name, then shorter, then by name"""
+        key = self.keys[position]
+        return key.find(gram), len(key), key
+
+    def rank(self, gram, posting):
+        """The ids in `posting` (ascending, so in (length, name) order) whose first `gram` is mid-word, in rank order"""
+        keys = self.keys
+        by_offset = {}
+        for position in posting:
+            key = keys[position]
+            at = key.find(gram)
+            if at > 0 and key[at - 1] not in WORD_BREAKS:
+                hits = by_offset.get(at)
+                if hits is None:
+                    hits = by_offset[at] = array('i')
+                hits.append(position)
+        ranked = array('i')
+        for at in sorted(by_offset):
+            ranked.extend(by_offset[at])
+        return ranked
+
+    def insert_ranked(self, gram, position):
+        """Put a newly added id into the ranked hits of `gram`, if its first `gram` is mid-word"""
+        key = self.keys[position]
+        at = key.find(gram)
+        if at == 0 or key[at - 1] in WORD_BREAKS:
+            return
+        ranked = self.ranked[gram]
+        rank = self.rank_key(gram, position)
+        lo, hi = 0, len(ranked)
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.rank_key(gram, ranked[middle]) < rank:
+                lo = middle + 1
+            else:
+                hi = middle
+        ranked.insert(lo, position)
+
+    def mid_word_ids(self, key, exclude, limit):
+        """Up to `limit` ids of names whose first `key` (3+ characters) is inside a word, best ranked first"""
+        removed = self.removed
+        ranked = self.ranked.get(key) if len(key) == 3 else None
+        if ranked is not None:
+            found = []
+            for position in ranked:
+                if position not in exclude and position not in removed:
+                    found.append(position)
+                    if len(found) == limit:
+                        break
+            return found
+
+        grams = trigrams(key)
+        postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:3]:
+            if len(posting) > 4 * len(candidates):
+                break
+            candidates.intersection_update(posting)
+        keys = self.keys
+        hits = []
+        for position in candidates:
+            if position in exclude or position in removed:
+                continue
+            name_key = keys[position]
+            at = name_key.find(key)
+            if at > 0 and name_key[at - 1] not in WORD_BREAKS:
+                hits.append((at, len(name_key), name_key, position))
+        return [hit[-1] for hit in heapq.nsmallest(limit, hits)]
+
+    def fuzzy_ids(self, key, exclude, limit):
+        """Up to `limit` ids sharing the most informative trigrams with `key`"""
+        grams = trigrams(key)
+        if not grams:
+            return []
+        max_posting = max(FUZZY_MIN_POSTINGS, int(len(self.keys) * FUZZY_MAX_SHARE))
+        informative = [self.postings[gram] for gram in grams
+                       if gram in self.postings and len(self.postings[gram]) <= max_posting]
+        if not informative:
+            return []
+        counts = Counter(chain.from_iterable(informative))
+        min_shared = max(1, int(len(informative) * FUZZY_MIN_SCORE + 0.5))
+        keys = self.keys
+        best = heapq.nsmallest(limit, (
+            (-shared, abs(len(keys[position]) - len(key)), keys[position], position)
+            for position, shared in counts.items()
+            if shared >= min_shared and position not in exclude and position not in self.removed))
+        return [position for _, _, _, position in best]
+
+
+class ItemSearch:
+    """Ranked prefix / substring / fuzzy search over item names"""
+
+    def __init__(self, names=(), background=False):
+        """With `background`, the trigram index is built on a worker thread (prefix-only search until then)"""
+        names = list(names)
+        self.prefix = PrefixIndex(names)
+        self.lock = threading.Lock()    # Orders add/update against installing a background build
+        self.pending = []               # (method, argument) calls to replay onto the index being built
+        self.built = threading.Event()
+        if background:
+            self.trigrams = None
+            threading.Thread(target=self.build_trigrams, args=(names,), name="item-search-build",
+                             daemon=True).start()
+        else:
+            self.trigrams = TrigramIndex(names)
+            self.built.set()
+
+    def __len__(self):
+        return len(self.prefix)
+
+    def build_trigrams(self, names):
+        trigram_index = TrigramIndex(names)
+        with self.lock:
+            for method, argument in self.pending:
+                getattr(trigram_index, method)(argument)
+            self.pending = []
+            self.trigrams = trigram_index
+        self.built.set()
+
+    @property
+    def ready(self):
+        """True once substring and fuzzy search are available"""
+        return self.built.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the trigram index is in; returns ready"""
+        return self.built.wait(timeout)
+
+    def add(self, name):
+        """Add one name (e.g. a new item from a saved bill); returns True if it was new"""
+        with self.lock:
+            if self.trigrams is None:
+                self.pending.append(('add', name))
+            else:
+                self.trigrams.add(name)
+        return self.prefix.add(name)
+
+    def update(self, names):
+        names = list(names)
+        with self.lock:
+            if self.trigrams is None:
+                self.pending.append(('update', names))
+            else:
+                self.trigrams.update(names)
+        return self.prefix.update(names)
+
+    def search(self, query, limit=TOP_K, previous=None):
+        """Return ([(name, kind)], prefix range) for `query`
+
+        `previous` is the prefix range from the last keystroke; pass the
+        returned one back in so typing on narrows it.
+        """
+        key = normalize_key(query)
+        prefix_range = self.prefix.search(key, previous)
+        results = [(name, PREFIX) for name in self.prefix.names_in(prefix_range, limit)]
+        trigram_index = self.trigrams
+        if len(results) >= limit or len(key) < 3 or trigram_index is None:
+            return results, prefix_range
+
+        # Substring hits that aren't prefix hits: later words starting with the query...
+        found = {trigram_index.ids[normalize_key(name)] for name, _ in results}
+        for position in trigram_index.word_start_ids(key, found, limit - len(results)):
+            found.add(position)
+            results.append((trigram_index.names[position], SUBSTRING))
+
+        # ...then the query inside a word, earlier and shorter names first
+        if len(results) < limit:
+            for position in trigram_index.mid_word_ids(key, found, limit - len(results)):
+                found.add(position)
+                results.append((trigram_index.names[position], SUBSTRING))
+
+        if len(results) < limit:
+            for position in trigram_index.fuzzy_ids(key, found, limit - len(results)):
+                results.append((trigram_index.names[position], FUZZY))
+        return results, prefix_range
@@ -1,24 +1,123 @@
+"""
+Bill model for Pharmacy Bill Entry
+The lines of a purchase bill plus array-backed Qty, BASE and Amount columns.
+Money is kept in integer paise with running totals, so the bill total is
+O(1) and never drifts by float rounding however many lines are added.
+"""
+from array import array
+
+from models.product import Product
+
+
+def to_paise(rupees):
+    return int(round(rupees * 100))
+
+
+def line_columns(product):
+    """(Qty, BASE paise, Amount paise) of a line, as the bill columns hold them"""
+    base = product.base if product.base is not None else product.calculate_base()
+    return product.qty or 0.0, to_paise(base), to_paise(product.calculate_amount())
+
+
 class Bill:
-    def __init__(self, party_name, party_address):
+    __slots__ = ('party_name', 'party_address', 'products', 'qty', 'base', 'amount',
+                 'total_qty', 'total_base_paise', 'total_amount_paise')
+
+    def __init__(self, party_name='', party_address=''):
         self.party_name = party_name
         self.party_address = party_address
         self.products = []
+        self.qty = array('d')       # Qty of each line
+        self.base = array('q')      # BASE of each line, paise
+        self.amount = array('q')    # Amount of each line, paise
+        self.total_qty = 0.0
+        self.total_base_paise = 0
+        self.total_amount_paise = 0
+
+    @classmethod
+    def from_lines(cls, lines, party_name='', party_address=''):
+        """Build a bill from 15-field line dicts"""
+        bill = cls(party_name, party_address)
+        bill.extend(Product.from_line(line) for line in lines)
+        return bill
+
+    def __len__(self):
+        return len(self.products)
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __getitem__(self, position):
+        return self.products[position]
 
     def add_product(self, product):
+        """Append a line, updating the columns and running totals"""
+        qty, base, amount = line_columns(product)
         self.products.append(product)
+        self.qty.append(qty)
+        self.base.append(base)
+        self.amount.append(amount)
+        self.total_qty += qty
+        self.total_base_paise += base
+        self.total_amount_paise += amount
+
+    def extend(self, products):
+        for product in products:
+            self.add_product(product)
+
+    def replace(self, position, product):
+        """Swap the line at `position` (lines are not edited in place, so the columns stay right)"""
+        qty, base, amount = line_columns(product)
+        removed = self.products[position]
+        self.total_qty += qty - self.qty[position]
+        self.total_base_paise += base - self.base[position]
+        self.total_amount_paise += amount - self.amount[position]
+        self.products[position] = product
+        self.qty[position] = qty
+        self.base[position] = base
+        self.amount[position] = amount
+        return removed
+
+    def remove(self, position):
+        """Remove and return the line at `position`"""
+        product = self.products.pop(position)
+        self.total_qty -= self.qty.pop(position)
+        self.total_base_paise -= self.base.pop(position)
+        self.total_amount_paise -= self.amount.pop(position)
+        return product
+
+    def clear(self):
+        self.products.clear()
+        for column in (self.qty, self.base, self.amount):
+            del column[:]
+        self.total_qty = 0.0
+        self.total_base_paise = 0
+        self.total_amount_paise = 0
+
+    def recalculate_totals(self):
+        """Re-sum the running totals from the columns"""
+        self.total_qty = sum(self.qty)
+        self.total_base_paise = sum(self.base)
+        self.total_amount_paise = sum(self.amount)
+
+    def calculate_base_total(self):
+        """Taxable value (sum of BASE) in rupees"""
+        return self.total_base_paise / 100
 
     def calculate_total(self):
-        total = sum(product.calculate_amount() for product in self.products)
-        return total
+        """Bill total (sum of Amount) in rupees"""
+        return self.total_amount_paise / 100
+
+    def to_lines(self):
+        """The lines as 15-field dicts of strings, for the session and inventory"""
+        return [product.to_line() for product in self.products]
 
     def save_bill(self):
         # Logic to save the bill to a database or file can be implemented here
         pass
 
     def __str__(self):
-        bill_details = f"Bill for {self.party_name}, Address: {self.party_address}\n"
-        bill_details += "Products:\n"
-        for product in self.products:
-            bill_details += str(product) + "\n"
-        bill_details += f"Total Amount: {self.calculate_total()}"
-        return bill_details
\ No newline at end of file
+        parts = [f"Bill for {self.party_name}, Address: {self.party_address}", "Products:"]
+        parts.extend(str(product) for product in self.products)
+        parts.append(f"Total Amount: {self.calculate_total():.2f}")
+        return "\n".join(parts)
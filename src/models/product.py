@@ -1,10 +1,171 @@
+"""
+Purchase line model for Pharmacy Bill Entry
+One bill line with the 15 table fields as attributes; numeric fields are held
+as floats (None when left blank). to_line() writes them back exactly as they
+were entered ("45.00" stays "45.00") for the session and inventory, or at full
+precision for numbers that were computed; only values() rounds them for the table.
+"""
+import math
+
+from data.inventory_index import LINE_FIELDS
+
+TEXT_FIELDS = ('item_name', 'unit', 'batch', 'exp_dt', 'locat')
+# Rupee amounts, shown with 2 decimals
+MONEY_FIELDS = ('mrp', 'ptr', 'disc', 'base', 'amount', 'lp')
+NUMBER_FIELDS = tuple(field for field in LINE_FIELDS if field not in TEXT_FIELDS)
+
+
+def parse_field(field, value):
+    """Float value of a numeric line field, None if blank; ValueError names the field"""
+    if isinstance(value, str):
+        if not value or value.isspace():
+            return None
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f"{field} is not a number: {value.strip()!r}") from None
+    elif value is None:
+        return None
+    else:
+        number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{field} is not a number: {value!r}")
+    return number
+
+
+def field_text(number):
+    """Text for a numeric line field at full precision ("12.345" stays "12.345", "45" stays "45")"""
+    if number is None:
+        return ""
+    if number.is_integer():
+        return str(int(number))
+    return repr(number)
+
+
+def entered_texts(line):
+    """The numeric fields' text as given in `line`, aligned with NUMBER_FIELDS (None where not text)
+
+    The strings are the line's own, so this costs one tuple per line; None if no field was text.
+    """
+    texts = tuple(map(line.get, NUMBER_FIELDS))
+    if all(type(text) is str for text in texts):
+        return texts
+    texts = tuple(text if isinstance(text, str) else None for text in texts)
+    return texts if texts.count(None) < len(texts) else None
+
+
+def format_field(field, number):
+    """Text for a numeric line field as the bill table shows it"""
+    if number is None:
+        return ""
+    if field in MONEY_FIELDS:
+        return f"{number:.2f}"
+    if number.is_integer():
+        return str(int(number))
+    return f"{number:.3f}".rstrip('0').rstrip('.')
+
+
 class Product:
-    def __init__(self, name, batch_number, expiry_date, quantity, rate):
-        self.name = name
-        self.batch_number = batch_number
-        self.expiry_date = expiry_date
-        self.quantity = quantity
-        self.rate = rate
+    __slots__ = LINE_FIELDS + ('texts',)
+
+    errors = ()     # FieldErrors of a line restored without validating (see InvalidProduct)
+
+    def __init__(self, item_name='', unit='', batch='', exp_dt='', mrp=None, qty=None, fr=None,
+                 ptr=None, d_percent=None, disc=None, base=None, gst_percent=None, amount=None,
+                 lp=None, locat='', texts=None):
+        """Numbers may be given as text or already parsed; `texts` is the line they were
+        parsed from (e.g. before validate_lines), whose text to_line() then gives back"""
+        self.item_name = item_name
+        self.unit = unit
+        self.batch = batch
+        self.exp_dt = exp_dt
+        self.mrp = parse_field('mrp', mrp)
+        self.qty = parse_field('qty', qty)
+        self.fr = parse_field('fr', fr)
+        self.ptr = parse_field('ptr', ptr)
+        self.d_percent = parse_field('d_percent', d_percent)
+        self.disc = parse_field('disc', disc)
+        self.base = parse_field('base', base)
+        self.gst_percent = parse_field('gst_percent', gst_percent)
+        self.amount = parse_field('amount', amount)
+        self.lp = parse_field('lp', lp)
+        self.locat = locat
+        if texts is None:
+            texts = {'mrp': mrp, 'qty': qty, 'fr': fr, 'ptr': ptr, 'd_percent': d_percent, 'disc': disc,
+                     'base': base, 'gst_percent': gst_percent, 'amount': amount, 'lp': lp}
+        self.texts = entered_texts(texts)
+
+    @classmethod
+    def from_line(cls, line):
+        """Build from a 15-field line dict (search row, CSV import or saved session)"""
+        product = cls.__new__(cls)
+        for field in TEXT_FIELDS:
+            setattr(product, field, (line.get(field) or '').strip())
+        for field in NUMBER_FIELDS:
+            setattr(product, field, parse_field(field, line.get(field)))
+        product.texts = entered_texts(line)
+        return product
+
+    def to_line(self):
+        """The 15-field line dict of strings the session and inventory store (numbers as entered)"""
+        line = {field: getattr(self, field) if field in TEXT_FIELDS else field_text(getattr(self, field))
+                for field in LINE_FIELDS}
+        if self.texts:
+            for field, text in zip(NUMBER_FIELDS, self.texts):
+                if text is not None:
+                    line[field] = text
+        return line
+
+    def values(self):
+        """Display text of each field, in table column order"""
+        return [getattr(self, field) if field in TEXT_FIELDS else format_field(field, getattr(self, field))
+                for field in LINE_FIELDS]
+
+    def calculate_base(self):
+        """BASE = Qty * PTR (0 if either is blank)"""
+        if self.qty is None or self.ptr is None:
+            return 0.0
+        return self.qty * self.ptr
 
     def calculate_amount(self):
-        return self.quantity * self.rate
\ No newline at end of file
+        """Line Amount as entered, else BASE + BASE * Gst% / 100"""
+        if self.amount is not None:
+            return self.amount
+        base = self.base if self.base is not None else self.calculate_base()
+        return base + base * (self.gst_percent or 0) / 100
+
+    def __eq__(self, other):
+        if not isinstance(other, Product):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in LINE_FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Product({self.item_name!r}, batch={self.batch!r}, qty={self.qty}, ptr={self.ptr}, amount={self.amount})"
+
+    def __str__(self):
+        return (f"{self.item_name} | Batch {self.batch or '-'} | Exp {self.exp_dt or '-'} | "
+                f"Qty {format_field('qty', self.qty) or 0} @ {format_field('ptr', self.ptr) or '0.00'} | "
+                f"Amount {self.calculate_amount():.2f}")
+
+
+class InvalidProduct(Product):
+    """A parked line that no longer validates, kept exactly as it was saved until it is corrected
+
+    Fields that still parse are held as usual (bad ones are None, so totals
+    count them as 0); to_line() and values() give back the saved text, so
+    the next autosave parks the line unchanged.
+    """
+    __slots__ = ('line', 'errors')
+
+    def __init__(self, line, errors, **values):
+        super().__init__(**values)
+        self.line = {field: '' if line.get(field) is None else line[field] for field in LINE_FIELDS}
+        self.errors = tuple(errors)
+
+    def to_line(self):
+        return dict(self.line)
+
+    def values(self):
+        return [str(self.line[field]) for field in LINE_FIELDS]
@@ -0,0 +1,156 @@
+"""
+Autocomplete pipeline for Pharmacy Bill Entry
+Keeps searches off the Tk thread. Each keystroke restarts a short debounce
+timer (after/after_cancel); when typing pauses the query goes to a worker
+thread, and the Tk thread polls for the answer. Every keystroke bumps a
+generation number and results carry the generation they were asked for, so
+a slow search that finishes after newer typing is dropped, never shown.
+
+The worker runs one search at a time; queries that queue up behind it are
+collapsed to the newest. Searches run with `lock` held - take it around any
+change to the index being searched.
+"""
+import queue
+import threading
+
+# Quiet time after a keystroke before searching (a barcode wedge types faster than this)
+DEBOUNCE_MS = 80
+# How often the Tk thread checks for a finished search
+POLL_MS = 10
+
+
+class Autocomplete:
+    def __init__(self, widget, search, show, hide, min_chars=1, delay_ms=DEBOUNCE_MS, name="autocomplete"):
+        """Run search(text, state) -> (results, state) for `widget`'s field
+
+        show(results) and hide() are called on the Tk thread with the newest
+        results; `state` is handed from one search to the next (e.g. the
+        prefix range a longer query can narrow).
+        """
+        self.widget = widget
+        self.search = search
+        self.show = show
+        self.hide = hide
+        self.min_chars = min_chars
+        self.delay_ms = delay_ms
+
+        self.lock = threading.Lock()    # Held while a search runs
+        self.queue = queue.Queue()      # (generation, text) waiting for the worker; None stops it
+        self.done = None                # (generation, results) from the worker, read by poll()
+        self.done_lock = threading.Lock()
+        self.state = None               # Worker-side search state
+        self.generation = 0             # Bumped by every keystroke and cancel
+        self.requested = None           # Generation of the query last handed to the worker
+        self.timer = None               # Pending debounce after() id
+        self.polling = None             # Pending poll after() id
+
+        # Counters
+        self.keystrokes = 0     # changed() calls
+        self.debounced = 0      # Keystrokes whose timer was restarted before it fired
+        self.submitted = 0      # Queries handed to the worker
+        self.dropped = 0        # Queries skipped by the worker (a newer one was queued or typed)
+        self.stale = 0          # Searches finished after newer typing, not shown
+        self.shown = 0          # Results passed to show()/hide()
+        self.max_queue_depth = 0
+
+        self.thread = threading.Thread(target=self.run, name=f"{name}-worker", daemon=True)
+        self.thread.start()
+
+    def changed(self, text):
+        """Call on every keystroke (Tk thread): restart the debounce timer for `text`"""
+        self.keystrokes += 1
+        if self.timer is not None:
+            self.debounced += 1
+        self.cancel()
+        if len(text) < self.min_chars:
+            self.hide()
+            return
+        self.timer = self.widget.after(self.delay_ms, self.submit, self.generation, text)
+
+    def cancel(self):
+        """Forget pending and in-flight queries (e.g. when a choice was made or the dropdown closed)"""
+        self.generation += 1
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+
+    def submit(self, generation, text):
+        """Debounce timer fired (Tk thread): hand the query to the worker"""
+        self.timer = None
+        self.submitted += 1
+        self.requested = generation
+        self.queue.put((generation, text))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        if self.polling is None:
+            self.polling = self.widget.after(POLL_MS, self.poll)
+
+    def run(self):
+        """Worker thread: search the newest queued query, skipping older and superseded ones"""
+        while True:
+            job = self.queue.get()
+            while job is not None and not self.queue.empty():
+                self.dropped += 1
+                job = self.queue.get_nowait()
+            if job is None:
+                return
+            generation, text = job
+            if generation != self.generation:
+                # Typed over (or cancelled) while waiting
+                self.dropped += 1
+                continue
+            with self.lock:
+                try:
+                    results, self.state = self.search(text, self.state)
+                except Exception as e:
+                    print(f"⚠️ Search failed for {text!r}: {e}")
+                    results, self.state = [], None
+            with self.done_lock:
+                self.done = (generation, results)
+
+    def poll(self):
+        """Tk thread: show a finished search if it is still the newest"""
+        with self.done_lock:
+            done, self.done = self.done, None
+        if done is not None:
+            self.deliver(*done)
+        if self.pending():
+            self.polling = self.widget.after(POLL_MS, self.poll)
+        else:
+            self.polling = None
+
+    def deliver(self, generation, results):
+        if generation != self.generation:
+            self.stale += 1
+            return
+        self.requested = None
+        self.shown += 1
+        if results:
+            self.show(results)
+        else:
+            self.hide()
+
+    def flush(self, text):
+        """Search `text` now on the Tk thread (e.g. Enter pressed before the timer fired)"""
+        self.cancel()
+        if len(text) < self.min_chars:
+            self.hide()
+            return
+        with self.lock:
+            results, self.state = self.search(text, self.state)
+        self.deliver(self.generation, results)
+
+    def pending(self):
+        """True while the newest keystroke's results are still to come"""
+        return self.timer is not None or self.requested == self.generation
+
+    def close(self):
+        """Stop the worker thread"""
+        self.cancel()
+        self.queue.put(None)
+        self.thread.join(timeout=1)
+
+    def get_stats(self):
+        """Keystroke, query and drop counters plus the current and deepest queue"""
+        return {'keystrokes': self.keystrokes, 'debounced': self.debounced, 'submitted': self.submitted,
+                'dropped': self.dropped, 'stale': self.stale, 'shown': self.shown,
+                'queue_depth': self.queue.qsize(), 'max_queue_depth': self.max_queue_depth}
@@ -4,7 +4,24 @@ import sys
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from data.session_manager import SessionManager
+from data.inventory_index import LINE_FIELDS
+from data.party_master import MAX_PARTY_MATCHES, PartyMaster
+from data.trigram_index import FUZZY, ItemSearch
+from data.session_writer import SessionWriter
+from data.storage import create_session_manager
+from models.bill import Bill
+from models.product import InvalidProduct, Product
+from ui.autocomplete import Autocomplete
+from ui.item_grid import ItemGrid
+from utils.csv_import import parse_invoice_csv
+from utils.dates import current_month, expiry_month, format_day, mask_day, mask_expiry, slash_day, today_key
+from utils.pricing import PricingOptions, price_lines
+from utils.validators import validate_lines
+
+# Months ahead the Expiry List looks for near-expiry stock
+EXPIRY_WARNING_MONTHS = 3
+# Most item names listed in the search dropdown
+MAX_ITEM_MATCHES = 100
 
 class BillEntryWindow:
     def __init__(self, master):
@@ -12,12 +29,16 @@ class BillEntryWindow:
         
         # Initialize session manager with correct data directory path
         data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
-        self.session_manager = SessionManager(data_dir=data_dir)
+        self.session_manager = create_session_manager(data_dir=data_dir)
+        
+        # Session autosaves are coalesced and written off the Tk thread
+        self.session_writer = SessionWriter(self.session_manager)
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Don't remove default title bar - keep it for taskbar visibility
         # master.overrideredirect(True)  # REMOVED - this was hiding app from taskbar
         
-        # Sample data for party names (for testing autocomplete)
+        # Known party names, used to seed a new party master
         self.parties = [
             "MEDIPILLAR DISTRIBUTORS",
             "MEDICO PHARMA SOLUTIONS",
@@ -41,8 +62,16 @@ class BillEntryWindow:
             "Cadila Healthcare"
         ]
         
+        # Party master (parties.json), seeded from saved bills on first run
+        self.party_master = PartyMaster(os.path.join(data_dir, "parties.json"))
+        if not self.party_master:
+            self.party_master.seed(self.session_manager.get_all_bills(), self.parties)
+        
         # Load inventory from database (replaces static medicine list)
-        self.medicines = self.session_manager.get_inventory_items()
+        self.window_title = self.master.title()
+        self.inventory_progress_percent = -1
+        self.medicines = self.session_manager.get_inventory_items(progress=self.on_inventory_progress)
+        self.master.title(self.window_title)
         
         # If no inventory exists, use some default items for initial testing
         if not self.medicines:
@@ -61,8 +90,21 @@ class BillEntryWindow:
         
         print(f"📦 Inventory loaded: {len(self.medicines)} unique items")
         
+        # Ranked item search (prefix, substring, fuzzy); each keystroke narrows the last prefix range.
+        # The inventory service's item map searches in the service; any other map is indexed here,
+        # in the background (prefix-only until the trigram index is in)
+        item_search = getattr(self.medicines, 'item_search', None)
+        self.item_index = item_search() if item_search else ItemSearch(self.medicines, background=True)
+        
+        # Item and party searches run debounced on worker threads; only the newest results are shown
+        self.item_autocomplete = Autocomplete(self.master, self.search_items, self.show_item_results,
+                                              self.hide_item_dropdown, min_chars=2, name="item-search")
+        self.party_autocomplete = Autocomplete(self.master, self.search_parties, self.show_dropdown,
+                                               self.hide_dropdown, name="party-search")
+        
         # Inventory to store added items (current bill)
-        self.inventory = []  # List of dictionaries with item details
+        self.inventory = Bill()  # Lines of the bill being entered
+        self.editing_position = None  # Bill line being corrected in the search row (double-clicked)
         
         # Variables to track window state
         self.is_maximized = True
@@ -75,6 +117,14 @@ class BillEntryWindow:
         
         print("✅ Pharmacy Mock UI running successfully!")
     
+    def on_inventory_progress(self, bytes_read, total_bytes):
+        """Show inventory loading progress in the title bar"""
+        percent = int(bytes_read * 100 / total_bytes) if total_bytes else 100
+        if percent != self.inventory_progress_percent:
+            self.inventory_progress_percent = percent
+            self.master.title(f"{self.window_title}  -  Loading inventory... {percent}%")
+            self.master.update_idletasks()
+    
     def create_widgets(self):
         # Main container
         main_container = Frame(self.master, bg="#E8D4E8")
@@ -228,9 +278,8 @@ class BillEntryWindow:
         entrydt_label.pack(side="left", padx=(0, 5))
         
         # EntryDt Input with today's date (pre-formatted with slashes)
-        from datetime import datetime
         self.entrydt_entry = Entry(row2_frame, width=15, font=("Arial", 10))
-        self.entrydt_entry.insert(0, datetime.now().strftime("%d/%m/%Y"))
+        self.entrydt_entry.insert(0, format_day(today_key()))
         self.entrydt_entry.bind('<KeyRelease>', lambda e: self.smart_date_format(self.entrydt_entry))
         self.entrydt_entry.bind('<Return>', self.on_entrydt_enter)
         self.entrydt_entry.bind('<FocusIn>', self.on_entrydt_focus)
@@ -288,6 +337,7 @@ class BillEntryWindow:
                                    values=["Tax", "No Tax"], state="readonly",
                                    width=12, font=("Arial", 10))
         tax_dropdown.pack(side="left", padx=(0, 20))
+        tax_dropdown.bind('<<ComboboxSelected>>', self.reprice_bill)
         
         # State Dropdown (within state / outside state)
         self.state_var = StringVar()
@@ -307,6 +357,18 @@ class BillEntryWindow:
         self.sch_disc_dropdown.pack(side="left", padx=(0, 5))
         self.sch_disc_dropdown.bind('<Return>', self.on_sch_disc_enter)
         
+        # Scheme discount % applied to every line (blank is none; keys that don't make a 0-100 number are refused)
+        sch_percent_label = Label(row3_frame, text="Sch %:", bg="#E0D0E8", fg="black",
+                                  font=("Arial", 10, "bold"))
+        sch_percent_label.pack(side="left", padx=(10, 5))
+        self.sch_percent_var = StringVar()
+        self.sch_percent_entry = Entry(row3_frame, textvariable=self.sch_percent_var, width=6, font=("Arial", 10),
+                                       validate="key",
+                                       validatecommand=(self.master.register(self.valid_sch_percent), '%P'))
+        self.sch_percent_entry.pack(side="left", padx=(0, 5))
+        self.sch_percent_entry.bind('<Return>', self.on_sch_percent_enter)
+        self.sch_percent_entry.bind('<FocusOut>', self.reprice_bill)
+        
         # Row 4: Bill Dt, Empty input, Order button, Order checkbox, GST on Free checkbox, Tax Inclusive checkbox
         row4_frame = Frame(bill_frame, bg="#E0D0E8")
         row4_frame.pack(fill="x", padx=10, pady=8, anchor="w")
@@ -318,7 +380,7 @@ class BillEntryWindow:
         
         # Bill Dt Input with today's date (same as EntryDt)
         self.billdt_entry = Entry(row4_frame, width=15, font=("Arial", 10))
-        self.billdt_entry.insert(0, datetime.now().strftime("%d/%m/%Y"))
+        self.billdt_entry.insert(0, format_day(today_key()))
         self.billdt_entry.bind('<KeyRelease>', lambda e: self.smart_date_format(self.billdt_entry))
         self.billdt_entry.bind('<Return>', self.on_billdt_enter)
         self.billdt_entry.bind('<FocusIn>', self.on_billdt_focus)
@@ -348,14 +410,14 @@ class BillEntryWindow:
         # GST on Free Checkbox
         self.gst_on_free_var = IntVar()
         self.gst_on_free_checkbox = Checkbutton(row4_frame, text="GST on Free", variable=self.gst_on_free_var,
-                                           bg="#E0D0E8", font=("Arial", 10))
+                                           bg="#E0D0E8", font=("Arial", 10), command=self.reprice_bill)
         self.gst_on_free_checkbox.pack(side="left", padx=(0, 15))
         self.gst_on_free_checkbox.bind('<Return>', self.on_gst_on_free_enter)
         
         # Tax Inclusive Checkbox
         self.tax_inclusive_var = IntVar()
         tax_inclusive_checkbox = Checkbutton(row4_frame, text="Tax Inclusive", variable=self.tax_inclusive_var,
-                                            bg="#E0D0E8", font=("Arial", 10))
+                                            bg="#E0D0E8", font=("Arial", 10), command=self.reprice_bill)
         tax_inclusive_checkbox.pack(side="left", padx=(0, 5))
         
         # Row 5: New MRP
@@ -382,17 +444,7 @@ class BillEntryWindow:
     def format_date(self, *args):
         """Auto-format date as dd/mm/yyyy - only accept digits and auto-insert slashes"""
         current_value = self.entrydt_var.get()
-        # Remove any non-digit characters except slashes
-        digits_only = ''.join(c for c in current_value if c.isdigit())
-        
-        # Format with slashes
-        formatted = ''
-        if len(digits_only) > 0:
-            formatted = digits_only[:2]
-        if len(digits_only) > 2:
-            formatted += '/' + digits_only[2:4]
-        if len(digits_only) > 4:
-            formatted += '/' + digits_only[4:8]
+        formatted = slash_day(current_value)
         
         # Only update if changed to avoid infinite loop
         if formatted != current_value:
@@ -411,23 +463,8 @@ class BillEntryWindow:
         """Format date with slashes always visible: dd/mm/yyyy"""
         current_value = entry_widget.get()
         
-        # Remove all slashes and non-digits
-        digits_only = ''.join(c for c in current_value if c.isdigit())
-        
-        # Limit to 8 digits (ddmmyyyy)
-        digits_only = digits_only[:8]
-        
-        # Build formatted date with template "dd/mm/yyyy"
-        template = "dd/mm/yyyy"
-        result = list(template)
-        
-        # Fill in digits at appropriate positions (skip slash positions)
-        digit_positions = [0, 1, 3, 4, 6, 7, 8, 9]  # Positions in "dd/mm/yyyy" where digits go
-        for i, digit in enumerate(digits_only):
-            if i < len(digit_positions):
-                result[digit_positions[i]] = digit
-        
-        formatted = ''.join(result)
+        # Digits typed so far in the "dd/mm/yyyy" template
+        formatted = mask_day(current_value)
         
         # Get cursor position before update
         try:
@@ -448,23 +485,8 @@ class BillEntryWindow:
         """Format expiry date as mm/yy - e.g., 1525 becomes 15/25"""
         current_value = entry_widget.get()
         
-        # Remove all slashes and non-digits
-        digits_only = ''.join(c for c in current_value if c.isdigit())
-        
-        # Limit to 4 digits (mmyy)
-        digits_only = digits_only[:4]
-        
-        # Build formatted date
-        if len(digits_only) == 0:
-            formatted = "mm/yy"
-        elif len(digits_only) == 1:
-            formatted = digits_only[0] + "m/yy"
-        elif len(digits_only) == 2:
-            formatted = digits_only[0:2] + "/yy"
-        elif len(digits_only) == 3:
-            formatted = digits_only[0:2] + "/" + digits_only[2] + "y"
-        else:  # 4 or more digits
-            formatted = digits_only[0:2] + "/" + digits_only[2:4]
+        # Digits typed so far in the "mm/yy" template
+        formatted = mask_expiry(current_value)
         
         # Get cursor position before update
         try:
@@ -502,19 +524,17 @@ class BillEntryWindow:
         """Handle party search input and show matching results"""
         # First convert to uppercase
         self.to_uppercase(self.party_search_var)
-        search_text = self.party_search_var.get()
-        
-        if not search_text:
-            self.hide_dropdown()
-            return
         
-        # Filter parties that start with the search text (exact match from start)
-        matches = [party for party in self.parties if party.startswith(search_text)]
-        
-        if matches:
-            self.show_dropdown(matches)
-        else:
-            self.hide_dropdown()
+        # Searched once typing pauses (see search_parties)
+        self.party_autocomplete.changed(self.party_search_var.get())
+    
+    def search_parties(self, search_text, matches):
+        """Parties that start with the search text, most used and most recently used first (worker thread)
+
+        `matches` is the previous search's range, narrowed when the text was extended.
+        """
+        matches = self.party_master.search(search_text, matches)
+        return self.party_master.top(matches, MAX_PARTY_MATCHES), matches
     
     def show_dropdown(self, matches):
         """Show the dropdown with matching parties"""
@@ -531,7 +551,8 @@ class BillEntryWindow:
             self.dropdown_visible = True
     
     def hide_dropdown(self):
-        """Hide the dropdown"""
+        """Hide the dropdown (and drop any search still on its way)"""
+        self.party_autocomplete.cancel()
         if self.dropdown_visible:
             self.dropdown_frame.pack_forget()
             self.dropdown_visible = False
@@ -585,6 +606,9 @@ class BillEntryWindow:
     
     def on_enter_key(self, event):
         """Handle Enter key in search box"""
+        # Enter straight after typing (e.g. a barcode wedge): search now rather than on the timer
+        if self.party_autocomplete.pending():
+            self.party_autocomplete.flush(self.party_search_var.get())
         if self.dropdown_visible and self.party_listbox.size() > 0:
             # Select first item if dropdown is visible
             selected_party = self.party_listbox.get(0)
@@ -607,28 +631,29 @@ class BillEntryWindow:
         """Handle item search input and show matching results"""
         # First convert to uppercase
         self.to_uppercase(self.item_search_var)
-        search_text = self.item_search_var.get()
         
-        if not search_text or len(search_text) < 2:
-            self.hide_item_dropdown()
-            return
-        
-        # Filter medicines that start with the search text (exact match from start)
-        matches = [med_name for med_name in self.medicines.keys() if med_name.startswith(search_text)]
-        
-        if matches:
-            self.show_item_dropdown(matches)
-        else:
-            self.hide_item_dropdown()
+        # Searched once typing pauses (see search_items)
+        self.item_autocomplete.changed(self.item_search_var.get())
     
-    def show_item_dropdown(self, matches):
-        """Show the item dropdown with matching medicines"""
+    def search_items(self, search_text, prefix_range):
+        """Medicines starting with the search text, then containing it, then close misspellings (worker thread)"""
+        return self.item_index.search(search_text, MAX_ITEM_MATCHES, prefix_range)
+    
+    def show_item_results(self, results):
+        """Show (name, kind) search results in the item dropdown"""
+        self.show_item_dropdown([name for name, _ in results], [kind for _, kind in results])
+    
+    def show_item_dropdown(self, matches, kinds=None):
+        """Show the item dropdown with matching medicines (fuzzy matches greyed)"""
         # Clear existing items
         self.item_listbox.delete(0, END)
         
         # Add matching items
         for match in matches:
             self.item_listbox.insert(END, match)
+        for position, kind in enumerate(kinds or ()):
+            if kind == FUZZY:
+                self.item_listbox.itemconfig(position, fg="gray45")
         
         if not self.item_dropdown_visible:
             # Position dropdown below the search row (row 2 in table)
@@ -636,7 +661,8 @@ class BillEntryWindow:
             self.item_dropdown_visible = True
     
     def hide_item_dropdown(self):
-        """Hide the item dropdown"""
+        """Hide the item dropdown (and drop any search still on its way)"""
+        self.item_autocomplete.cancel()
         if self.item_dropdown_visible:
             self.item_dropdown_frame.grid_forget()
             self.item_dropdown_visible = False
@@ -756,10 +782,18 @@ class BillEntryWindow:
             self.batch_listbox.bind('<<ListboxSelect>>', lambda e: None)
             self.batch_listbox.bind('<Double-Button-1>', self.on_batch_click)
         
-        # Clear and populate batch listbox
+        # Clear and populate batch listbox (batches arrive earliest expiry first)
         self.batch_listbox.delete(0, END)
-        for batch in batches:
+        this_month = current_month()
+        first_in_date = None
+        for index, batch in enumerate(batches):
+            month = expiry_month(batch['exp_dt'])
+            expired = month is not None and month < this_month
+            if not expired and first_in_date is None:
+                first_in_date = index
             display_text = f"Batch: {batch['batch']} | Qty: {batch['qty']} | Exp: {batch['exp_dt']} | MRP: ₹{batch['mrp']} | PTR: ₹{batch['ptr']}"
+            if expired:
+                display_text = "⚠ EXPIRED  " + display_text
             self.batch_listbox.insert(END, display_text)
         
         # Position the batch dropdown below the item search field
@@ -771,10 +805,12 @@ class BillEntryWindow:
         self.batch_dropdown_frame.place(x=x, y=y, width=width)
         self.batch_dropdown_visible = True
         
-        # Focus on listbox and select first item
+        # Focus on listbox and select the first batch still in date (FEFO)
+        selected = first_in_date if first_in_date is not None else 0
         self.batch_listbox.focus_set()
-        self.batch_listbox.selection_set(0)
-        self.batch_listbox.activate(0)
+        self.batch_listbox.selection_set(selected)
+        self.batch_listbox.activate(selected)
+        self.batch_listbox.see(selected)
         
         print(f"📦 Showing {len(batches)} batches for selection")
     
@@ -816,6 +852,9 @@ class BillEntryWindow:
     
     def on_item_enter_key(self, event):
         """Handle Enter key in item search box"""
+        # Enter straight after typing (e.g. a barcode wedge): search now rather than on the timer
+        if self.item_autocomplete.pending():
+            self.item_autocomplete.flush(self.item_search_var.get())
         if self.item_dropdown_visible and self.item_listbox.size() > 0:
             # Select first item if dropdown is visible
             selected_item = self.item_listbox.get(0)
@@ -904,10 +943,24 @@ class BillEntryWindow:
         return "break"
     
     def on_sch_disc_enter(self, event):
-        """Handle Enter key in SCH DISC dropdown - move to Row 4 empty input"""
+        """Handle Enter key in SCH DISC dropdown - move to Sch % input"""
+        self.sch_percent_entry.focus_set()
+        return "break"
+    
+    def on_sch_percent_enter(self, event):
+        """Handle Enter key in Sch % input - move to Row 4 empty input (re-prices on focus out)"""
         self.row4_empty_entry.focus_set()
         return "break"
     
+    def valid_sch_percent(self, text):
+        """Key validation for Sch %: digits with at most one '.', up to 100; anything else rings the bell"""
+        whole, _, fraction = text.partition('.')
+        if (text.isascii() and (whole.isdigit() or not whole) and (fraction.isdigit() or not fraction)
+                and (not (whole or fraction) or float(f"{whole or 0}.{fraction or 0}") <= 100)):
+            return True
+        self.master.bell()
+        return False
+    
     def on_row4_empty_enter(self, event):
         """Handle Enter key in Row 4 empty input - move to Order checkbox"""
         self.order_checkbox.focus_set()
@@ -968,16 +1021,23 @@ class BillEntryWindow:
             'locat': self.search_row_entries[14].get().strip()
         }
         
-        # Validate that at least item name is entered
-        if not item_data['item_name']:
-            print("Error: Item name is required")
+        # Validate the line (item name required, numbers and expiry well-formed)
+        result = validate_lines([item_data])
+        if not result.ok:
+            for error in result.errors:
+                print(f"Error: {error.message}")
+            self.update_status(result.errors[0].message)
             return "break"
+        product = Product(texts=item_data, **result.row_values(0))
         
-        # Add to inventory
-        self.inventory.append(item_data)
-        
-        # Add row to table display
-        self.add_item_row_to_table(item_data)
+        if self.editing_position is not None:
+            # A corrected line goes back where it was
+            self.inventory.replace(self.editing_position, product)
+            self.editing_position = None
+            self.item_grid.lines_changed()
+        else:
+            # Add to inventory and the table display
+            self.insert_item_rows([product])
         
         # Auto-save session state
         self.save_current_session()
@@ -991,60 +1051,70 @@ class BillEntryWindow:
         print(f"Item added: {item_data['item_name']} - Total items: {len(self.inventory)}")
         return "break"
     
-    def add_item_row_to_table(self, item_data):
-        """Add a new data row to the table with serial number"""
-        # Calculate row number (search row is at grid row 1, data rows start at row 2)
-        # But we need to account for the item dropdown frame which might be at row 2
-        row_num = len(self.item_data_rows) + 2  # Header=0, Search=1, Data starts at 2
-        
-        # Serial number
-        serial_num = len(self.item_data_rows) + 1
+    def insert_item_rows(self, products, replace=False):
+        """Add lines to the bill and the table, replacing the current lines if `replace`
+
+        The table is redrawn and its scrollbar updated once, after all the
+        lines are in - use this for any bulk load (session restore, CSV import).
+        """
+        with self.item_grid.batch():
+            if replace:
+                # A loaded bill opens at its first line
+                self.inventory.clear()
+                self.editing_position = None
+                self.inventory.extend(products)
+                self.item_grid.set_lines(self.inventory)
+            else:
+                self.inventory.extend(products)
+                self.item_grid.lines_added(len(products))
+    
+    def import_csv_invoice(self):
+        """Import a distributor's CSV invoice into the current bill in one batch"""
+        from tkinter import filedialog
         
-        # Column headers for reference
-        headers = ["No", "Item Name", "Unit", "Batch", "ExpDt", "Mrp", "Qty", "Fr", 
-                   "PTR", "D%", "Disc", "BASE", "Gst%", "Amount", "L.P.", "Locat"]
-        widths = [4, 25, 6, 12, 10, 10, 6, 4, 10, 6, 10, 10, 6, 12, 12, 8]
+        path = filedialog.askopenfilename(
+            title="Import Purchase Invoice",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
         
-        # Data values in order
-        values = [
-            str(serial_num),
-            item_data['item_name'],
-            item_data['unit'],
-            item_data['batch'],
-            item_data['exp_dt'],
-            item_data['mrp'],
-            item_data['qty'],
-            item_data['fr'],
-            item_data['ptr'],
-            item_data['d_percent'],
-            item_data['disc'],
-            item_data['base'],
-            item_data['gst_percent'],
-            item_data['amount'],
-            item_data['lp'],
-            item_data['locat']
-        ]
+        try:
+            lines, errors = parse_invoice_csv(path, self.pricing_options())
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Import Failed", f"Could not read {os.path.basename(path)}:\n{e}")
+            return
         
-        # Create row entries
-        row_entries = []
-        for col, (header, width, value) in enumerate(zip(headers, widths, values)):
-            # Create label for display (non-editable for now)
-            label = Label(self.table_frame, text=value, 
-                         bg="white", font=("Arial", 9),
-                         width=width, relief="solid", bd=1, anchor="w")
-            label.grid(row=row_num, column=col, sticky="ew", padx=0, pady=0)
-            row_entries.append(label)
-        
-        # Store row data
-        self.item_data_rows.append({
-            'data': item_data,
-            'widgets': row_entries,
-            'row_num': row_num
-        })
+        if lines:
+            # One table update and one autosave for the whole invoice
+            self.insert_item_rows([Product.from_line(line) for line in lines])
+            self.save_current_session()
+        
+        message = f"Imported {len(lines)} lines from {os.path.basename(path)}"
+        if errors:
+            shown = "\n".join(f"Line {line_no}: {problem}" for line_no, problem in errors[:10])
+            more = f"\n... and {len(errors) - 10} more" if len(errors) > 10 else ""
+            messagebox.showwarning("Import Finished With Errors",
+                                   f"{message}\n\nSkipped {len(errors)} lines:\n{shown}{more}")
+        else:
+            self.update_status(message)
+        print(f"📥 {message} ({len(errors)} skipped) - Total items: {len(self.inventory)}")
+    
+    def edit_item_row(self, position):
+        """Load a bill line into the search row to correct it (double-click on the line)
+
+        The line stays in the bill, and parked, until Enter in Locat replaces it.
+        """
+        line = self.inventory[position].to_line()
+        for field, entry in zip(LINE_FIELDS, self.search_row_entries):
+            entry.delete(0, END)
+            entry.insert(0, line[field])
+        self.hide_item_dropdown()
+        self.editing_position = position
+        self.search_row_entries[0].focus_set()
         
-        # Update scroll region
-        self.table_frame.update_idletasks()
-        self.table_canvas.configure(scrollregion=self.table_canvas.bbox("all"))
+        errors = self.inventory[position].errors
+        detail = f": {errors[0].message}" if errors else ""
+        self.update_status(f"Editing line {position + 1}{detail} - press Enter in Locat to update it")
     
     def clear_search_row(self):
         """Clear all fields in the search row"""
@@ -1054,48 +1124,45 @@ class BillEntryWindow:
             if i in [8, 9, 10, 11]:  # D%, Disc, BASE, Gst%
                 entry.insert(0, "0")
     
-    def calculate_base(self):
-        """Calculate BASE = Qty * PTR"""
-        try:
-            # Get Qty (index 5) and PTR (index 7)
-            qty = self.search_row_entries[5].get().strip()
-            ptr = self.search_row_entries[7].get().strip()
-            
-            if qty and ptr:
-                qty_val = float(qty)
-                ptr_val = float(ptr)
-                base_val = qty_val * ptr_val
-                
-                # Set BASE (index 10)
-                self.search_row_entries[10].delete(0, END)
-                self.search_row_entries[10].insert(0, f"{base_val:.2f}")
-                
-                # Recalculate Amount as BASE changed
-                self.calculate_amount()
-        except ValueError:
-            # Invalid number, ignore
-            pass
-    
-    def calculate_amount(self):
-        """Calculate Amount = BASE + (BASE * Gst% / 100)"""
-        try:
-            # Get BASE (index 10) and Gst% (index 11)
-            base = self.search_row_entries[10].get().strip()
-            gst_percent = self.search_row_entries[11].get().strip()
-            
-            if base and gst_percent:
-                base_val = float(base)
-                gst_val = float(gst_percent)
-                
-                # Amount = BASE + (BASE * Gst% / 100)
-                amount_val = base_val + (base_val * gst_val / 100)
-                
-                # Set Amount (index 12)
-                self.search_row_entries[12].delete(0, END)
-                self.search_row_entries[12].insert(0, f"{amount_val:.2f}")
-        except ValueError:
-            # Invalid number, ignore
-            pass
+    def pricing_options(self):
+        """Pricing switches from the bill header (Tax, SCH DISC, GST on Free, Tax Inclusive)"""
+        return PricingOptions(
+            apply_tax=self.tax_var.get() != "No Tax",
+            tax_inclusive=bool(self.tax_inclusive_var.get()),
+            gst_on_free=bool(self.gst_on_free_var.get()),
+            scheme_percent=self.sch_percent_var.get().strip())
+    
+    def calculate_line_price(self):
+        """Price the search row: BASE, Amount and L.P. from Qty, Fr, PTR, D%, Disc and Gst%"""
+        line = {field: entry.get().strip() for field, entry in zip(LINE_FIELDS, self.search_row_entries)}
+        if not (line['qty'] and line['ptr']):
+            return
+        
+        prices = price_lines([line], self.pricing_options()).line_text(0)
+        for field, index in (('base', 10), ('amount', 12), ('lp', 13)):
+            self.search_row_entries[index].delete(0, END)
+            self.search_row_entries[index].insert(0, prices[field])
+    
+    def reprice_bill(self, event=None):
+        """Re-price the search row and every bill line after a bill-level pricing switch changes"""
+        self.calculate_line_price()
+        
+        # Lines awaiting correction keep their saved text until they are fixed
+        positions = [position for position, product in enumerate(self.inventory)
+                     if product.qty is not None and product.ptr is not None and not product.errors]
+        if not positions:
+            return
+        
+        # One pricing batch for the whole bill
+        priced = price_lines([self.inventory[position] for position in positions], self.pricing_options())
+        for i, position in enumerate(positions):
+            prices = priced.line_text(i)
+            product = Product.from_line(dict(self.inventory[position].to_line(), **prices))
+            self.inventory.replace(position, product)
+        self.item_grid.lines_changed()
+        
+        self.save_current_session()
+        self.update_status(f"Bill re-priced: ₹{self.inventory.calculate_total():.2f}")
     
     def delete_all_items(self):
         """Delete all items from the table and clear inventory"""
@@ -1104,23 +1171,17 @@ class BillEntryWindow:
             print("No items to delete")
             return
         
-        # Remove all data row widgets from table
-        for row_data in self.item_data_rows:
-            for widget in row_data['widgets']:
-                widget.destroy()
-        
-        # Clear data structures
-        self.item_data_rows.clear()
+        # Clear the bill; its row widgets are hidden and pooled for the next bill
         self.inventory.clear()
+        self.item_grid.clear()
+        self.editing_position = None
         
-        # Clear session state
-        self.session_manager.clear_session()
-        
-        # Update scroll region
-        self.table_frame.update_idletasks()
-        self.table_canvas.configure(scrollregion=self.table_canvas.bbox("all"))
+        # Clear session state (dropping any autosave still queued)
+        self.session_writer.clear()
         
-        print("All items deleted and session cleared")
+        stats = self.item_grid.pool.get_stats()
+        print(f"All items deleted and session cleared (row widgets: {stats['created']} created, "
+              f"{stats['reused']} reused, {stats['idle']} pooled)")
     
     def create_item_table(self, parent):
         """Create the item entry table with columns and two empty rows"""
@@ -1144,6 +1205,13 @@ class BillEntryWindow:
                                relief="raised", bd=2, padx=10, pady=5)
         delete_all_btn.pack(side="right", padx=(0, 10))
         
+        # Import CSV button (distributor invoices)
+        import_csv_btn = Button(header_frame, text="Import CSV Invoice", 
+                               bg="#4A90E2", fg="white", font=("Arial", 9, "bold"),
+                               command=self.import_csv_invoice, cursor="hand2",
+                               relief="raised", bd=2, padx=10, pady=5)
+        import_csv_btn.pack(side="right", padx=(0, 10))
+        
         # Create canvas with scrollbar for table
         from tkinter import Canvas, Scrollbar, VERTICAL, HORIZONTAL
         
@@ -1157,8 +1225,8 @@ class BillEntryWindow:
         v_scrollbar = Scrollbar(canvas_frame, orient=VERTICAL, command=self.table_canvas.yview)
         h_scrollbar = Scrollbar(canvas_frame, orient=HORIZONTAL, command=self.table_canvas.xview)
         
-        # Configure canvas
-        self.table_canvas.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        # Configure canvas (the vertical scrollbar scrolls the bill's lines, see ItemGrid)
+        self.table_canvas.configure(xscrollcommand=h_scrollbar.set)
         
         # Pack scrollbars and canvas
         v_scrollbar.pack(side="right", fill="y")
@@ -1187,7 +1255,12 @@ class BillEntryWindow:
         
         # Store entry widgets for navigation
         self.item_entries = []
-        self.item_data_rows = []  # Store actual data rows (with serial numbers)
+        
+        # Data rows below the search row: only the rows in view are built, and reused on scroll
+        self.item_grid = ItemGrid(self.table_frame, widths, first_row=2, open_line=self.edit_item_row)
+        self.item_grid.attach_scrollbar(v_scrollbar)
+        self.item_grid.bind_wheel(self.table_canvas)
+        self.item_grid.set_lines(self.inventory)
         
         # Create first row - this is the SEARCH/INPUT row (no serial number)
         search_row_entries = []
@@ -1232,10 +1305,10 @@ class BillEntryWindow:
                     entry.bind('<Button-1>', lambda e, ent=entry: self.handle_entry_click_select_all(ent))
                     entry.bind('<Return>', self.on_mrp_enter)
                     entry.bind('<Tab>', lambda e, c=col: self.on_search_row_tab(e, c))
-                elif col == 8:  # PTR column - auto-select on focus and calculate BASE on change
+                elif col == 8:  # PTR column - auto-select on focus and re-price the line on change
                     entry.bind('<FocusIn>', lambda e, ent=entry: self.schedule_select_all(ent))
                     entry.bind('<Button-1>', lambda e, ent=entry: self.handle_entry_click_select_all(ent))
-                    entry.bind('<KeyRelease>', lambda e: self.calculate_base())
+                    entry.bind('<KeyRelease>', lambda e: self.calculate_line_price())
                     entry.bind('<Return>', lambda e, c=col: self.on_search_row_enter(e, c))
                     entry.bind('<Tab>', lambda e, c=col: self.on_search_row_tab(e, c))
                 elif col == 9:  # D% column - auto-select on focus
@@ -1248,10 +1321,10 @@ class BillEntryWindow:
                     entry.bind('<Button-1>', lambda e, ent=entry: self.handle_entry_click_select_all(ent))
                     entry.bind('<Return>', lambda e, c=col: self.on_search_row_enter(e, c))
                     entry.bind('<Tab>', lambda e, c=col: self.on_search_row_tab(e, c))
-                elif col == 12:  # Gst% column - auto-select on focus and calculate Amount
+                elif col == 12:  # Gst% column - auto-select on focus and re-price the line
                     entry.bind('<FocusIn>', lambda e, ent=entry: self.schedule_select_all(ent))
                     entry.bind('<Button-1>', lambda e, ent=entry: self.handle_entry_click_select_all(ent))
-                    entry.bind('<KeyRelease>', lambda e: self.calculate_amount())
+                    entry.bind('<KeyRelease>', lambda e: self.calculate_line_price())
                     entry.bind('<Return>', lambda e, c=col: self.on_search_row_enter(e, c))
                     entry.bind('<Tab>', lambda e, c=col: self.on_search_row_tab(e, c))
                 elif col == 15:  # Locat column - auto-select on focus and save item on Enter
@@ -1266,9 +1339,9 @@ class BillEntryWindow:
                     # Bind Tab key for navigation
                     entry.bind('<Tab>', lambda e, c=col: self.on_search_row_tab(e, c))
                 
-                # Calculate BASE when Qty changes (col 6)
-                if col == 6:  # Qty column
-                    entry.bind('<KeyRelease>', lambda e: self.calculate_base())
+                # Re-price the line when Qty, Fr, D% or Disc change
+                if col in [6, 7, 9, 10]:  # Qty, Fr, D%, Disc
+                    entry.bind('<KeyRelease>', lambda e: self.calculate_line_price())
                 
                 # Auto-uppercase for text columns
                 if col in [1, 3, 15]:  # Item Name, Batch, Locat
@@ -1319,6 +1392,9 @@ class BillEntryWindow:
         self.table_frame.bind('<Configure>', lambda e: self.table_canvas.configure(
             scrollregion=self.table_canvas.bbox("all")))
         
+        # Show as many data rows as fit in the table
+        self.table_canvas.bind('<Configure>', lambda e: self.item_grid.resize(e.height))
+        
         # Footer with Save to Inventory button
         footer_frame = Frame(table_container, bg="#E0D0E8")
         footer_frame.pack(fill="x", pady=(10, 5))
@@ -1414,26 +1490,75 @@ class BillEntryWindow:
         print(f"Navigation button clicked: {button_name}")
         if button_name == "Purchase Bill":
             print("Opening Purchase Bill entry...")
+        elif button_name == "Expiry List":
+            self.show_expiry_list()
+    
+    def show_expiry_list(self):
+        """Show expired stock and stock expiring within EXPIRY_WARNING_MONTHS"""
+        from tkinter import Toplevel, Scrollbar, VERTICAL
+        
+        expired = self.session_manager.get_expired_batches()
+        expiring = self.session_manager.get_expiring_batches(EXPIRY_WARNING_MONTHS)
+        
+        window = Toplevel(self.master)
+        window.title(f"Expiry List - {len(expired)} expired, {len(expiring)} expiring within {EXPIRY_WARNING_MONTHS} months")
+        window.geometry("800x500")
+        
+        listbox = Listbox(window, font=("Courier New", 10), bg="white", fg="black")
+        scrollbar = Scrollbar(window, orient=VERTICAL, command=listbox.yview)
+        listbox.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        listbox.pack(fill="both", expand=True)
+        
+        def add_section(title, batches, color):
+            listbox.insert(END, f"{title} ({len(batches)})")
+            listbox.itemconfig(END, fg=color)
+            for batch in batches:
+                listbox.insert(END, f"  {batch.get('exp_dt', ''):>7}  {batch.get('item_name', '')[:30]:<30}  "
+                                    f"Batch: {batch.get('batch', ''):<12}  Qty: {batch.get('qty', '')}")
+            listbox.insert(END, "")
+        
+        add_section("EXPIRED", expired, "#CC0000")
+        add_section(f"EXPIRING WITHIN {EXPIRY_WARNING_MONTHS} MONTHS", expiring, "#B36B00")
+        window.bind('<Escape>', lambda e: window.destroy())
+        window.focus_set()
     
     def menu_click(self, menu_name):
         """Handle menu clicks"""
         print(f"Menu clicked: {menu_name}")
         if menu_name == "Exit":
+            self.close_workers()
             self.master.quit()
     
+    def on_close(self):
+        """Flush the pending session autosave before the window closes"""
+        self.close_workers()
+        self.master.destroy()
+    
+    def close_workers(self):
+        """Stop the search workers, write the pending session autosave and party uses, and close the inventory backend"""
+        for name, autocomplete in (("Item", self.item_autocomplete), ("Party", self.party_autocomplete)):
+            autocomplete.close()
+            stats = autocomplete.get_stats()
+            print(f"🔎 {name} search: {stats['keystrokes']} keystrokes, {stats['submitted']} searched, "
+                  f"{stats['dropped'] + stats['stale']} dropped, max queue {stats['max_queue_depth']}")
+        self.session_writer.close()
+        self.party_master.close()
+        self.session_manager.close()
+    
     # ============ Session Management & Database Methods ============
     
     def save_current_session(self):
         """Auto-save current session state (temporary)"""
         try:
             session_data = {
-                'inventory': self.inventory,
+                'inventory': self.inventory.to_lines(),
                 'party': self.party_search_var.get() if hasattr(self, 'party_search_var') else '',
                 'entry_dt': self.entrydt_entry.get() if hasattr(self, 'entrydt_entry') else '',
                 'bill_no': self.billno_entry.get() if hasattr(self, 'billno_entry') else '',
                 'bill_dt': self.billdt_entry.get() if hasattr(self, 'billdt_entry') else ''
             }
-            self.session_manager.save_session(session_data)
+            self.session_writer.submit(session_data)
             self.update_status("Session auto-saved")
         except Exception as e:
             print(f"Error saving session: {e}")
@@ -1443,8 +1568,20 @@ class BillEntryWindow:
         try:
             session_data = self.session_manager.load_session()
             if session_data and session_data.get('inventory'):
-                # Restore inventory
-                self.inventory = session_data['inventory']
+                # Restore every parked line; ones that no longer validate are kept as
+                # saved and flagged, and the bill can't be saved until they are corrected
+                lines = session_data['inventory']
+                result = validate_lines(lines, required=())
+                errors_by_row = result.errors_by_row()
+                products = []
+                for row, line in enumerate(lines):
+                    errors = errors_by_row.get(row)
+                    if errors:
+                        print(f"⚠️ Session line {row + 1} ({line.get('item_name', '')!r}) "
+                              f"needs correcting: {errors[0].message}")
+                        products.append(InvalidProduct(line, errors, **result.row_values(row)))
+                    else:
+                        products.append(Product(texts=line, **result.row_values(row)))
                 
                 # Restore form fields if they exist
                 if hasattr(self, 'party_search_var') and session_data.get('party'):
@@ -1459,11 +1596,14 @@ class BillEntryWindow:
                     self.billdt_entry.delete(0, END)
                     self.billdt_entry.insert(0, session_data['bill_dt'])
                 
-                # Restore table rows
-                for item_data in self.inventory:
-                    self.add_item_row_to_table(item_data)
+                # Restore the lines and table rows in one batch
+                self.insert_item_rows(products, replace=True)
                 
-                self.update_status(f"Session restored: {len(self.inventory)} items")
+                if errors_by_row:
+                    self.update_status(f"Session restored: {len(self.inventory)} items, "
+                                       f"{len(errors_by_row)} to correct (double-click a ⚠ line)")
+                else:
+                    self.update_status(f"Session restored: {len(self.inventory)} items")
                 print(f"✅ Previous session loaded: {len(self.inventory)} items")
         except Exception as e:
             print(f"Error loading session: {e}")
@@ -1474,15 +1614,33 @@ class BillEntryWindow:
             messagebox.showwarning("No Items", "Please add items before saving to inventory.")
             return
         
+        # Lines restored without validating must be corrected first
+        invalid = [position + 1 for position, product in enumerate(self.inventory) if product.errors]
+        if invalid:
+            messagebox.showwarning("Invalid Lines",
+                                   f"Line(s) {', '.join(map(str, invalid[:10]))}"
+                                   f"{' ...' if len(invalid) > 10 else ''} no longer validate.\n\n"
+                                   "Double-click a marked line to correct it before saving.")
+            return
+        
+        # Make sure the parked session on disk matches what is being saved
+        self.session_writer.flush()
+        
         # Calculate totals for display
-        total_amount = sum(float(item.get('amount', 0) or 0) for item in self.inventory)
+        total_amount = self.inventory.calculate_total()
         
         # Save items to inventory (batch-aware: updates qty if item+batch exists)
-        if self.session_manager.save_to_inventory(self.inventory):
+        if self.session_manager.save_to_inventory(self.inventory.to_lines()):
             # Refresh inventory search list
             self.medicines = self.session_manager.get_inventory_items()
+            with self.item_autocomplete.lock:
+                self.item_index.update(self.medicines)
             print(f"📦 Inventory refreshed: {len(self.medicines)} unique items")
             
+            # Rank this bill's supplier higher in the party dropdown
+            with self.party_autocomplete.lock:
+                self.party_master.record_use(self.party_search_var.get())
+            
             messagebox.showinfo("Success", 
                               f"Items saved to inventory successfully!\n\n"
                               f"Items: {len(self.inventory)}\n"
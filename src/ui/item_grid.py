@@ -0,0 +1,250 @@
+"""
+Virtualized item grid for Pharmacy Bill Entry
+The bill's data rows under the item table's search row. Only the rows that fit
+in the table are built as widgets ("slots"); scrolling re-labels the same slots
+with the lines now in view, so adding a line or scrolling costs the same on a
+300-line bill as on a 3-line one. The lines themselves stay in the Bill - the
+grid only reads them.
+
+Bulk loads (session restore, CSV import) run inside batch(): redraws and
+scrollbar updates are held until the batch ends and then done once.
+
+Slots no longer needed (the bill was saved and cleared, the table shrank) are
+hidden and kept in a RowPool, up to its cap, for the next bill's rows instead
+of being destroyed and built again.
+
+Lines carrying validation errors (a parked line that no longer validates) are
+flagged in the "No" column; double-clicking a row hands its position to
+`open_line`.
+"""
+from contextlib import contextmanager
+from tkinter import Label
+
+# Slots drawn before the table's real height is known
+DEFAULT_VISIBLE_ROWS = 20
+MIN_VISIBLE_ROWS = 5
+# Row height used until a slot has been measured
+DEFAULT_ROW_HEIGHT = 21
+# Lines scrolled per mouse wheel notch
+WHEEL_ROWS = 3
+# Hidden slots kept for reuse; any beyond this are destroyed
+POOL_CAP = 64
+# "No" column of a line with validation errors
+INVALID_MARK = "⚠ "
+INVALID_FG = "#CC0000"
+
+ROW_STYLE = {'bg': "white", 'font': ("Arial", 9), 'relief': "solid", 'bd': 1, 'anchor': "w"}
+
+
+class RowPool:
+    """Hidden slots (row widgets) waiting to be shown again, at most `cap` of them"""
+
+    def __init__(self, cap=POOL_CAP):
+        self.cap = cap
+        self.idle = []
+
+        # Counters
+        self.created = 0        # Slots built from scratch
+        self.reused = 0         # Slots taken back out of the pool
+        self.discarded = 0      # Slots destroyed because the pool was full
+
+    def __len__(self):
+        return len(self.idle)
+
+    def take(self, factory):
+        """A hidden slot to show again, or a new one from factory() if the pool is empty"""
+        if not self.idle:
+            self.created += 1
+            return factory()
+        self.reused += 1
+        return self.idle.pop()
+
+    def give(self, slot):
+        """Hide a slot and keep it for reuse (destroy it if the pool is full)"""
+        labels, _ = slot
+        if len(self.idle) >= self.cap:
+            for label in labels:
+                label.destroy()
+            self.discarded += 1
+            return
+        for label in labels:
+            label.grid_remove()
+        self.idle.append(slot)
+
+    def get_stats(self):
+        return {'created': self.created, 'reused': self.reused, 'discarded': self.discarded,
+                'idle': len(self.idle), 'cap': self.cap}
+
+
+class ItemGrid:
+    def __init__(self, frame, widths, first_row=2, visible_rows=DEFAULT_VISIBLE_ROWS, pool_cap=POOL_CAP,
+                 open_line=None):
+        self.frame = frame
+        self.open_line = open_line      # open_line(position), called when a row is double-clicked
+        self.widths = widths            # Column widths, in characters, "No" column first
+        self.first_row = first_row      # Grid row of the first slot (below header and search row)
+        self.visible_rows = visible_rows
+        self.lines = ()                 # Products shown (the Bill being entered)
+        self.top = 0                    # Position of the line in the first slot
+        self.slots = []                 # (labels, texts shown) per row on screen; texts skip unchanged labels
+        self.pool = RowPool(pool_cap)   # Slots off screen, kept for reuse
+        self.scrollbar = None
+        self.batch_depth = 0            # Open batch() blocks; redraws wait until the last one closes
+        self.dirty = False              # A redraw was held back by a batch
+        self.redraws = 0
+
+    def __len__(self):
+        return len(self.lines)
+
+    def attach_scrollbar(self, scrollbar):
+        """Drive `scrollbar` (and be driven by it) instead of a scrolled canvas"""
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+        self.update_scrollbar()
+
+    def on_double_click(self, event):
+        for i, (labels, _) in enumerate(self.slots):
+            if event.widget in labels:
+                if self.open_line:
+                    self.open_line(self.top + i)
+                return "break"
+
+    def bind_wheel(self, widget):
+        widget.bind('<MouseWheel>', self.on_wheel)
+        widget.bind('<Button-4>', self.on_wheel)    # X11 wheel up
+        widget.bind('<Button-5>', self.on_wheel)    # X11 wheel down
+
+    @contextmanager
+    def batch(self):
+        """Hold redraws and scrollbar updates until the block ends, then redraw once"""
+        self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.batch_depth -= 1
+            if self.batch_depth == 0 and self.dirty:
+                self.redraw()
+
+    # ----- Lines -----
+
+    def set_lines(self, lines):
+        """Show a new sequence of lines (e.g. a restored Bill) from the top"""
+        self.lines = lines
+        self.top = 0
+        self.redraw()
+
+    def lines_added(self, count=1):
+        """Lines were appended to the Bill; follow them if the last line was in view"""
+        total = len(self.lines)
+        was_at_end = self.top + self.visible_rows >= total - count
+        if was_at_end:
+            self.top = max(0, total - self.visible_rows)
+        self.redraw()
+
+    def lines_changed(self):
+        """Lines in the Bill were edited in place (e.g. re-priced)"""
+        self.redraw()
+
+    def clear(self):
+        """The Bill was emptied: hide the slots (pooled for the next bill)"""
+        self.top = 0
+        self.redraw()
+
+    # ----- Scrolling -----
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', count, 'units' | 'pages')"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.lines) + 0.5))
+        elif args[0] == 'scroll':
+            step = self.visible_rows if args[2] == 'pages' else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        if getattr(event, 'num', None) == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll_to(self.top - WHEEL_ROWS)
+        else:
+            self.scroll_to(self.top + WHEEL_ROWS)
+        return "break"
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.lines) - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self.redraw()
+
+    def see(self, position):
+        """Scroll just enough to bring line `position` into view"""
+        if position < self.top:
+            self.scroll_to(position)
+        elif position >= self.top + self.visible_rows:
+            self.scroll_to(position - self.visible_rows + 1)
+
+    def update_scrollbar(self):
+        if self.scrollbar is None:
+            return
+        total = len(self.lines)
+        if total <= self.visible_rows:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / total, (self.top + self.visible_rows) / total)
+
+    def resize(self, height):
+        """Fit the slots to `height` pixels of table (the canvas height)"""
+        header = self.frame.grid_bbox(0, 0, len(self.widths) - 1, self.first_row - 1)[3]
+        row_height = self.slots[0][0][0].winfo_reqheight() if self.slots else DEFAULT_ROW_HEIGHT
+        visible = max(MIN_VISIBLE_ROWS, (height - header) // max(1, row_height))
+        if visible != self.visible_rows:
+            at_end = self.top + self.visible_rows >= len(self.lines)
+            self.visible_rows = visible
+            last_top = max(0, len(self.lines) - visible)
+            self.top = last_top if at_end else min(self.top, last_top)
+            self.redraw()
+
+    # ----- Slots -----
+
+    def create_slot(self):
+        labels = [Label(self.frame, text="", width=width, **ROW_STYLE) for width in self.widths]
+        for label in labels:
+            self.bind_wheel(label)
+            label.bind('<Double-Button-1>', self.on_double_click)
+        return labels, [""] * len(self.widths)
+
+    def show_slot(self):
+        """Put a slot on the next grid row, reusing a pooled one when there is one"""
+        grid_row = self.first_row + len(self.slots)
+        slot = self.pool.take(self.create_slot)
+        for col, label in enumerate(slot[0]):
+            label.grid(row=grid_row, column=col, sticky="ew", padx=0, pady=0)
+        self.slots.append(slot)
+
+    def hide_slot(self):
+        self.pool.give(self.slots.pop())
+
+    def redraw(self):
+        """Label the slots with the lines in view, building or dropping slots to match"""
+        if self.batch_depth:
+            self.dirty = True
+            return
+        self.dirty = False
+        self.redraws += 1
+        shown = max(0, min(self.visible_rows, len(self.lines) - self.top))
+        while len(self.slots) < shown:
+            self.show_slot()
+        while len(self.slots) > shown:
+            self.hide_slot()
+
+        for i, (labels, texts) in enumerate(self.slots):
+            position = self.top + i
+            line = self.lines[position]
+            number = INVALID_MARK + str(position + 1) if line.errors else str(position + 1)
+            if texts[0] != number:
+                labels[0].config(text=number, fg=INVALID_FG if line.errors else "black")
+                texts[0] = number
+            for col, text in enumerate(line.values(), 1):
+                if texts[col] != text:
+                    labels[col].config(text=text)
+                    texts[col] = text
+        self.update_scrollbar()
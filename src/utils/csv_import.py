@@ -0,0 +1,115 @@
+"""
+Bulk CSV import of distributor purchase invoices
+Turns an invoice CSV into the same 15-field line dicts the search row builds,
+with BASE, Amount and L.P. priced in one batch as the search row prices them
+"""
+import csv
+import io
+
+from data.inventory_index import LINE_FIELDS
+from utils.pricing import DEFAULT_OPTIONS, price_lines
+from utils.validators import validate_lines
+
+# Column headers accepted for each line field (compared lower-cased, spaces/dots/underscores removed).
+# The first entry of each is the bill table's own header.
+HEADER_ALIASES = {
+    'item_name': ("itemname", "item", "product", "productname", "description", "name"),
+    'unit': ("unit", "pack", "packing", "uom"),
+    'batch': ("batch", "batchno", "batchnumber"),
+    'exp_dt': ("expdt", "exp", "expiry", "expirydate", "expdate"),
+    'mrp': ("mrp",),
+    'qty': ("qty", "quantity"),
+    'fr': ("fr", "free", "freeqty", "fqty"),
+    'ptr': ("ptr", "rate", "purchaserate", "prate"),
+    'd_percent': ("d%", "d", "disc%", "discpercent", "discount%"),
+    'disc': ("disc", "discount", "discamt"),
+    'base': ("base", "taxable", "taxablevalue"),
+    'gst_percent': ("gst%", "gst", "gstpercent", "taxpercent", "tax%"),
+    'amount': ("amount", "amt", "total", "netamount"),
+    'lp': ("lp", "l.p.", "landingprice", "landing"),
+    'locat': ("locat", "location", "rack", "shelf"),
+}
+
+# Same defaults clear_search_row puts in D%, Disc, BASE and Gst%
+FIELD_DEFAULTS = {'d_percent': "0", 'disc': "0", 'base': "0", 'gst_percent': "0"}
+
+
+def normalize_header(header):
+    return header.strip().lower().replace(' ', '').replace('_', '').replace('.', '')
+
+
+# header text -> line field, built once
+HEADER_FIELDS = {normalize_header(alias): field
+                 for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+
+def map_headers(headers):
+    """Return (column index -> line field, list of unrecognized headers)"""
+    columns = {}
+    unknown = []
+    for position, header in enumerate(headers):
+        field = HEADER_FIELDS.get(normalize_header(header))
+        if field and field not in columns.values():
+            columns[position] = field
+        elif header.strip():
+            unknown.append(header.strip())
+    return columns, unknown
+
+
+def price_invoice_lines(lines, options=DEFAULT_OPTIONS):
+    """Fill BASE, Amount and L.P. of every line with a Qty and PTR, in one pricing batch"""
+    priced_lines = [line for line in lines if line['qty'] and line['ptr']]
+    if priced_lines:
+        price_lines(priced_lines, options).apply_to(priced_lines)
+
+
+def parse_invoice_rows(rows, options=DEFAULT_OPTIONS):
+    """Parse CSV rows (header row first) into bill lines
+
+    Returns (lines, errors): lines are 15-field dicts ready for the bill, errors are
+    (csv line number, message) for rows that were skipped. Every row is checked in one pass,
+    then the good lines are priced together with the bill's pricing `options`.
+    """
+    rows = iter(rows)
+    headers = next(rows, None)
+    if headers is None:
+        return [], [(1, "The file is empty")]
+
+    columns, _ = map_headers(headers)
+    if 'item_name' not in columns.values():
+        return [], [(1, "No item name column found")]
+
+    lines = []
+    line_numbers = []
+    for line_no, row in enumerate(rows, 2):
+        if not any(cell.strip() for cell in row):
+            continue
+
+        line = dict.fromkeys(LINE_FIELDS, "")
+        line.update(FIELD_DEFAULTS)
+        for position, field in columns.items():
+            if position < len(row) and row[position].strip():
+                line[field] = row[position].strip()
+        lines.append(line)
+        line_numbers.append(line_no)
+
+    # One validation pass over the whole file; a row is skipped on its first problem
+    result = validate_lines(lines)
+    errors = [(line_numbers[row], row_errors[0].message)
+              for row, row_errors in sorted(result.errors_by_row().items())]
+    lines = [lines[row] for row in result.valid_rows()]
+
+    # BASE, Amount and L.P. from the invoice are replaced, as they are when keying a line
+    price_invoice_lines(lines, options)
+    return lines, errors
+
+
+def parse_invoice_csv(path, options=DEFAULT_OPTIONS):
+    """Parse a distributor invoice CSV file into bill lines; see parse_invoice_rows"""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        text = f.read()
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    return parse_invoice_rows(csv.reader(io.StringIO(text), dialect), options)
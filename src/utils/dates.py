@@ -0,0 +1,123 @@
+"""
+Date parsing for Pharmacy Bill Entry
+Entry and bill dates are dd/mm/yyyy; expiry dates are mm/yy. Both parse to
+compact integer keys that sort and subtract like dates:
+
+    day key    date.toordinal()            (days since 01/01/0001)
+    month key  year * 12 + month - 1       (months since year 0)
+
+Parsing and the input masks are memoized in bounded LRU caches; an inventory
+holds a few hundred distinct expiry strings, so after the first pass every
+lookup is a cache hit.
+"""
+from datetime import date
+from functools import lru_cache
+
+# Distinct strings remembered per cache
+CACHE_SIZE = 4096
+
+DAY_TEMPLATE = "dd/mm/yyyy"
+DAY_DIGIT_POSITIONS = (0, 1, 3, 4, 6, 7, 8, 9)   # Where digits go in DAY_TEMPLATE
+EXPIRY_TEMPLATE = "mm/yy"
+EXPIRY_DIGIT_POSITIONS = (0, 1, 3, 4)
+
+
+def only_digits(text):
+    return ''.join(c for c in text if c.isdigit()) if text else ''
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_day(text):
+    """Day key for 'dd/mm/yyyy' (also '-' or '.' separated, 'ddmmyyyy' or ISO 'yyyy-mm-dd'), or None"""
+    text = (text or '').strip()
+    parts = text.replace('-', '/').replace('.', '/').split('/')
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        if len(parts[0]) == 4:                       # yyyy-mm-dd
+            year, month, day = parts
+        else:
+            day, month, year = parts
+        if len(year) != 4 or len(month) > 2 or len(day) > 2:
+            return None
+    elif len(parts) == 1 and len(text) == 8 and text.isdigit():
+        day, month, year = text[:2], text[2:4], text[4:]
+    else:
+        return None
+
+    try:
+        return date(int(year), int(month), int(day)).toordinal()
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def expiry_month(exp_dt):
+    """Month key for 'mm/yy', 'mm/yyyy' or 'mmyy', or None"""
+    digits = only_digits(exp_dt)
+    if len(digits) not in (4, 6):
+        return None
+    month = int(digits[:2])
+    year = int(digits[2:])
+    if not 1 <= month <= 12:
+        return None
+    if year < 100:
+        year += 2000
+    return year * 12 + month - 1
+
+
+def day_key(day):
+    """Day key of a date"""
+    return day.toordinal()
+
+
+def today_key(today=None):
+    """Day key of `today` (default: the current date)"""
+    return (today or date.today()).toordinal()
+
+
+def current_month(today=None):
+    """Month key of `today` (default: the current date)"""
+    today = today or date.today()
+    return today.year * 12 + today.month - 1
+
+
+def format_day(key):
+    """'dd/mm/yyyy' for a day key"""
+    return date.fromordinal(key).strftime("%d/%m/%Y")
+
+
+def format_month(key):
+    """'mm/yy' for a month key"""
+    year, month = divmod(key, 12)
+    return f"{month + 1:02d}/{year % 100:02d}"
+
+
+def fill_template(template, positions, digits):
+    result = list(template)
+    for position, digit in zip(positions, digits):
+        result[position] = digit
+    return ''.join(result)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def mask_day(text):
+    """The dd/mm/yyyy input mask with the digits typed so far, e.g. '1810' -> '18/10/yyyy'"""
+    return fill_template(DAY_TEMPLATE, DAY_DIGIT_POSITIONS, only_digits(text)[:8])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def mask_expiry(text):
+    """The mm/yy input mask with the digits typed so far, e.g. '102' -> '10/2y'"""
+    return fill_template(EXPIRY_TEMPLATE, EXPIRY_DIGIT_POSITIONS, only_digits(text)[:4])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def slash_day(text):
+    """Digits typed so far with slashes only where reached, e.g. '1810' -> '18/10'"""
+    digits = only_digits(text)[:8]
+    return '/'.join(part for part in (digits[:2], digits[2:4], digits[4:]) if part)
+
+
+def cache_info():
+    """Hit/miss counts of each cache"""
+    return {function.__name__: function.cache_info()
+            for function in (parse_day, expiry_month, mask_day, mask_expiry, slash_day)}
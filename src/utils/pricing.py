@@ -0,0 +1,219 @@
+"""
+Purchase-line pricing for Pharmacy Bill Entry
+Prices a batch of bill lines in one call: BASE after trade discount (D%), flat
+discount (Disc) and scheme discount (SCH DISC), GST (optionally on free goods
+or with tax-inclusive PTR), Amount and landing price (L.P.).
+
+All arithmetic is fixed point: money in paise, Qty/Fr in thousandths and
+percentages in basis points, rounded half up at each step. NumPy is used for
+large batches when installed; otherwise the same integer formulas run in
+plain Python.
+"""
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # Optional - the integer loop gives the same results
+    np = None
+
+MONEY_SCALE = 100       # paise per rupee
+QTY_SCALE = 1000        # Qty and Fr in thousandths
+PERCENT_SCALE = 100     # basis points per percent
+# Below this many lines the NumPy setup costs more than it saves
+NUMPY_MIN_LINES = 64
+
+SCALE_PLACES = {1: 0, 10: 1, MONEY_SCALE: 2, QTY_SCALE: 3}
+
+# Result columns, all in paise (lp is per unit received, free goods included)
+PRICE_FIELDS = ('gross', 'discount', 'scheme', 'base', 'gst', 'amount', 'lp')
+
+
+def parse_fixed(value, scale):
+    """Fixed-point integer for a field value at `scale` (1, 10, 100 or 1000); blank and junk are 0
+
+    Strings are converted digit by digit, so "85.505" is exactly 8551 paise
+    rather than whatever float rounding makes of it.
+    """
+    if value is None:
+        return 0
+    if not isinstance(value, str):
+        return int(round(value * scale))
+
+    text = value.strip()
+    whole, _, fraction = text.partition('.')
+    sign = 1
+    if whole[:1] in ('-', '+'):
+        sign = -1 if whole[0] == '-' else 1
+        whole = whole[1:]
+    if not ((whole.isdigit() or not whole) and (fraction.isdigit() or not fraction) and (whole or fraction)):
+        try:
+            return int(round(float(text) * scale))   # Exponents and the like
+        except ValueError:
+            return 0
+
+    number = int(whole) * scale if whole else 0
+    if fraction:
+        places = SCALE_PLACES[scale]
+        if places:
+            number += int(fraction[:places].ljust(places, '0'))
+        if len(fraction) > places and fraction[places] >= '5':
+            number += 1
+    return sign * number
+
+
+def format_paise(paise):
+    """Rupee text with 2 decimals for a paise amount"""
+    sign = '-' if paise < 0 else ''
+    rupees, paise = divmod(abs(int(paise)), MONEY_SCALE)
+    return f"{sign}{rupees}.{paise:02d}"
+
+
+class PricingOptions:
+    """Bill-level pricing switches (the Tax, SCH DISC, GST on Free and Tax Inclusive controls)"""
+    __slots__ = ('apply_tax', 'tax_inclusive', 'gst_on_free', 'scheme_percent')
+
+    def __init__(self, apply_tax=True, tax_inclusive=False, gst_on_free=False, scheme_percent=0):
+        self.apply_tax = apply_tax
+        self.tax_inclusive = tax_inclusive
+        self.gst_on_free = gst_on_free
+        self.scheme_percent = scheme_percent
+
+    def __repr__(self):
+        return (f"PricingOptions(apply_tax={self.apply_tax}, tax_inclusive={self.tax_inclusive}, "
+                f"gst_on_free={self.gst_on_free}, scheme_percent={self.scheme_percent})")
+
+
+DEFAULT_OPTIONS = PricingOptions()
+
+
+class PricedLines:
+    """Priced columns for a batch of lines, each an array('q') in paise"""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['amount'])
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def line_text(self, position):
+        """BASE, Amount and L.P. of one line as the bill table shows them"""
+        return {
+            'base': format_paise(self.columns['base'][position]),
+            'amount': format_paise(self.columns['amount'][position]),
+            'lp': format_paise(self.columns['lp'][position]),
+        }
+
+    def apply_to(self, lines):
+        """Write BASE, Amount and L.P. into the line dicts the prices were computed from"""
+        for position, line in enumerate(lines):
+            line.update(self.line_text(position))
+
+    def total(self, field='amount'):
+        """Sum of a column, in paise"""
+        return sum(self.columns[field])
+
+
+def fixed_columns(lines):
+    """Input columns (qty, fr, ptr, d_percent, disc, gst_percent) as fixed-point integer lists"""
+    qty, fr, ptr, d_percent, disc, gst = [], [], [], [], [], []
+    for line in lines:
+        get = line.get if isinstance(line, dict) else (lambda field, line=line: getattr(line, field, None))
+        qty.append(parse_fixed(get('qty'), QTY_SCALE))
+        fr.append(parse_fixed(get('fr'), QTY_SCALE))
+        ptr.append(parse_fixed(get('ptr'), MONEY_SCALE))
+        d_percent.append(parse_fixed(get('d_percent'), PERCENT_SCALE))
+        disc.append(parse_fixed(get('disc'), MONEY_SCALE))
+        gst.append(parse_fixed(get('gst_percent'), PERCENT_SCALE))
+    return qty, fr, ptr, d_percent, disc, gst
+
+
+def round_div(numerator, denominator):
+    """numerator / denominator rounded half up (denominator > 0)"""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def price_columns(qty, fr, ptr, d_percent, disc, gst, options=DEFAULT_OPTIONS):
+    """Price fixed-point input columns; see the module docstring for the units
+
+        gross    = Qty * PTR
+        discount = gross * D% + Disc
+        scheme   = (gross - discount) * SCH DISC %
+        net      = gross - discount - scheme (not below 0)
+        base     = net, or net / (1 + Gst%) when PTR includes tax
+        gst      = base * Gst% (+ Fr * PTR * Gst% with GST on free goods)
+        amount   = base + gst
+        lp       = amount / (Qty + Fr)
+    """
+    scheme_bp = parse_fixed(options.scheme_percent, PERCENT_SCALE)
+    if np is not None and len(qty) >= NUMPY_MIN_LINES:
+        return price_columns_numpy(qty, fr, ptr, d_percent, disc, gst, options, scheme_bp)
+
+    percent = 100 * PERCENT_SCALE
+    out = {field: array('q') for field in PRICE_FIELDS}
+    for q, f, p, d, flat, g in zip(qty, fr, ptr, d_percent, disc, gst):
+        gross = round_div(q * p, QTY_SCALE)
+        discount = round_div(gross * d, percent) + flat
+        scheme = round_div((gross - discount) * scheme_bp, percent) if gross > discount else 0
+        net = max(gross - discount - scheme, 0)
+
+        if not options.apply_tax:
+            base, tax = net, 0
+        elif options.tax_inclusive:
+            base = round_div(net * percent, percent + g)
+            tax = net - base
+        else:
+            base = net
+            tax = round_div(base * g, percent)
+        if options.apply_tax and options.gst_on_free and f:
+            free_value = round_div(f * p, QTY_SCALE)
+            tax += round_div(free_value * g, percent + (g if options.tax_inclusive else 0))
+
+        amount = base + tax
+        units = q + f
+        out['gross'].append(gross)
+        out['discount'].append(discount)
+        out['scheme'].append(scheme)
+        out['base'].append(base)
+        out['gst'].append(tax)
+        out['amount'].append(amount)
+        out['lp'].append(round_div(amount * QTY_SCALE, units) if units > 0 else 0)
+    return PricedLines(out)
+
+
+def price_columns_numpy(qty, fr, ptr, d_percent, disc, gst, options, scheme_bp):
+    """price_columns on int64 vectors (same formulas, same rounding)"""
+    percent = 100 * PERCENT_SCALE
+    q, f, p, d, flat, g = (np.asarray(column, dtype=np.int64) for column in (qty, fr, ptr, d_percent, disc, gst))
+
+    gross = round_div(q * p, QTY_SCALE)
+    discount = round_div(gross * d, percent) + flat
+    scheme = np.where(gross > discount, round_div((gross - discount) * scheme_bp, percent), 0)
+    net = np.maximum(gross - discount - scheme, 0)
+
+    if not options.apply_tax:
+        base, tax = net, np.zeros_like(net)
+    elif options.tax_inclusive:
+        base = round_div(net * percent, percent + g)
+        tax = net - base
+    else:
+        base = net
+        tax = round_div(base * g, percent)
+    if options.apply_tax and options.gst_on_free:
+        free_value = round_div(f * p, QTY_SCALE)
+        tax = tax + round_div(free_value * g, percent + (g if options.tax_inclusive else 0))
+
+    amount = base + tax
+    units = q + f
+    lp = np.where(units > 0, round_div(amount * QTY_SCALE, np.maximum(units, 1)), 0)
+
+    results = (gross, discount, scheme, base, tax, amount, lp)
+    return PricedLines({field: array('q', column.astype(np.int64).tobytes())
+                        for field, column in zip(PRICE_FIELDS, results)})
+
+
+def price_lines(lines, options=DEFAULT_OPTIONS):
+    """Price a sequence of line dicts or Products in one batch"""
+    return price_columns(*fixed_columns(lines), options=options)
@@ -1,33 +1,209 @@
+"""
+Input validation for Pharmacy Bill Entry
+validate_lines() checks a whole bill or imported file in one pass: each field
+is parsed once, and the typed values come back with an error code per bad
+row and field. Dates are the formats the UI produces: dd/mm/yyyy for entry and
+bill dates, mm/yy for expiry.
+"""
+import math
+from collections import namedtuple
+from operator import itemgetter
+
+from data.inventory_index import LINE_FIELDS
+from utils.dates import expiry_month, parse_day
+
+# Error codes
+REQUIRED = 'required'
+NOT_A_NUMBER = 'not_a_number'
+NEGATIVE = 'negative'
+NOT_POSITIVE = 'not_positive'
+OVER_100_PERCENT = 'over_100_percent'
+BAD_DATE = 'bad_date'
+
+TEXT_FIELDS = ('item_name', 'unit', 'batch', 'exp_dt', 'locat')
+NUMBER_FIELDS = tuple(field for field in LINE_FIELDS if field not in TEXT_FIELDS)
+PERCENT_FIELDS = ('d_percent', 'gst_percent')
+FIELD_ORDER = {field: position for position, field in enumerate(LINE_FIELDS)}
+
+FIELD_LABELS = {
+    'item_name': "Item name", 'unit': "Unit", 'batch': "Batch", 'exp_dt': "ExpDt", 'mrp': "Mrp",
+    'qty': "Qty", 'fr': "Fr", 'ptr': "PTR", 'd_percent': "D%", 'disc': "Disc", 'base': "BASE",
+    'gst_percent': "Gst%", 'amount': "Amount", 'lp': "L.P.", 'locat': "Locat",
+}
+
+MESSAGES = {
+    REQUIRED: "{label} is required",
+    NOT_A_NUMBER: "{label} is not a number: {value!r}",
+    NEGATIVE: "{label} cannot be negative: {value!r}",
+    NOT_POSITIVE: "{label} must be more than 0: {value!r}",
+    OVER_100_PERCENT: "{label} cannot be over 100: {value!r}",
+    BAD_DATE: "{label} is not a valid date: {value!r}",
+}
+
+
+class FieldError(namedtuple('FieldError', 'row field code value')):
+    """One problem: row index (in the input), line field, error code and the text as given"""
+    __slots__ = ()
+
+    @property
+    def message(self):
+        return MESSAGES[self.code].format(label=FIELD_LABELS.get(self.field, self.field), value=self.value)
+
+
+class ValidationResult:
+    def __init__(self, columns, exp_months, errors):
+        self.columns = columns          # field -> value per row; numbers as float (None when blank or bad)
+        self.exp_months = exp_months    # Per row: expiry month number (year * 12 + month - 1) or None
+        self.errors = errors            # FieldErrors in row, then column, order
+
+    def __len__(self):
+        return len(self.exp_months)
+
+    def row_values(self, row):
+        """The typed 15 fields of one row, as a dict (Product(**values) builds the line)"""
+        return {field: self.columns[field][row] for field in LINE_FIELDS}
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def error_rows(self):
+        """Rows with at least one error"""
+        return {error.row for error in self.errors}
+
+    def errors_by_row(self):
+        """row -> [FieldError], for rows that have any"""
+        by_row = {}
+        for error in self.errors:
+            by_row.setdefault(error.row, []).append(error)
+        return by_row
+
+    def valid_rows(self):
+        """Indexes of the rows without errors, in order"""
+        bad = self.error_rows()
+        return [row for row in range(len(self)) if row not in bad]
+
+
+def check_number_column(field, texts, errors):
+    """Floats for one field down all rows (None when blank), adding FieldErrors for bad values
+
+    Each distinct text in the column is parsed and checked once (prices, rates
+    and quantities repeat a lot); rows are only walked again to report errors.
+    """
+    numbers = {}    # text -> float, None when blank or bad
+    codes = {}      # bad text -> error code
+    for text in set(texts):
+        number = None
+        if text is not None and text != '' and not (isinstance(text, str) and text.isspace()):
+            try:
+                number = float(text)
+            except (TypeError, ValueError):
+                number = math.nan
+            code = None
+            if not math.isfinite(number):
+                code = NOT_A_NUMBER
+            elif number < 0:
+                code = NEGATIVE
+            elif number > 100 and field in PERCENT_FIELDS:
+                code = OVER_100_PERCENT
+            if code:
+                codes[text] = code
+                number = None
+        numbers[text] = number
+
+    if codes:
+        errors.extend(FieldError(row, field, codes[text], str(text).strip())
+                      for row, text in enumerate(texts) if text in codes)
+    return list(map(numbers.__getitem__, texts))
+
+
+def validate_lines(lines, required=('item_name',)):
+    """Validate purchase lines (15-field dicts of strings) in one pass
+
+    Numbers must be finite and not negative; a given Qty must be more than 0
+    unless the line has free goods; D% and Gst% are at most 100; ExpDt must be
+    a real mm/yy month. A still-empty input mask ("mm/yy") counts as blank.
+    """
+    lines = lines if isinstance(lines, list) else list(lines)
+    errors = []
+
+    # One list per field, read straight from the line dicts
+    raw = {}
+    for field in LINE_FIELDS:
+        try:
+            raw[field] = list(map(itemgetter(field), lines))
+        except KeyError:
+            raw[field] = [line.get(field) for line in lines]
+
+    columns = {}
+    for field in TEXT_FIELDS:
+        try:
+            columns[field] = list(map(str.strip, raw[field]))
+        except TypeError:   # A missing (None) field
+            columns[field] = [(text or '').strip() for text in raw[field]]
+    for field in NUMBER_FIELDS:
+        columns[field] = check_number_column(field, raw[field], errors)
+
+    for field in required:
+        texts = columns[field] if field in TEXT_FIELDS else [str(text or '').strip() for text in raw[field]]
+        if not all(texts):
+            errors.extend(FieldError(row, field, REQUIRED, '') for row, text in enumerate(texts) if not text)
+
+    # Expiry months are parsed once per distinct ExpDt
+    exp_dts = columns['exp_dt']
+    months = {exp_dt: expiry_month(exp_dt) for exp_dt in set(exp_dts) if exp_dt}
+    months[''] = None
+    exp_months = list(map(months.__getitem__, exp_dts))
+    unparsed = {exp_dt for exp_dt, month in months.items() if month is None and exp_dt}
+    if unparsed:
+        for row, exp_dt in enumerate(exp_dts):
+            if exp_dt in unparsed:
+                if any(c.isdigit() for c in exp_dt):
+                    errors.append(FieldError(row, 'exp_dt', BAD_DATE, exp_dt))
+                else:
+                    exp_dts[row] = ''
+
+    # A zero Qty is only a line if it brings free goods
+    qty, fr = columns['qty'], columns['fr']
+    if 0.0 in qty:
+        for row, number in enumerate(qty):
+            if number == 0 and not fr[row]:
+                errors.append(FieldError(row, 'qty', NOT_POSITIVE, str(raw['qty'][row]).strip()))
+                qty[row] = None
+
+    errors.sort(key=lambda error: (error.row, FIELD_ORDER[error.field]))
+    return ValidationResult(columns, exp_months, errors)
+
+
 def is_not_empty(value):
     return bool(value.strip())
 
 def is_valid_number(value):
     try:
-        float(value)
-        return True
+        return math.isfinite(float(value))
     except ValueError:
         return False
 
 def is_valid_quantity(value):
-    return is_valid_number(value) and int(value) > 0
+    return is_valid_number(value) and float(value) > 0
 
 def is_valid_date(date_string):
-    from datetime import datetime
-    try:
-        datetime.strptime(date_string, '%Y-%m-%d')
-        return True
-    except ValueError:
-        return False
+    """True for a dd/mm/yyyy (or yyyy-mm-dd) date"""
+    return parse_day(date_string) is not None
+
+def is_valid_expiry(exp_dt):
+    """True for an mm/yy (or mm/yyyy) expiry"""
+    return expiry_month(exp_dt) is not None
 
 def validate_product_data(name, batch_number, expiry_date, quantity, rate):
     if not is_not_empty(name):
         return "Product name cannot be empty."
     if not is_not_empty(batch_number):
         return "Batch number cannot be empty."
-    if not is_valid_date(expiry_date):
-        return "Expiry date must be in YYYY-MM-DD format."
+    if not is_valid_expiry(expiry_date):
+        return "Expiry date must be in mm/yy format."
     if not is_valid_quantity(quantity):
-        return "Quantity must be a positive integer."
+        return "Quantity must be a positive number."
     if not is_valid_number(rate):
         return "Rate must be a valid number."
     return None
@@ -37,4 +213,4 @@ def validate_bill_data(party_name, party_contact):
         return "Party name cannot be empty."
     if not is_not_empty(party_contact):
         return "Party contact cannot be empty."
-    return None
\ No newline at end of file
+    return None